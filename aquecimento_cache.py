@@ -0,0 +1,204 @@
+# aquecimento_cache.py
+"""
+Aquecimento dos caches em segundo plano, para que as cargas frias previsíveis não caiam num caixa ou admin.
+
+Uma thread única por processo chama as mesmas funções em cache que as páginas usam (catálogo e
+índice de códigos do PDV por local, relatórios, histórico, produtos, monitor de estoque baixo,
+previsão). Como os caches são do processo, a entrada carregada aqui é a que as sessões recebem.
+
+O aquecimento roda:
+- ao iniciar o app (primeira execução do dashboard, normalmente ainda na tela de login);
+- nos horários configurados, antes dos picos;
+- depois de cada invalidação, só para os datasets afetados. Invalidações seguidas (várias vendas,
+  eventos de outras réplicas) são agrupadas por `agrupar_segundos` num único aquecimento.
+
+Fora disso os caches continuam preguiçosos: uma entrada que expira pelo TTL (contado a partir da
+carga) é recarregada pela primeira sessão que a pedir, que paga essa carga.
+
+A duração de cada etapa fica registrada no histórico, exibido no Dashboard para administradores.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytz
+import streamlit as st
+from supabase import Client
+
+from utils import supabase_client_hash_func
+from dados_compartilhados import TODOS_OS_DATASETS, nome_do_dataset, registrar_apos_invalidacao
+from estoque_baixo import get_monitor_estoque_baixo
+from locais import get_locais, get_catalogo_local
+from previsao_demanda import get_agendador_previsao
+from pages.relatorios_page import get_relatorios_data
+from pages.movimentacao_page import get_movimentacao_data
+from pages.gestao_produtos_page import get_produtos
+
+logger = logging.getLogger(__name__)
+
+BRASILIA_TZ = pytz.timezone("America/Sao_Paulo")
+NOME_THREAD = "aquecimento-cache"
+
+# Podem ser sobrescritos na seção [AQUECIMENTO] do secrets.toml
+AQUECIMENTO_CONFIG_PADRAO = {
+    "horarios": ["07:30", "11:30", "17:30"],   # aquecimentos antes dos picos (horário de Brasília)
+    "agrupar_segundos": 5,                     # espera por mais invalidações antes de aquecer
+    "historico_max": 50,
+}
+
+
+def get_aquecimento_config() -> dict:
+    config = dict(AQUECIMENTO_CONFIG_PADRAO)
+    try:
+        config.update(dict(st.secrets.get("AQUECIMENTO", {})))
+    except Exception:
+        pass
+    return config
+
+
+class _SemAvisoDeContexto(logging.Filter):
+    # As funções em cache avisam quando chamadas fora de uma sessão; aqui isso é esperado
+    def filter(self, record):
+        return record.threadName != NOME_THREAD
+
+
+def _horario(texto: str, dia: datetime) -> datetime:
+    hora, minuto = (int(parte) for parte in texto.split(':'))
+    return dia.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+
+
+def tarefas_aquecimento(supabase_client: Client) -> list:
+    """Lista (nome, dataset, função) a pré-carregar, com o catálogo do PDV de cada local.
+
+    `dataset` é o nome em dados_compartilhados (None fora dele): liga a tarefa às invalidações.
+    """
+    produtos, movimentacao = nome_do_dataset(get_produtos), nome_do_dataset(get_movimentacao_data)
+    catalogo, relatorios = nome_do_dataset(get_catalogo_local), nome_do_dataset(get_relatorios_data)
+    tarefas = [
+        ("locais", None, lambda: get_locais(supabase_client)),
+        ("estoque_baixo", None, lambda: get_monitor_estoque_baixo(supabase_client)),
+        ("previsao", None, lambda: get_agendador_previsao(supabase_client)),
+        ("gestao.produtos", produtos, lambda: get_produtos(supabase_client)),
+        ("movimentacao", movimentacao, lambda: get_movimentacao_data(supabase_client)),
+        ("relatorios[rede]", relatorios, lambda: get_relatorios_data(supabase_client, None)),
+    ]
+    for local in get_locais(supabase_client):
+        local_id, nome = local['id'], local['nome']
+        tarefas.append((f"pdv.catalogo[{nome}]", catalogo, lambda local_id=local_id: get_catalogo_local(supabase_client, local_id)))
+        tarefas.append((f"relatorios[{nome}]", relatorios, lambda local_id=local_id: get_relatorios_data(supabase_client, local_id)))
+    return tarefas
+
+
+class AquecedorCache:
+    """Thread de fundo que pré-carrega os caches na inicialização, nos horários e sob demanda."""
+    def __init__(self, supabase_client: Client, config: dict):
+        self.supabase = supabase_client
+        self.config = config
+        self.execucoes = deque(maxlen=int(config["historico_max"]))
+        self._motivo_pendente = "inicialização"
+        self._datasets_pendentes = None   # None: todas as tarefas
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=NOME_THREAD, daemon=True)
+
+    def iniciar(self):
+        logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(_SemAvisoDeContexto())
+        self._thread.start()
+
+    def _agendar(self, motivo: str, datasets):
+        # Junta a solicitação à pendente: um aquecimento completo absorve os parciais
+        with self._lock:
+            if datasets is None:
+                self._motivo_pendente, self._datasets_pendentes = motivo, None
+            elif self._motivo_pendente is None:
+                self._motivo_pendente, self._datasets_pendentes = motivo, set(datasets)
+            elif self._datasets_pendentes is not None:
+                self._datasets_pendentes |= set(datasets)
+
+    def solicitar_aquecimento(self, motivo: str = "manual", datasets=None):
+        """Pede um aquecimento de todas as tarefas, ou só das ligadas a `datasets`."""
+        self._agendar(motivo, datasets)
+        self._acordar.set()
+
+    def apos_invalidacao(self, datasets: list):
+        if TODOS_OS_DATASETS in datasets:
+            self.solicitar_aquecimento("limpeza de cache")
+        else:
+            self.solicitar_aquecimento("invalidação", datasets)
+
+    def aquecer(self, motivo: str, datasets=None) -> dict:
+        """Executa as tarefas (todas, ou só as de `datasets`) e registra a duração de cada uma."""
+        inicio_execucao = datetime.now(BRASILIA_TZ)
+        inicio = time.perf_counter()
+        etapas, erros = {}, {}
+        try:
+            tarefas = tarefas_aquecimento(self.supabase)
+        except Exception as e:
+            tarefas, erros['locais'] = [], str(e)
+        if datasets is not None:
+            tarefas = [tarefa for tarefa in tarefas if tarefa[1] in datasets]
+        for nome, _, tarefa in tarefas:
+            inicio_etapa = time.perf_counter()
+            try:
+                tarefa()
+            except Exception as e:
+                logger.warning(f"Falha ao aquecer '{nome}': {e}")
+                erros[nome] = str(e)
+            etapas[nome] = time.perf_counter() - inicio_etapa
+        execucao = {
+            'inicio': inicio_execucao, 'motivo': motivo, 'duracao_s': time.perf_counter() - inicio,
+            'etapas': etapas, 'erros': erros,
+        }
+        with self._lock:
+            self.execucoes.append(execucao)
+        return execucao
+
+    def proxima_execucao(self, agora: datetime = None):
+        """Próximo horário agendado, como (horário, motivo). None quando não há horários configurados."""
+        agora = agora or datetime.now(BRASILIA_TZ)
+        candidatos = []
+        for dia in (agora, agora + timedelta(days=1)):
+            candidatos += [(_horario(h, dia), "agendado") for h in self.config["horarios"]]
+        return min((c for c in candidatos if c[0] > agora), key=lambda c: c[0], default=None)
+
+    def _loop(self):
+        while True:
+            self._acordar.clear()
+            with self._lock:
+                motivo, datasets = self._motivo_pendente, self._datasets_pendentes
+                self._motivo_pendente, self._datasets_pendentes = None, None
+            if motivo:
+                self.aquecer(motivo, datasets)
+            proxima = self.proxima_execucao()
+            espera = None if proxima is None else max((proxima[0] - datetime.now(BRASILIA_TZ)).total_seconds(), 0)
+            if self._acordar.wait(timeout=espera):
+                # Solicitações em sequência (várias vendas seguidas) viram um único aquecimento
+                time.sleep(float(self.config["agrupar_segundos"]))
+            else:
+                self._agendar(proxima[1], None)
+
+    def historico(self) -> pd.DataFrame:
+        with self._lock:
+            execucoes = list(self.execucoes)
+        return pd.DataFrame([
+            {'inicio': e['inicio'], 'motivo': e['motivo'], 'duracao_s': e['duracao_s'],
+             'etapa_mais_lenta': max(e['etapas'], key=e['etapas'].get) if e['etapas'] else None,
+             'erros': len(e['erros'])}
+            for e in reversed(execucoes)
+        ], columns=['inicio', 'motivo', 'duracao_s', 'etapa_mais_lenta', 'erros'])
+
+    def ultima_execucao(self):
+        with self._lock:
+            return self.execucoes[-1] if self.execucoes else None
+
+
+@st.cache_resource(hash_funcs={Client: supabase_client_hash_func})
+def get_aquecedor_cache(supabase_client: Client) -> AquecedorCache:
+    """Aquecedor único por processo; a primeira chamada inicia a thread e o aquecimento inicial."""
+    aquecedor = AquecedorCache(supabase_client, get_aquecimento_config())
+    registrar_apos_invalidacao(aquecedor.apos_invalidacao)
+    aquecedor.iniciar()
+    return aquecedor
@@ -0,0 +1,397 @@
+# cache_distribuido.py
+"""
+Camada de cache compartilhada entre réplicas do dashboard (atrás de um balanceador de carga).
+
+Cada réplica mantém seus caches em memória (dados_compartilhados.cache_compartilhado). Numa falta
+local, o dataset é procurado aqui antes de ir ao Supabase. Se outra réplica já o carregou, basta
+ler o valor serializado. Assim uma única carga atende todos os nós.
+
+- Chaves versionadas: "<dataset>:v<versão>:<formato>:<hash dos argumentos>". Invalidar um dataset incrementa
+  a versão, e as entradas antigas deixam de ser encontradas (expiram pelo TTL). Cada partição
+  ("<dataset>#<hash dos argumentos>", ex.: o catálogo de um local) tem também a própria versão,
+  somada à do dataset, para invalidar só aquela entrada.
+- Mensagens de invalidação: cada invalidação grava um evento. As outras réplicas leem os eventos a
+  cada `intervalo_eventos_s` e limpam os próprios caches em memória.
+- Carga única: a réplica que reserva a chave carrega; as demais esperam o valor aparecer. Se a
+  reserva for liberada sem valor (resultado vazio ou erro na carga), quem estava esperando tenta
+  reservar de novo e carrega, em vez de esperar até `espera_carga_s`.
+- Falhas do backend (ex.: arquivo SQLite travado ou indisponível) não derrubam a página: o dataset é
+  carregado direto do Supabase, como sem a camada, e a falha é registrada no log e nas métricas.
+
+Além dos datasets, a camada guarda registros avulsos em JSON (ex.: sessões e revogações de
+login, em sessoes.py), fora do versionamento: `ler_registro`, `gravar_registro` e `remover_registro`.
+Esses levantam a exceção do backend, e quem chama decide o que fazer sem ele.
+
+O backend é plugável (BACKENDS). O SQLite serve para réplicas na mesma máquina ou volume e para
+testes sem serviços externos. Um backend de rede implementa a mesma interface de BackendCache.
+
+Fronteira de confiança: quem escreve no backend decide o que as réplicas leem. Por isso os valores
+não usam pickle (desserializar pickle executa código). DataFrames vão em Parquet e o resto (tuplas,
+registros, textos e números) em JSON, e ler um valor nunca executa código. Um valor adulterado
+ainda vira dado errado na tela: o backend deve ficar acessível só às réplicas.
+"""
+import hashlib
+import io
+import json
+import logging
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from types import MappingProxyType
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NOME_THREAD = "cache-distribuido-eventos"
+SEPARADOR_PARTICAO = "#"
+# Muda quando o formato de serializar() muda: valores antigos deixam de ser encontrados
+FORMATO_VALOR = "jp1"
+RETENCAO_EVENTOS_S = 3600
+PREFIXO_REGISTRO = "registro:"
+
+# Podem ser sobrescritos na seção [CACHE_DISTRIBUIDO] do secrets.toml
+CACHE_DISTRIBUIDO_CONFIG_PADRAO = {
+    "backend": "",                          # "" desliga a camada; "sqlite" usa o arquivo abaixo
+    "caminho": "sistoque_cache.sqlite3",    # precisa ser o mesmo arquivo para todas as réplicas
+    "intervalo_eventos_s": 2,               # atraso máximo para uma réplica ver a invalidação de outra
+    "espera_carga_s": 30,                   # quanto esperar a carga feita por outra réplica
+}
+
+
+def serializar(valor) -> bytes:
+    """Cabeçalho JSON com a estrutura, seguido dos DataFrames em Parquet.
+
+    Registros repetidos (ex.: o mesmo produto na lista e no índice de códigos) são gravados uma vez
+    e voltam como o mesmo objeto. Tipos fora do formato levantam TypeError.
+    """
+    tabelas, registros = [], {}
+
+    def codificar(item):
+        if isinstance(item, pd.DataFrame):
+            buffer = io.BytesIO()
+            item.to_parquet(buffer)
+            tabelas.append(buffer.getvalue())
+            return {"tabela": len(tabelas) - 1}
+        if isinstance(item, MappingProxyType):
+            if id(item) in registros:
+                return {"ref": registros[id(item)]}
+            registros[id(item)] = len(registros)
+            return {"registro": codificar_dict(item)}
+        if isinstance(item, dict):
+            return {"dict": codificar_dict(item)}
+        if isinstance(item, tuple):
+            return {"tupla": [codificar(parte) for parte in item]}
+        if isinstance(item, list):
+            return {"lista": [codificar(parte) for parte in item]}
+        if item is None or isinstance(item, (str, bool, int, float)):
+            return {"v": item}
+        raise TypeError(f"Tipo sem serialização no cache distribuído: {type(item).__name__}")
+
+    def codificar_dict(item):
+        if not all(isinstance(chave, str) for chave in item):
+            raise TypeError("Só dicionários com chaves de texto podem ir para o cache distribuído")
+        return {chave: codificar(parte) for chave, parte in item.items()}
+
+    cabecalho = json.dumps(codificar(valor)).encode()
+    partes = [struct.pack(">I", len(cabecalho)), cabecalho]
+    for tabela in tabelas:
+        partes += [struct.pack(">Q", len(tabela)), tabela]
+    return b"".join(partes)
+
+
+def desserializar(dados: bytes):
+    """Inverso de serializar(): só lê JSON e Parquet, nunca executa código."""
+    tamanho = struct.unpack_from(">I", dados)[0]
+    estrutura = json.loads(dados[4:4 + tamanho])
+    tabelas, posicao = [], 4 + tamanho
+    while posicao < len(dados):
+        tamanho = struct.unpack_from(">Q", dados, posicao)[0]
+        tabelas.append(dados[posicao + 8:posicao + 8 + tamanho])
+        posicao += 8 + tamanho
+    registros = []
+
+    def decodificar(item):
+        if "v" in item:
+            return item["v"]
+        if "tabela" in item:
+            return pd.read_parquet(io.BytesIO(tabelas[item["tabela"]]))
+        if "ref" in item:
+            return registros[item["ref"]]
+        if "registro" in item:
+            # Reserva a posição antes de decodificar o conteúdo: mesma ordem de serializar()
+            registros.append(None)
+            indice = len(registros) - 1
+            registros[indice] = MappingProxyType({chave: decodificar(parte) for chave, parte in item["registro"].items()})
+            return registros[indice]
+        if "dict" in item:
+            return {chave: decodificar(parte) for chave, parte in item["dict"].items()}
+        if "tupla" in item:
+            return tuple(decodificar(parte) for parte in item["tupla"])
+        return [decodificar(parte) for parte in item["lista"]]
+
+    return decodificar(estrutura)
+
+
+def _vazio(valor) -> bool:
+    if isinstance(valor, pd.DataFrame):
+        return valor.empty
+    if isinstance(valor, tuple):
+        return all(_vazio(parte) for parte in valor)
+    try:
+        return len(valor) == 0
+    except TypeError:
+        return valor is None
+
+
+class BackendCache:
+    """Interface dos backends: valores por chave, versão por dataset, reservas de carga e eventos."""
+    def ler(self, chave: str):
+        raise NotImplementedError
+
+    def gravar(self, chave: str, valor: bytes, ttl: float):
+        raise NotImplementedError
+
+    def remover(self, chave: str):
+        raise NotImplementedError
+
+    def reservar_carga(self, chave: str, duracao: float) -> bool:
+        raise NotImplementedError
+
+    def liberar_carga(self, chave: str):
+        raise NotImplementedError
+
+    def versao(self, dataset: str) -> int:
+        raise NotImplementedError
+
+    def invalidar(self, datasets: list, origem: str):
+        """Incrementa a versão dos datasets e publica um evento para as outras réplicas."""
+        raise NotImplementedError
+
+    def eventos_desde(self, ultimo_id: int) -> list:
+        """Eventos posteriores a ultimo_id, como (id, origem, datasets)."""
+        raise NotImplementedError
+
+
+class BackendSQLite(BackendCache):
+    """Backend em um arquivo SQLite (modo WAL) compartilhado pelas réplicas."""
+    def __init__(self, caminho: str):
+        self._conexao = sqlite3.connect(caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conexao.execute("pragma journal_mode=wal")
+            self._conexao.executescript("""
+                create table if not exists entradas (chave text primary key, valor blob not null, expira real not null);
+                create table if not exists versoes (dataset text primary key, versao integer not null);
+                create table if not exists cargas (chave text primary key, expira real not null);
+                create table if not exists eventos (
+                    id integer primary key autoincrement, origem text not null, datasets text not null, criado real not null
+                );
+            """)
+
+    def _executar(self, sql: str, parametros: tuple = ()):
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def ler(self, chave: str):
+        linhas = self._executar("select valor from entradas where chave = ? and expira > ?", (chave, time.time()))
+        return linhas[0][0] if linhas else None
+
+    def gravar(self, chave: str, valor: bytes, ttl: float):
+        agora = time.time()
+        self._executar("insert or replace into entradas values (?, ?, ?)", (chave, valor, agora + ttl))
+        self._executar("delete from entradas where expira <= ?", (agora,))
+
+    def remover(self, chave: str):
+        self._executar("delete from entradas where chave = ?", (chave,))
+
+    def reservar_carga(self, chave: str, duracao: float) -> bool:
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute("delete from cargas where chave = ? and expira <= ?", (chave, agora))
+            return self._conexao.execute("insert or ignore into cargas values (?, ?)", (chave, agora + duracao)).rowcount == 1
+
+    def liberar_carga(self, chave: str):
+        self._executar("delete from cargas where chave = ?", (chave,))
+
+    def versao(self, dataset: str) -> int:
+        linhas = self._executar("select versao from versoes where dataset = ?", (dataset,))
+        return linhas[0][0] if linhas else 0
+
+    def invalidar(self, datasets: list, origem: str):
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute("begin immediate")
+            try:
+                self._conexao.executemany(
+                    "insert into versoes values (?, 1) on conflict(dataset) do update set versao = versao + 1",
+                    [(dataset,) for dataset in datasets]
+                )
+                self._conexao.execute("insert into eventos (origem, datasets, criado) values (?, ?, ?)",
+                                      (origem, json.dumps(datasets), agora))
+                self._conexao.execute("delete from eventos where criado < ?", (agora - RETENCAO_EVENTOS_S,))
+                self._conexao.execute("commit")
+            except Exception:
+                self._conexao.execute("rollback")
+                raise
+
+    def eventos_desde(self, ultimo_id: int) -> list:
+        linhas = self._executar("select id, origem, datasets from eventos where id > ? order by id", (ultimo_id,))
+        return [(id_evento, origem, json.loads(datasets)) for id_evento, origem, datasets in linhas]
+
+
+BACKENDS = {"sqlite": lambda config: BackendSQLite(config["caminho"])}
+
+
+class CamadaDistribuida:
+    """Lê e grava datasets no backend compartilhado e repassa as invalidações das outras réplicas."""
+    def __init__(self, backend: BackendCache, config: dict):
+        self.backend = backend
+        self.config = config
+        self.id_replica = uuid.uuid4().hex[:8]
+        self._metricas = {'acertos': 0, 'cargas': 0, 'esperas': 0, 'eventos_recebidos': 0, 'falhas_backend': 0}
+        self._lock_metricas = threading.Lock()
+        self._ultimo_evento = max((e[0] for e in backend.eventos_desde(0)), default=0)
+
+    def _contar(self, metrica: str):
+        # Sessões, o aquecimento e a escuta de eventos contam em threads diferentes
+        with self._lock_metricas:
+            self._metricas[metrica] += 1
+
+    def resumo_metricas(self) -> dict:
+        with self._lock_metricas:
+            return dict(self._metricas)
+
+    @staticmethod
+    def _resumo(partes: tuple) -> str:
+        return hashlib.sha256(repr(partes).encode()).hexdigest()[:16]
+
+    def particao(self, dataset: str, partes: tuple) -> str:
+        """Nome da partição do dataset para os argumentos dados (para invalidar só ela)."""
+        return f"{dataset}{SEPARADOR_PARTICAO}{self._resumo(partes)}"
+
+    def _chave(self, dataset: str, partes: tuple) -> str:
+        # As duas versões só crescem: invalidar o dataset ou só a partição sempre gera uma chave nova
+        versao = self.backend.versao(dataset) + self.backend.versao(self.particao(dataset, partes))
+        return f"{dataset}:v{versao}:{FORMATO_VALOR}:{self._resumo(partes)}"
+
+    def _ler(self, chave: str):
+        """Valor desserializado, ou None se não houver ou não puder ser lido (tratado como falta)."""
+        dados = self.backend.ler(chave)
+        if dados is None:
+            return None
+        try:
+            return desserializar(dados)
+        except Exception as e:
+            logger.warning(f"Valor ilegível no cache distribuído ({chave}): {e}")
+            return None
+
+    def _falha_backend(self, operacao: str, chave: str, erro: Exception):
+        self._contar('falhas_backend')
+        logger.warning(f"Cache distribuído indisponível ao {operacao} '{chave}': {erro}")
+
+    def _esperar_carga(self, chave: str):
+        """Reserva a carga da chave (retorna None) ou devolve o valor carregado por outra réplica."""
+        espera = float(self.config["espera_carga_s"])
+        if self.backend.reservar_carga(chave, espera):
+            return None
+        # Outra réplica está carregando a mesma chave: espera o resultado dela. Se a reserva
+        # sumir sem valor gravado (carga vazia ou com erro), esta réplica assume a carga.
+        self._contar('esperas')
+        limite = time.monotonic() + espera
+        while time.monotonic() < limite:
+            time.sleep(0.2)
+            valor = self._ler(chave)
+            if valor is not None:
+                return valor
+            if self.backend.reservar_carga(chave, espera):
+                return None
+        return None
+
+    def obter(self, dataset: str, partes: tuple, carregar, ttl: float):
+        """Valor do dataset: do backend, se outra réplica já carregou; senão carrega e publica."""
+        try:
+            chave = self._chave(dataset, partes)
+            valor = self._ler(chave)
+            if valor is None:
+                valor = self._esperar_carga(chave)
+        except Exception as e:
+            # Sem o backend, carrega direto: a página funciona como se a camada estivesse desligada
+            self._falha_backend("ler", dataset, e)
+            return carregar()
+        if valor is not None:
+            self._contar('acertos')
+            return valor
+
+        self._contar('cargas')
+        try:
+            resultado = carregar()
+            # Resultado vazio costuma ser falha de consulta: não espalha para as outras réplicas
+            if not _vazio(resultado):
+                try:
+                    dados = serializar(resultado)
+                except (TypeError, ValueError) as e:
+                    # Fica só no cache desta réplica; as outras carregam por conta própria
+                    logger.warning(f"Dataset '{dataset}' não pôde ir para o cache distribuído: {e}")
+                else:
+                    try:
+                        self.backend.gravar(chave, dados, ttl)
+                    except Exception as e:
+                        self._falha_backend("gravar", chave, e)
+            return resultado
+        finally:
+            try:
+                self.backend.liberar_carga(chave)
+            except Exception as e:
+                # A reserva expira sozinha em espera_carga_s
+                self._falha_backend("liberar", chave, e)
+
+    def ler_registro(self, chave: str):
+        """Registro avulso (dicionário JSON) gravado por qualquer réplica, ou None."""
+        dados = self.backend.ler(PREFIXO_REGISTRO + chave)
+        return None if dados is None else json.loads(dados)
+
+    def gravar_registro(self, chave: str, registro: dict, ttl: float):
+        self.backend.gravar(PREFIXO_REGISTRO + chave, json.dumps(registro).encode(), ttl)
+
+    def remover_registro(self, chave: str):
+        self.backend.remover(PREFIXO_REGISTRO + chave)
+
+    def invalidar(self, datasets: list):
+        try:
+            self.backend.invalidar(datasets, self.id_replica)
+        except Exception as e:
+            # A limpeza local segue; as outras réplicas só se atualizam pelo TTL
+            self._falha_backend("invalidar", ", ".join(datasets), e)
+
+    def iniciar_escuta(self, ao_invalidar):
+        """Thread que aplica, nesta réplica, as invalidações publicadas pelas outras."""
+        def escutar():
+            while True:
+                time.sleep(float(self.config["intervalo_eventos_s"]))
+                try:
+                    eventos = self.backend.eventos_desde(self._ultimo_evento)
+                except Exception as e:
+                    logger.warning(f"Falha ao ler eventos do cache distribuído: {e}")
+                    continue
+                for id_evento, origem, datasets in eventos:
+                    self._ultimo_evento = id_evento
+                    if origem != self.id_replica:
+                        self._contar('eventos_recebidos')
+                        try:
+                            ao_invalidar(datasets)
+                        except Exception:
+                            # Um callback com erro não pode parar a escuta desta réplica
+                            logger.exception(f"Falha ao aplicar a invalidação de {datasets}.")
+        threading.Thread(target=escutar, name=NOME_THREAD, daemon=True).start()
+
+
+def criar_camada_distribuida(config: dict):
+    """Camada configurada em [CACHE_DISTRIBUIDO], ou None quando desligada."""
+    if not config.get("backend"):
+        return None
+    if config["backend"] not in BACKENDS:
+        raise ValueError(f"Backend de cache distribuído desconhecido: {config['backend']}")
+    return CamadaDistribuida(BACKENDS[config["backend"]](config), config)
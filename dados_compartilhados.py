@@ -0,0 +1,199 @@
+# dados_compartilhados.py
+"""
+Catálogo e movimentações compartilhados por todas as sessões, sem cópia.
+
+st.cache_data serializa o resultado e entrega uma cópia desserializada a cada chamada: com muitos
+caixas abertos, a memória e o tempo de desserialização crescem com o número de sessões. Os datasets
+decorados com `cache_compartilhado` ficam em st.cache_resource: um único objeto por chave, entregue
+por referência a todas as sessões.
+
+Para que uma sessão não altere o que as outras veem:
+- DataFrames são lidos com `vista()`, uma cópia rasa que reaproveita os arrays. Com o Copy-on-Write
+  do pandas, escrever na vista (ou criar colunas nela) copia só o que foi alterado;
+- listas de registros viram tuplas de dicionários somente leitura (`congelar_registros`).
+
+Com várias réplicas, uma falta no cache em memória consulta antes a camada distribuída
+(cache_distribuido.py), e as invalidações são repassadas às outras réplicas.
+"""
+import functools
+import inspect
+import logging
+from types import MappingProxyType
+
+import pandas as pd
+import streamlit as st
+from supabase import Client
+
+from utils import supabase_client_hash_func
+from cache_distribuido import CACHE_DISTRIBUIDO_CONFIG_PADRAO, SEPARADOR_PARTICAO, criar_camada_distribuida
+
+# Copy-on-Write é sempre ativo a partir do pandas 3; nas versões anteriores precisa ser ligado
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+logger = logging.getLogger(__name__)
+
+_caches_compartilhados = {}
+_assinaturas = {}
+_grupos = {}
+_apos_invalidacao = []
+TODOS_OS_DATASETS = '*'
+# Datasets que exibem saldo de estoque: invalidados juntos depois de cada movimentação
+GRUPO_ESTOQUE = 'estoque'
+# Datasets que mudam a cada venda (listas de movimentações e estoque total da rede): invalidados
+# depois de cada venda. O catálogo do local da venda é invalidado à parte, só naquela partição
+GRUPO_MOVIMENTACOES = 'movimentacoes'
+
+
+def get_cache_distribuido_config() -> dict:
+    config = dict(CACHE_DISTRIBUIDO_CONFIG_PADRAO)
+    try:
+        config.update(dict(st.secrets.get("CACHE_DISTRIBUIDO", {})))
+    except Exception:
+        pass
+    return config
+
+
+@st.cache_resource
+def get_camada_distribuida():
+    """Camada compartilhada entre réplicas (None quando desligada em [CACHE_DISTRIBUIDO])."""
+    camada = criar_camada_distribuida(get_cache_distribuido_config())
+    if camada:
+        camada.iniciar_escuta(_aplicar_invalidacao_remota)
+    return camada
+
+
+def _partes_da_chave(assinatura: inspect.Signature, args: tuple, kwargs: dict) -> tuple:
+    # Mesmas regras do Streamlit: argumentos com "_" não entram na chave; o cliente é o do processo
+    argumentos = assinatura.bind(*args, **kwargs)
+    argumentos.apply_defaults()
+    return tuple(
+        (nome, valor) for nome, valor in argumentos.arguments.items()
+        if not nome.startswith('_') and not isinstance(valor, Client)
+    )
+
+
+def cache_compartilhado(ttl: int, grupos: tuple = ()):
+    """Decorador equivalente a st.cache_data(ttl=...), mas com o resultado compartilhado por referência.
+
+    `grupos` permite invalidar o dataset com invalidar_grupo() sem importar o módulo que o define.
+    """
+    def decorador(func):
+        dataset = f"{func.__module__}.{func.__qualname__}"
+        assinatura = inspect.signature(func)
+
+        @functools.wraps(func)
+        def carregar(*args, **kwargs):
+            camada = get_camada_distribuida()
+            if camada is None:
+                return func(*args, **kwargs)
+            return camada.obter(dataset, _partes_da_chave(assinatura, args, kwargs), lambda: func(*args, **kwargs), ttl)
+
+        funcao_cacheada = st.cache_resource(ttl=ttl, hash_funcs={Client: supabase_client_hash_func})(carregar)
+        _caches_compartilhados[dataset] = funcao_cacheada
+        _assinaturas[dataset] = assinatura
+        for grupo in grupos:
+            _grupos.setdefault(grupo, []).append(dataset)
+        return funcao_cacheada
+    return decorador
+
+
+def vista(df: pd.DataFrame) -> pd.DataFrame:
+    """Vista de um DataFrame compartilhado: mesma memória, mas alterações ficam só nesta sessão."""
+    return df.copy(deep=False)
+
+
+def congelar_registros(registros) -> tuple:
+    """Converte uma lista de dicionários em uma tupla de dicionários somente leitura."""
+    return tuple(MappingProxyType(dict(registro)) for registro in registros)
+
+
+def _limpar_caches_locais(datasets: list, remota: bool = False):
+    """Limpa os caches em memória desta réplica (todos, se datasets contém TODOS_OS_DATASETS)."""
+    if TODOS_OS_DATASETS in datasets:
+        st.cache_data.clear()
+        for funcao_cacheada in _caches_compartilhados.values():
+            funcao_cacheada.clear()
+        _avisar_invalidacao([TODOS_OS_DATASETS], remota)
+    else:
+        # Uma partição invalidada por outra réplica limpa aqui o dataset inteiro: as demais
+        # partições continuam válidas na camada compartilhada e são relidas de lá
+        datasets = list(dict.fromkeys(dataset.split(SEPARADOR_PARTICAO)[0] for dataset in datasets))
+        for dataset in datasets:
+            if dataset in _caches_compartilhados:
+                _caches_compartilhados[dataset].clear()
+        _avisar_invalidacao(datasets, remota)
+
+
+def _aplicar_invalidacao_remota(datasets: list):
+    _limpar_caches_locais(datasets, remota=True)
+
+
+def _avisar_invalidacao(datasets: list, remota: bool = False):
+    for callback, somente_remotas in _apos_invalidacao:
+        if remota or not somente_remotas:
+            try:
+                callback(datasets)
+            except Exception:
+                logger.exception(f"Falha no callback de invalidação de {datasets}.")
+
+
+def _invalidar(datasets: list):
+    # Primeiro a nova versão na camada compartilhada, depois a limpeza local: uma leitura concorrente
+    # nesta réplica não pode repor no cache local o valor da chave antiga (esta réplica ignora os
+    # próprios eventos e ficaria desatualizada até o TTL)
+    camada = get_camada_distribuida()
+    if camada:
+        # Novas versões para todos os datasets; o marcador avisa as outras réplicas para limparem tudo
+        camada.invalidar(list(_caches_compartilhados) + [TODOS_OS_DATASETS] if TODOS_OS_DATASETS in datasets else datasets)
+    _limpar_caches_locais(datasets)
+
+
+def nome_do_dataset(funcao_cacheada) -> str:
+    """Nome do dataset de uma função decorada com cache_compartilhado."""
+    return next(dataset for dataset, funcao in _caches_compartilhados.items() if funcao is funcao_cacheada)
+
+
+def invalidar_datasets(*funcoes_cacheadas):
+    """Invalida só os datasets indicados, nesta réplica e nas demais."""
+    _invalidar([nome_do_dataset(funcao) for funcao in funcoes_cacheadas])
+
+
+def invalidar_particao(funcao_cacheada, *args, **kwargs):
+    """Invalida só a entrada de funcao_cacheada(*args, **kwargs) (ex.: o catálogo de um local)."""
+    dataset = nome_do_dataset(funcao_cacheada)
+    # Mesma ordem de _invalidar: a versão compartilhada antes do cache local
+    camada = get_camada_distribuida()
+    if camada:
+        camada.invalidar([camada.particao(dataset, _partes_da_chave(_assinaturas[dataset], args, kwargs))])
+    funcao_cacheada.clear(*args, **kwargs)
+    _avisar_invalidacao([dataset])
+
+
+def invalidar_grupo(grupo: str):
+    """Invalida todos os datasets marcados com o grupo, nesta réplica e nas demais."""
+    _invalidar(list(_grupos.get(grupo, [])))
+
+
+def limpar_caches():
+    """Invalida os dados em cache (st.cache_data e os datasets compartilhados), em todas as réplicas.
+
+    Não usa st.cache_resource.clear(): isso derrubaria também o cliente Supabase, o monitor de
+    estoque baixo, o agendador da previsão e as sessões persistidas.
+    """
+    _invalidar([TODOS_OS_DATASETS])
+
+
+def registrar_apos_invalidacao(callback, somente_remotas: bool = False):
+    """Registra uma função chamada com os datasets de cada invalidação, local ou vinda de outra
+    réplica (TODOS_OS_DATASETS depois de limpar_caches()). Ex.: o aquecimento de cache.
+
+    `somente_remotas` limita às invalidações vindas de outras réplicas (ex.: o monitor de estoque
+    baixo, que já recebe por delta as movimentações feitas nesta réplica).
+    """
+    _apos_invalidacao.append((callback, somente_remotas))
+
+
+def afeta_grupo(datasets: list, grupo: str) -> bool:
+    """Se uma invalidação (os datasets recebidos pelo callback) atinge algum dataset do grupo."""
+    return TODOS_OS_DATASETS in datasets or any(dataset in _grupos.get(grupo, []) for dataset in datasets)
@@ -7,7 +7,13 @@ import pytz
 from supabase import Client
 
 # Importa as funções de renderização de cada página e a conexão
-from utils import init_connection
+from utils import init_connection, get_metricas_conexao
+from schema import COLUNAS_PRODUTOS_DASHBOARD, tipar_dataframe, relatorio_memoria
+from estoque_baixo import get_monitor_estoque_baixo
+from locais import seletor_local
+from dados_compartilhados import GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES, cache_compartilhado, get_camada_distribuida
+from sessoes import iniciar_sessao, restaurar_sessao, encerrar_sessao, gravar_cookie_sessao
+from aquecimento_cache import get_aquecedor_cache
 from pages import gestao_produtos_page, gerenciamento_usuarios_page, movimentacao_page, pdv_page, relatorios_page
 
 # Configuração da página
@@ -15,35 +21,127 @@ st.set_page_config(page_title="Sistoque | Sistema de Gestão", layout="wide")
 
 # --- FUNÇÕES AUXILIARES ---
 
-def supabase_client_hash_func(client: Client) -> int:
-    return id(client)
-
-@st.cache_data(ttl=60, hash_funcs={Client: supabase_client_hash_func})
+@cache_compartilhado(ttl=60, grupos=(GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES))
 def get_dashboard_data(supabase: Client):
-    df_produtos = pd.DataFrame(supabase.table('produtos').select('*').execute().data)
-    return df_produtos
+    df_produtos = pd.DataFrame(supabase.table('produtos').select(COLUNAS_PRODUTOS_DASHBOARD).execute().data)
+    return tipar_dataframe(df_produtos, 'dashboard.produtos')
 
 def get_user_profile(supabase_client, user_id):
     response = supabase_client.table('perfis').select('cargo, status, nome_completo').eq('id', user_id).single().execute()
     return response.data if response.data else None
 
 def logout():
+    encerrar_sessao()
     st.session_state.user = None
     st.session_state.user_role = None
-    st.cache_data.clear()
     st.rerun()
 
+def render_metricas_conexao():
+    """Mostra o uso do pool HTTP compartilhado com o Supabase (reuso de conexões, retentativas)."""
+    metricas = get_metricas_conexao()
+    with st.expander("📡 Conexões com o Supabase"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Requisições", metricas['requisicoes'])
+        col2.metric("Conexões Abertas", metricas['conexoes_abertas'])
+        col3.metric("Reuso de Conexões", f"{metricas['taxa_reuso']:.0%}")
+        col4.metric("Retentativas", metricas['retentativas'])
+        st.caption(
+            f"Latência média: {metricas['latencia_media_ms']:.0f} ms · "
+            f"Falhas: {metricas['falhas']} · Versões HTTP: {metricas['por_versao_http']}"
+        )
+
+def render_memoria_caches():
+    """Mostra a memória de cada dataset em cache antes e depois da tipagem compacta."""
+    df_memoria = relatorio_memoria()
+    with st.expander("🧠 Memória dos Dados em Cache"):
+        if df_memoria.empty:
+            st.info("Nenhum dataset carregado ainda neste servidor.")
+            return
+        df_display = df_memoria.assign(
+            antes_kb=df_memoria['antes_bytes'] / 1024, depois_kb=df_memoria['depois_bytes'] / 1024
+        )
+        st.dataframe(
+            df_display[['dataset', 'linhas', 'antes_kb', 'depois_kb', 'reducao']],
+            column_config={
+                'dataset': 'Dataset', 'linhas': 'Linhas',
+                'antes_kb': st.column_config.NumberColumn("Antes (KB)", format="%.1f"),
+                'depois_kb': st.column_config.NumberColumn("Depois (KB)", format="%.1f"),
+                'reducao': st.column_config.ProgressColumn("Redução", min_value=0, max_value=1, format="percent"),
+            },
+            use_container_width=True, hide_index=True
+        )
+
+def render_cache_distribuido():
+    """Mostra o uso da camada de cache compartilhada entre réplicas (quando configurada)."""
+    camada = get_camada_distribuida()
+    if camada is None:
+        return
+    with st.expander("🗄️ Cache Compartilhado entre Réplicas"):
+        col1, col2, col3, col4, col5 = st.columns(5)
+        metricas = camada.resumo_metricas()
+        col1.metric("Lidos do Cache Compartilhado", metricas['acertos'])
+        col2.metric("Carregados Aqui", metricas['cargas'])
+        col3.metric("Esperas por Carga", metricas['esperas'])
+        col4.metric("Invalidações Recebidas", metricas['eventos_recebidos'])
+        col5.metric("Falhas do Backend", metricas['falhas_backend'],
+                    help="Operações em que o backend compartilhado falhou e o dataset foi carregado direto.")
+        st.caption(f"Réplica {camada.id_replica} · backend {camada.config['backend']}")
+
+def render_aquecimento_cache(supabase_client: Client):
+    """Mostra os últimos aquecimentos de cache e quanto tempo cada dataset levou para carregar."""
+    aquecedor = get_aquecedor_cache(supabase_client)
+    with st.expander("🔥 Aquecimento de Cache"):
+        ultima = aquecedor.ultima_execucao()
+        proxima = aquecedor.proxima_execucao()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Último Aquecimento", ultima['inicio'].strftime('%d/%m %H:%M') if ultima else "—")
+        col2.metric("Duração", f"{ultima['duracao_s']:.1f} s" if ultima else "—")
+        col3.metric("Próximo", proxima[0].strftime('%d/%m %H:%M') if proxima else "—",
+                    help=f"Motivo: {proxima[1]}" if proxima else "Sem horários configurados.")
+        if st.button("Aquecer agora", key="aquecer_cache_agora"):
+            aquecedor.solicitar_aquecimento("manual")
+            st.toast("Aquecimento solicitado.")
+        if not ultima:
+            st.info("Aquecimento inicial em andamento.")
+            return
+        for nome, erro in ultima['erros'].items():
+            st.warning(f"{nome}: {erro}")
+        df_etapas = pd.DataFrame(list(ultima['etapas'].items()), columns=['dataset', 'duracao_s'])
+        st.dataframe(
+            df_etapas.sort_values('duracao_s', ascending=False),
+            column_config={'dataset': 'Dataset', 'duracao_s': st.column_config.NumberColumn("Duração (s)", format="%.2f")},
+            use_container_width=True, hide_index=True
+        )
+        st.caption("Histórico de aquecimentos")
+        st.dataframe(
+            aquecedor.historico(),
+            column_config={
+                'inicio': st.column_config.DatetimeColumn("Início", format="DD/MM HH:mm:ss"), 'motivo': 'Motivo',
+                'duracao_s': st.column_config.NumberColumn("Duração (s)", format="%.2f"),
+                'etapa_mais_lenta': 'Etapa Mais Lenta', 'erros': 'Erros',
+            },
+            use_container_width=True, hide_index=True
+        )
+
 # --- PÁGINA PRINCIPAL ---
 def main():
     supabase = init_connection()
     if not supabase:
         st.stop()
 
+    # Inicia o aquecimento em segundo plano já na primeira execução (antes do login)
+    get_aquecedor_cache(supabase)
+
     if 'user' not in st.session_state:
         st.session_state.user = None
     if 'user_role' not in st.session_state:
         st.session_state.user_role = None
 
+    # Recarregamento ou reconexão: retoma a sessão persistida sem novo login
+    if st.session_state.user is None:
+        restaurar_sessao()
+    gravar_cookie_sessao()
+
     # --- TELA DE LOGIN (agora muito mais simples) ---
     if st.session_state.user is None:
         st.markdown("""<style>[data-testid="stSidebar"] {display: none;}</style>""", unsafe_allow_html=True)
@@ -60,8 +158,7 @@ def main():
                         session = supabase.auth.sign_in_with_password({"email": email, "password": password})
                         profile = get_user_profile(supabase, session.user.id)
                         if profile and profile['status'] == 'Ativo':
-                            st.session_state.user = session.user
-                            st.session_state.user_role = profile['cargo']
+                            iniciar_sessao(session, profile['cargo'])
                             st.rerun()
                         elif profile and profile['status'] == 'Pendente':
                             st.warning("Sua conta está aguardando aprovação de um administrador.")
@@ -111,6 +208,10 @@ def main():
         with st.sidebar:
             st.subheader(f"Bem-vindo(a), {st.session_state.user.user_metadata.get('nome_completo', '')}!")
             st.write(f"Cargo: **{st.session_state.user_role}**")
+            seletor_local(supabase)
+            total_estoque_baixo = get_monitor_estoque_baixo(supabase).total()
+            if total_estoque_baixo:
+                st.warning(f"⚠️ **{total_estoque_baixo}** {'produto' if total_estoque_baixo == 1 else 'produtos'} com estoque baixo")
             if st.button("Sair (Logout)", use_container_width=True):
                 logout()
 
@@ -126,6 +227,11 @@ def main():
         if selected == "Dashboard":
             st.title("📈 Dashboard de Performance")
             # Código completo do seu dashboard aqui
+            if st.session_state.user_role == 'Admin':
+                render_metricas_conexao()
+                render_memoria_caches()
+                render_cache_distribuido()
+                render_aquecimento_cache(supabase)
         elif selected == "PDV":
             pdv_page.render_page(supabase)
         elif selected == "Produtos":
@@ -0,0 +1,164 @@
+# estoque_baixo.py
+"""
+Índice de produtos com estoque baixo (estoque_atual <= qtd_minima_estoque), mantido em memória
+e atualizado por delta a cada movimentação ou venda, sem varrer a tabela de produtos.
+
+Movimentações feitas em outras réplicas não passam por aqui: quando chega a invalidação de um
+dataset de estoque vinda de outra réplica, o índice é recarregado na próxima leitura.
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+import requests
+import streamlit as st
+from supabase import Client
+
+from utils import supabase_client_hash_func
+from dados_compartilhados import GRUPO_ESTOQUE, afeta_grupo, registrar_apos_invalidacao
+
+logger = logging.getLogger(__name__)
+
+EVENTO_ESTOQUE_BAIXO = 'estoque_baixo'
+EVENTO_ESTOQUE_REPOSTO = 'estoque_reposto'
+
+
+class MonitorEstoqueBaixo:
+    """Mantém o estado de estoque de cada produto e o conjunto dos que estão abaixo do mínimo."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._produtos = {}
+        self._em_alerta = set()
+        self._ganchos = []
+        self._desatualizado = True
+        self._sync_lock = threading.Lock()
+
+    # --- CARGA E SINCRONIZAÇÃO ---
+
+    def sincronizar(self, supabase_client: Client, page_size: int = 1000):
+        """Carga completa (paginada) do estado de estoque. Só é usada na partida ou após edições de cadastro."""
+        produtos = {}
+        current_page = 0
+        while True:
+            start_index = current_page * page_size
+            batch = supabase_client.table('produtos').select(
+                'id, nome, tipo, status, estoque_atual, qtd_minima_estoque'
+            ).order('id').range(start_index, start_index + page_size - 1).execute().data
+            if not batch: break
+            for p in batch:
+                produtos[p['id']] = {
+                    'nome': p['nome'], 'tipo': p.get('tipo'), 'status': p.get('status'),
+                    'estoque_atual': int(p.get('estoque_atual') or 0),
+                    'qtd_minima_estoque': int(p.get('qtd_minima_estoque') or 0),
+                }
+            current_page += 1
+        with self._lock:
+            self._produtos = produtos
+            self._em_alerta = {pid for pid, p in produtos.items() if self._abaixo_do_minimo(p)}
+            self._desatualizado = False
+
+    def invalidar(self):
+        """Marca o índice para recarga (ex.: cadastro editado ou importação em massa)."""
+        with self._lock:
+            self._desatualizado = True
+
+    def garantir_sincronizado(self, supabase_client: Client):
+        if self._desatualizado:
+            # Evita que várias sessões façam a carga completa ao mesmo tempo
+            with self._sync_lock:
+                if self._desatualizado:
+                    self.sincronizar(supabase_client)
+
+    # --- ATUALIZAÇÃO POR DELTA ---
+
+    @staticmethod
+    def _abaixo_do_minimo(produto: dict) -> bool:
+        return produto['estoque_atual'] <= produto['qtd_minima_estoque']
+
+    def aplicar_movimentacao(self, produto_id, tipo: str, quantidade: int):
+        """Aplica o delta de uma movimentação já confirmada no banco e dispara alertas de cruzamento."""
+        delta = quantidade if tipo == 'ENTRADA' else -quantidade
+        with self._lock:
+            produto = self._produtos.get(produto_id)
+            if produto is None:
+                # Produto ainda não indexado: a próxima sincronização o incluirá
+                self._desatualizado = True
+                return
+            estava_em_alerta = produto_id in self._em_alerta
+            produto['estoque_atual'] += delta
+            esta_em_alerta = self._abaixo_do_minimo(produto)
+            if esta_em_alerta:
+                self._em_alerta.add(produto_id)
+            else:
+                self._em_alerta.discard(produto_id)
+            alerta = None
+            if esta_em_alerta != estava_em_alerta:
+                alerta = {
+                    'evento': EVENTO_ESTOQUE_BAIXO if esta_em_alerta else EVENTO_ESTOQUE_REPOSTO,
+                    'produto_id': produto_id, 'nome': produto['nome'], 'tipo': produto['tipo'],
+                    'estoque_atual': produto['estoque_atual'],
+                    'qtd_minima_estoque': produto['qtd_minima_estoque'],
+                    'data': datetime.now(timezone.utc).isoformat(),
+                }
+            ganchos = list(self._ganchos)
+        if alerta:
+            for gancho in ganchos:
+                try:
+                    gancho(alerta)
+                except Exception:
+                    logger.exception("Falha ao executar gancho de alerta de estoque baixo.")
+
+    # --- CONSULTA ---
+
+    def registrar_gancho(self, gancho):
+        """Registra uma função chamada com o dicionário do alerta quando um produto cruza o mínimo."""
+        with self._lock:
+            self._ganchos.append(gancho)
+
+    def total(self) -> int:
+        with self._lock:
+            return len(self._em_alerta)
+
+    def listar(self, categoria: str = None) -> pd.DataFrame:
+        """Produtos em alerta, ordenados pelo déficit em relação ao mínimo."""
+        with self._lock:
+            linhas = [{'id': pid, **self._produtos[pid]} for pid in self._em_alerta]
+        df = pd.DataFrame(linhas, columns=['id', 'nome', 'tipo', 'status', 'estoque_atual', 'qtd_minima_estoque'])
+        if categoria and categoria != "Todas":
+            df = df[df['tipo'] == categoria]
+        df['deficit'] = df['qtd_minima_estoque'] - df['estoque_atual']
+        return df.sort_values(['deficit', 'nome'], ascending=[False, True])
+
+
+def criar_gancho_webhook(url: str, timeout: float = 3.0):
+    """Gancho que envia o alerta em JSON para um webhook, em segundo plano para não atrasar a venda."""
+    def enviar(alerta: dict):
+        def _post():
+            try:
+                requests.post(url, json=alerta, timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Não foi possível enviar alerta para {url}: {e}")
+        threading.Thread(target=_post, daemon=True).start()
+    return enviar
+
+
+@st.cache_resource(hash_funcs={Client: supabase_client_hash_func})
+def _criar_monitor_estoque_baixo(supabase_client: Client) -> MonitorEstoqueBaixo:
+    """Monitor único por processo, compartilhado por todas as sessões."""
+    monitor = MonitorEstoqueBaixo()
+    # Ex.: ALERTAS_WEBHOOK_URL = "http://localhost:8765/alertas" (veja scripts/webhook_local.py)
+    url_webhook = st.secrets.get("ALERTAS_WEBHOOK_URL")
+    if url_webhook:
+        monitor.registrar_gancho(criar_gancho_webhook(url_webhook))
+    registrar_apos_invalidacao(
+        lambda datasets: monitor.invalidar() if afeta_grupo(datasets, GRUPO_ESTOQUE) else None,
+        somente_remotas=True
+    )
+    return monitor
+
+def get_monitor_estoque_baixo(supabase_client: Client) -> MonitorEstoqueBaixo:
+    """Retorna o monitor compartilhado, fazendo a carga completa apenas se ele estiver desatualizado."""
+    monitor = _criar_monitor_estoque_baixo(supabase_client)
+    monitor.garantir_sincronizado(supabase_client)
+    return monitor
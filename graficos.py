@@ -0,0 +1,87 @@
+# graficos.py
+"""
+Agregações para gráficos e tabelas com tamanho limitado, independentemente do volume de dados.
+
+- top-N com um grupo "Outros" (um gráfico com milhares de barras é ilegível e pesado);
+- consolidação por categoria;
+- redução de séries temporais para no máximo MAX_PONTOS_SERIE pontos, escolhendo o intervalo
+  (hora, dia, semana, mês...) conforme o período;
+- tabelas paginadas: só a página atual é enviada ao navegador.
+"""
+import math
+
+import pandas as pd
+import streamlit as st
+
+TOP_N_PADRAO = 15
+ROTULO_OUTROS = "Outros"
+MAX_PONTOS_SERIE = 120
+LINHAS_POR_PAGINA = 200
+
+# Intervalos candidatos, do mais fino ao mais grosso, com a duração aproximada de cada um
+INTERVALOS_SERIE = [
+    ('h', 'hora', pd.Timedelta(hours=1)),
+    ('D', 'dia', pd.Timedelta(days=1)),
+    ('W-MON', 'semana', pd.Timedelta(days=7)),
+    ('MS', 'mês', pd.Timedelta(days=31)),
+    ('QS', 'trimestre', pd.Timedelta(days=92)),
+    ('YS', 'ano', pd.Timedelta(days=366)),
+]
+
+
+def top_n_com_outros(df: pd.DataFrame, coluna_rotulo: str, coluna_valor: str, n: int = TOP_N_PADRAO) -> pd.Series:
+    """As n maiores linhas por valor e a soma das demais em "Outros" (no máximo n + 1 itens)."""
+    valores = df.groupby(coluna_rotulo, observed=True)[coluna_valor].sum()
+    ordenados = valores.sort_values(ascending=False)
+    resultado = ordenados.iloc[:n]
+    restante = ordenados.iloc[n:]
+    if not restante.empty:
+        resultado = pd.concat([resultado, pd.Series({ROTULO_OUTROS: restante.sum()})])
+    resultado.index = resultado.index.astype(str)
+    return resultado
+
+
+def agregar_por_categoria(df: pd.DataFrame, coluna_categoria: str, colunas_valor: list) -> pd.DataFrame:
+    """Soma as colunas de valor por categoria (produtos sem categoria ficam em "Sem categoria")."""
+    categorias = df[coluna_categoria].astype(str).where(df[coluna_categoria].notna(), "Sem categoria")
+    return df[colunas_valor].groupby(categorias).sum().sort_values(colunas_valor[0], ascending=False)
+
+
+def escolher_intervalo(inicio: pd.Timestamp, fim: pd.Timestamp, max_pontos: int = MAX_PONTOS_SERIE):
+    """Menor intervalo (frequência do pandas e nome) que cobre o período com até max_pontos pontos."""
+    duracao = fim - inicio
+    for frequencia, nome, tamanho in INTERVALOS_SERIE:
+        if duracao / tamanho + 1 <= max_pontos:
+            return frequencia, nome
+    frequencia, nome, _ = INTERVALOS_SERIE[-1]
+    return frequencia, nome
+
+
+def reduzir_serie_temporal(datas: pd.Series, valores: pd.Series, max_pontos: int = MAX_PONTOS_SERIE):
+    """Soma os valores por intervalo de tempo. Retorna a série reduzida e o nome do intervalo usado."""
+    serie = pd.Series(valores.to_numpy(), index=pd.DatetimeIndex(datas)).sort_index()
+    if serie.empty:
+        return serie, None
+    frequencia, nome = escolher_intervalo(serie.index.min(), serie.index.max(), max_pontos)
+    return serie.resample(frequencia).sum(), nome
+
+
+def paginar(df: pd.DataFrame, pagina: int, linhas_por_pagina: int = LINHAS_POR_PAGINA) -> pd.DataFrame:
+    inicio = (pagina - 1) * linhas_por_pagina
+    return df.iloc[inicio:inicio + linhas_por_pagina]
+
+
+def tabela_paginada(df: pd.DataFrame, key: str, linhas_por_pagina: int = LINHAS_POR_PAGINA, **kwargs):
+    """Mostra o DataFrame uma página por vez (kwargs vão para st.dataframe)."""
+    total = len(df)
+    paginas = max(1, math.ceil(total / linhas_por_pagina))
+    pagina = 1
+    if paginas > 1:
+        # Os filtros podem reduzir o número de páginas: mantém a página escolhida dentro do limite
+        if st.session_state.get(key, 1) > paginas:
+            st.session_state[key] = paginas
+        pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=key)
+    st.dataframe(paginar(df, pagina, linhas_por_pagina), **kwargs)
+    if paginas > 1:
+        inicio = (pagina - 1) * linhas_por_pagina
+        st.caption(f"Mostrando {inicio + 1}–{min(inicio + linhas_por_pagina, total)} de {total} registros.")
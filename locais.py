@@ -0,0 +1,80 @@
+# locais.py
+"""Locais de estoque (lojas e depósito), o catálogo de cada local e o seletor do local de trabalho da sessão."""
+from types import MappingProxyType
+
+import streamlit as st
+from supabase import Client
+
+from utils import supabase_client_hash_func
+from schema import COLUNAS_ESTOQUE_LOCAL_PDV
+from dados_compartilhados import GRUPO_ESTOQUE, cache_compartilhado, congelar_registros
+
+
+@st.cache_data(ttl=300, hash_funcs={Client: supabase_client_hash_func})
+def get_locais(supabase_client: Client):
+    """Lista os locais ativos."""
+    response = supabase_client.table('locais').select('id, nome, tipo').eq('ativo', True).order('nome').execute()
+    return response.data or []
+
+
+def achatar_estoque_local(linhas: list) -> list:
+    """Converte linhas de 'estoque_locais' com o produto embutido em dicionários de produto com o saldo do local."""
+    return [{**linha['produtos'], 'estoque_atual': linha['quantidade']} for linha in linhas if linha.get('produtos')]
+
+
+@cache_compartilhado(ttl=300, grupos=(GRUPO_ESTOQUE,))
+def get_catalogo_local(supabase_client: Client, local_id: int):
+    """Produtos ativos com saldo no local, categorias e índice código de barras -> produto (usados pelo PDV).
+
+    Carrega apenas a partição do local: o cache guarda uma entrada por local, compartilhada
+    (somente leitura) por todos os caixas desse local. Uma falha na consulta levanta a exceção, para
+    que o catálogo vazio não fique em cache nem seja publicado para as outras réplicas.
+    """
+    all_produtos = []
+    current_page = 0
+    page_size = 1000
+    while True:
+        start_index = current_page * page_size
+        # ALTERAÇÃO: .gte para buscar produtos com estoque >= 0
+        response = supabase_client.table('estoque_locais').select(
+            COLUNAS_ESTOQUE_LOCAL_PDV
+        ).eq('local_id', local_id).gte('quantidade', 0).eq('produtos.status', 'Ativo').order('produto_id').range(start_index, start_index + page_size - 1).execute()
+
+        batch = response.data
+        if not batch: break
+        all_produtos.extend(achatar_estoque_local(batch))
+        current_page += 1
+    produtos = congelar_registros(all_produtos)
+    categorias = ("Todos",) + tuple(sorted(set(p['tipo'] for p in produtos if p['tipo'])))
+    # Índice código de barras -> produto, para cada leitura ser uma consulta direta
+    indice_codigos = MappingProxyType({p['codigo_barras']: p for p in produtos if p.get('codigo_barras')})
+    return produtos, categorias, indice_codigos
+
+
+def _ao_trocar_local():
+    # O carrinho pertence ao estoque de um local: trocar de local descarta a venda em andamento
+    st.session_state.pdv_carrinho = {}
+    st.session_state.payment_step = False
+
+
+def seletor_local(supabase_client: Client):
+    """Mostra o seletor do local de trabalho e retorna o id escolhido (guardado em st.session_state.local_id)."""
+    locais = get_locais(supabase_client)
+    if not locais:
+        st.error("Nenhum local de estoque cadastrado.")
+        return None
+    opcoes = {local['id']: f"{local['nome']} ({local['tipo']})" for local in locais}
+    if st.session_state.get('local_id') not in opcoes:
+        st.session_state.local_id = next(iter(opcoes))
+    st.selectbox(
+        "📍 Local de Trabalho", options=list(opcoes), format_func=opcoes.get,
+        key='local_id', on_change=_ao_trocar_local
+    )
+    return st.session_state.local_id
+
+
+def nome_do_local(supabase_client: Client, local_id) -> str:
+    for local in get_locais(supabase_client):
+        if local['id'] == local_id:
+            return local['nome']
+    return "—"
@@ -3,6 +3,8 @@ import pandas as pd
 # --- ADICIONADO ---
 from utils import supabase_client_hash_func
 from supabase import Client
+from sessoes import get_armazem_sessoes
+from dados_compartilhados import limpar_caches
 
 # --- MODIFICADO ---
 @st.cache_data(ttl=60, hash_funcs={Client: supabase_client_hash_func})
@@ -13,6 +15,8 @@ def get_all_profiles(supabase_client: Client):
 def update_user_status(supabase_client, user_id, new_status):
     try:
         supabase_client.table('perfis').update({'status': new_status}).eq('id', user_id).execute()
+        # Sessões persistidas guardam o perfil: o usuário precisa entrar de novo
+        get_armazem_sessoes().revogar_usuario(user_id)
         return True
     except Exception as e:
         st.error(f"Erro ao atualizar status: {e}")
@@ -22,7 +26,7 @@ def render_page(supabase_client):
     st.title("👑 Gerenciamento de Usuários e Permissões")
 
     if st.button("Atualizar Lista de Usuários"):
-        st.cache_data.clear()
+        limpar_caches()
 
     df_perfis = get_all_profiles(supabase_client)
 
@@ -41,7 +45,7 @@ def render_page(supabase_client):
                     if st.button("✅ Ativar", key=f"ativar_{row['id']}", use_container_width=True):
                         if update_user_status(supabase_client, row['id'], 'Ativo'):
                             st.success(f"Usuário {row['nome_completo']} ativado!")
-                            st.cache_data.clear()
+                            limpar_caches()
                             st.rerun()
         else:
             st.success("Nenhum usuário pendente de ativação.")
@@ -68,6 +72,7 @@ def render_page(supabase_client):
                     for user_id, user_data in editados.items():
                         if user_id in originais and user_data != originais[user_id]:
                              supabase_client.table('perfis').update({'cargo': user_data['cargo'], 'status': user_data['status']}).eq('id', user_id).execute()
+                             get_armazem_sessoes().revogar_usuario(user_id)
                     st.success("Alterações salvas!")
-                    st.cache_data.clear()
+                    limpar_caches()
                     st.rerun()
@@ -1,19 +1,28 @@
 # pages/gestao_produtos_page.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import time
 from supabase import Client
-from utils import supabase_client_hash_func
+from schema import COLUNAS_PRODUTOS_GESTAO, tipar_dataframe, normalizar_dinheiro
+from estoque_baixo import get_monitor_estoque_baixo
+from dados_compartilhados import GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES, cache_compartilhado, vista, limpar_caches
+from graficos import tabela_paginada
+from locais import get_locais
 import io
 import requests
 
 # --- FUNÇÕES DE DADOS (CACHE) ---
-@st.cache_data(ttl=60, hash_funcs={Client: supabase_client_hash_func})
+@cache_compartilhado(ttl=60, grupos=(GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES))
 def get_produtos(supabase_client: Client):
-    """Busca todos os produtos do banco de dados."""
+    """Busca todos os produtos do banco de dados (DataFrame compartilhado: leia com vista()).
+
+    O índice é o id do produto, montado uma vez por carga, para a edição achar o produto sem varrer a tabela.
+    """
     try:
-        response = supabase_client.table('produtos').select('*').order('nome').execute()
-        return pd.DataFrame(response.data)
+        response = supabase_client.table('produtos').select(COLUNAS_PRODUTOS_GESTAO).order('nome').execute()
+        df = tipar_dataframe(pd.DataFrame(response.data), 'gestao.produtos')
+        return df.set_index('id', drop=False).rename_axis(None) if not df.empty else df
     except Exception as e:
         st.error(f"Erro ao buscar produtos: {e}")
         return pd.DataFrame()
@@ -34,6 +43,190 @@ def buscar_foto_online(nome_produto):
         return None
     return None
 
+# --- ALTERAÇÃO EM LOTE DE PREÇOS E CATEGORIAS ---
+REGRA_REAJUSTE = "Reajustar preço de venda (%)"
+REGRA_MARGEM = "Definir margem sobre a venda (%)"
+REGRA_PRECO_FIXO = "Definir preço de venda (R$)"
+REGRA_CATEGORIA = "Alterar categoria"
+REGRAS_EM_LOTE = [REGRA_REAJUSTE, REGRA_MARGEM, REGRA_PRECO_FIXO, REGRA_CATEGORIA]
+
+TERMINACOES_PRECO = {"Sem ajuste": None, "Terminar em ,90": 0.90, "Terminar em ,99": 0.99}
+
+def filtrar_produtos(df: pd.DataFrame, categorias: list, status: list, busca: str) -> pd.DataFrame:
+    mascara = pd.Series(True, index=df.index)
+    if categorias:
+        mascara &= df['tipo'].isin(categorias)
+    if status:
+        mascara &= df['status'].isin(status)
+    if busca:
+        mascara &= df['nome'].str.contains(busca, case=False, na=False, regex=False)
+    return df[mascara]
+
+def aplicar_terminacao(precos: pd.Series, terminacao: float) -> pd.Series:
+    """Sobe cada preço para o próximo valor com os centavos indicados (ex.: 10,32 → 10,90)."""
+    candidatos = np.floor(precos) + terminacao
+    return candidatos.where(candidatos >= precos.round(2), candidatos + 1)
+
+def calcular_novos_precos(df: pd.DataFrame, regra: str, valor: float, terminacao: float = None) -> pd.Series:
+    """Preço de venda resultante da regra, calculado de uma vez para todas as linhas."""
+    venda, compra = df['preco_venda'], df['preco_compra']
+    if regra == REGRA_REAJUSTE:
+        novos = venda * (1 + valor / 100)
+    elif regra == REGRA_MARGEM:
+        novos = compra / (1 - valor / 100)
+    elif regra == REGRA_PRECO_FIXO:
+        novos = pd.Series(valor, index=df.index, dtype='float64')
+    else:
+        return venda
+    if terminacao is not None:
+        novos = aplicar_terminacao(novos, terminacao)
+    if regra == REGRA_MARGEM:
+        # Margem sobre o preço de venda; produtos sem preço de compra ficam como estão (nem a terminação muda)
+        novos = novos.where(compra > 0, venda)
+    return normalizar_dinheiro(novos)
+
+def previa_em_lote(df: pd.DataFrame, regra: str, valor: float = 0.0, terminacao: float = None,
+                   nova_categoria: str = None) -> pd.DataFrame:
+    """Antes e depois de cada produto filtrado, com variação e margem resultantes."""
+    previa = df[['id', 'nome', 'tipo', 'preco_compra', 'preco_venda']].astype({'tipo': 'object'})
+    previa['preco_novo'] = calcular_novos_precos(previa, regra, valor, terminacao)
+    previa['tipo_novo'] = nova_categoria if regra == REGRA_CATEGORIA else previa['tipo']
+    previa['variacao'] = ((previa['preco_novo'] - previa['preco_venda']) / previa['preco_venda']).where(previa['preco_venda'] > 0)
+    previa['margem_nova'] = ((previa['preco_novo'] - previa['preco_compra']) / previa['preco_novo']).where(previa['preco_novo'] > 0)
+    previa['alterado'] = (previa['preco_novo'] != previa['preco_venda']) | (previa['tipo_novo'].fillna('') != previa['tipo'].fillna(''))
+    return previa
+
+def itens_em_lote(previa: pd.DataFrame, regra: str) -> list:
+    """Linhas alteradas no formato da RPC: só o campo que a regra muda."""
+    alterados = previa[previa['alterado']]
+    if regra == REGRA_CATEGORIA:
+        return [{'id': int(i), 'tipo': tipo} for i, tipo in zip(alterados['id'], alterados['tipo_novo'])]
+    return [{'id': int(i), 'preco_venda': float(preco)} for i, preco in zip(alterados['id'], alterados['preco_novo'])]
+
+def atualizar_produtos_em_lote(supabase_client: Client, itens: list):
+    """Aplica todas as alterações numa única chamada transacional: ou todas entram, ou nenhuma."""
+    resultado = supabase_client.rpc('atualizar_produtos_em_lote', {'p_itens': itens}).execute().data
+    if resultado == 'Sucesso':
+        return True, f"{len(itens)} produtos atualizados."
+    return False, resultado
+
+def render_alteracao_em_lote(supabase_client: Client, df_produtos: pd.DataFrame):
+    st.subheader("Preços e Categorias em Lote")
+    st.caption("Filtre os produtos, escolha a regra e confira a prévia antes de aplicar. Tudo é gravado de uma vez.")
+
+    col_cat, col_status, col_busca = st.columns(3)
+    categorias = sorted(df_produtos['tipo'].dropna().astype(str).unique())
+    filtro_categorias = col_cat.multiselect("Categorias", categorias, key="lote_categorias")
+    filtro_status = col_status.multiselect("Status", ['Ativo', 'Inativo'], default=['Ativo'], key="lote_status")
+    busca = col_busca.text_input("Nome contém", key="lote_busca")
+    df_filtrado = filtrar_produtos(df_produtos, filtro_categorias, filtro_status, busca)
+
+    col_regra, col_valor, col_terminacao = st.columns(3)
+    regra = col_regra.selectbox("Regra", REGRAS_EM_LOTE, key="lote_regra")
+    valor, terminacao, nova_categoria = 0.0, None, None
+    if regra == REGRA_CATEGORIA:
+        nova_categoria = col_valor.text_input("Nova categoria", key="lote_nova_categoria").strip()
+    else:
+        if regra == REGRA_REAJUSTE:
+            valor = col_valor.number_input("Reajuste (%)", min_value=-90.0, max_value=500.0, value=0.0, step=1.0, key="lote_reajuste")
+        elif regra == REGRA_MARGEM:
+            valor = col_valor.number_input("Margem (%)", min_value=0.0, max_value=95.0, value=30.0, step=1.0, key="lote_margem",
+                                           help="Percentual do preço de venda que sobra após o custo: venda = compra ÷ (1 − margem).")
+        else:
+            valor = col_valor.number_input("Preço de venda (R$)", min_value=0.0, value=0.0, format="%.2f", key="lote_preco_fixo")
+        terminacao = TERMINACOES_PRECO[col_terminacao.selectbox("Arredondamento", list(TERMINACOES_PRECO), key="lote_terminacao")]
+
+    if df_filtrado.empty:
+        st.info("Nenhum produto corresponde aos filtros.")
+        return
+    if regra == REGRA_CATEGORIA and not nova_categoria:
+        st.info("Informe a nova categoria.")
+        return
+    if regra == REGRA_PRECO_FIXO and valor <= 0:
+        st.info("Informe o novo preço de venda.")
+        return
+
+    previa = previa_em_lote(df_filtrado, regra, valor, terminacao, nova_categoria)
+    alterados = previa[previa['alterado']]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Produtos Filtrados", len(previa))
+    col2.metric("Serão Alterados", len(alterados))
+    col3.metric("Variação Média", f"{alterados['variacao'].mean():+.1%}" if regra != REGRA_CATEGORIA and not alterados.empty else "—")
+    if regra == REGRA_MARGEM and (df_filtrado['preco_compra'] <= 0).any():
+        st.warning(f"{int((df_filtrado['preco_compra'] <= 0).sum())} produtos sem preço de compra ficarão com o preço atual.")
+
+    tabela_paginada(
+        alterados[['nome', 'tipo', 'tipo_novo', 'preco_compra', 'preco_venda', 'preco_novo', 'variacao', 'margem_nova']],
+        key="lote_pagina_previa",
+        column_config={
+            'nome': 'Produto', 'tipo': 'Categoria', 'tipo_novo': 'Nova Categoria',
+            'preco_compra': st.column_config.NumberColumn("Compra", format="R$ %.2f"),
+            'preco_venda': st.column_config.NumberColumn("Venda Atual", format="R$ %.2f"),
+            'preco_novo': st.column_config.NumberColumn("Nova Venda", format="R$ %.2f"),
+            'variacao': st.column_config.NumberColumn("Variação", format="percent"),
+            'margem_nova': st.column_config.NumberColumn("Nova Margem", format="percent"),
+        },
+        use_container_width=True, hide_index=True
+    )
+
+    if st.button(f"✅ Aplicar a {len(alterados)} produtos", type="primary", disabled=alterados.empty, key="lote_aplicar"):
+        with st.spinner("Atualizando produtos..."):
+            sucesso, mensagem = atualizar_produtos_em_lote(supabase_client, itens_em_lote(previa, regra))
+        if sucesso:
+            limpar_caches()
+            if regra == REGRA_CATEGORIA:
+                get_monitor_estoque_baixo(supabase_client).invalidar()
+            st.success(mensagem)
+            time.sleep(1)
+            st.rerun()
+        else:
+            st.error(f"Erro ao atualizar: {mensagem}")
+
+# --- IMPORTAÇÃO VIA CSV ---
+def _registros_sem_nan(df: pd.DataFrame) -> list:
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+def _texto(valor, padrao: str = '') -> str:
+    """Valor de texto para widgets e cards: categoria vazia chega como NaN, não como None."""
+    return padrao if valor is None or pd.isna(valor) else str(valor)
+
+def importar_produtos_csv(supabase_client: Client, df_upload: pd.DataFrame, local_id: int):
+    """Grava o cadastro do CSV e leva o estoque informado ao local escolhido via ajustar_estoque_total.
+
+    estoque_atual nunca é gravado direto: o PDV lê o saldo de estoque_locais, e o histórico precisa
+    explicar o estoque. A diferença para o total atual é calculada pela RPC, com a linha travada, e não
+    a partir do catálogo em cache. Retorna (registros gravados, movimentações feitas, falhas).
+    """
+    estoques = pd.to_numeric(df_upload.get('estoque_atual', pd.Series(index=df_upload.index, dtype='float64')), errors='coerce')
+    cadastro = df_upload.drop(columns=['estoque_atual'], errors='ignore')
+    if 'id' not in cadastro.columns:
+        cadastro = cadastro.assign(id=None)
+    tem_id = cadastro['id'].notna()
+
+    produto_ids, gravados = [], 0
+    existentes = cadastro[tem_id].astype({'id': 'int64'})
+    if not existentes.empty:
+        gravados += len(supabase_client.table('produtos').upsert(_registros_sem_nan(existentes), on_conflict='id').execute().data or [])
+        produto_ids += existentes['id'].tolist()
+    novos = cadastro[~tem_id].drop(columns=['id'], errors='ignore').assign(estoque_atual=0)
+    if not novos.empty:
+        inseridos = supabase_client.table('produtos').insert(_registros_sem_nan(novos)).execute().data or []
+        gravados += len(inseridos)
+        produto_ids += [linha['id'] for linha in inseridos]
+
+    feitos, falhas = 0, []
+    for produto_id, estoque in zip(produto_ids, pd.concat([estoques[tem_id], estoques[~tem_id]])):
+        if pd.isna(estoque):
+            continue
+        resultado = supabase_client.rpc('ajustar_estoque_total', {
+            'p_produto_id': int(produto_id), 'p_estoque_alvo': int(estoque), 'p_local_id': local_id
+        }).execute().data
+        if resultado == 'Sucesso':
+            feitos += 1
+        elif resultado != 'Sem alteração':
+            falhas.append(f"Produto {produto_id}: {resultado}")
+    return gravados, feitos, falhas
+
 # --- FUNÇÃO PRINCIPAL DA PÁGINA ---
 def render_page(supabase_client: Client):
     st.title("📦 Gestão de Produtos")
@@ -44,13 +237,14 @@ def render_page(supabase_client: Client):
         st.session_state.editing_product_id = None
 
     if st.button("Recarregar Dados", key="reload_produtos"):
-        st.cache_data.clear()
+        limpar_caches()
         st.session_state.editing_product_id = None
         st.rerun()
 
-    tab_add, tab_view, tab_bulk = st.tabs([
+    tab_add, tab_view, tab_precos, tab_bulk = st.tabs([
         "➕ Adicionar Novo Produto",
         "✏️ Visualizar e Editar",
+        "💲 Preços e Categorias em Lote",
         "🚀 Importar / Atualizar em Massa"
     ])
 
@@ -90,6 +284,8 @@ def render_page(supabase_client: Client):
                             except Exception as e:
                                 st.error(f"Falha no upload: {e}")
                         
+                        # Estoque inicial zero: o gatilho cria as linhas zeradas em estoque_locais, e a
+                        # entrada de mercadoria é registrada depois em Movimentação, por local
                         novo_produto = {
                             "nome": nome, "tipo": tipo, "preco_compra": preco_compra,
                             "preco_venda": preco_venda, "qtd_minima_estoque": qtd_minima,
@@ -100,14 +296,17 @@ def render_page(supabase_client: Client):
                         try:
                             supabase_client.table("produtos").insert(novo_produto).execute()
                             st.success("Produto cadastrado com sucesso!")
-                            st.cache_data.clear()
+                            limpar_caches()
+                            get_monitor_estoque_baixo(supabase_client).invalidar()
                         except Exception as e:
                             st.error(f"Erro ao cadastrar no banco de dados: {e}")
 
     # --- ABA DE VISUALIZAR E EDITAR (REFORMULADA) ---
+    df_catalogo = vista(get_produtos(supabase_client))
+
     with tab_view:
         st.subheader("Catálogo de Produtos")
-        df_produtos = get_produtos(supabase_client)
+        df_produtos = df_catalogo
         
         if df_produtos.empty:
             st.info("Nenhum produto cadastrado ainda.")
@@ -126,10 +325,10 @@ def render_page(supabase_client: Client):
                 with st.container(border=True):
                     col1, col2, col3 = st.columns([1, 4, 1.2])
                     with col1:
-                        st.image(produto.get('foto_url') or 'https://placehold.co/300x300/f0f2f6/777?text=Sem+Foto', width=100)
+                        st.image(_texto(produto.get('foto_url')) or 'https://placehold.co/300x300/f0f2f6/777?text=Sem+Foto', width=100)
                     with col2:
                         st.markdown(f"**{produto['nome']}**")
-                        st.caption(f"Categoria: {produto.get('tipo', 'N/A')}")
+                        st.caption(f"Categoria: {_texto(produto.get('tipo'), 'N/A')}")
                         st.markdown(f"<span style='background-color: {cor_status}; color: white; padding: 3px 8px; border-radius: 15px; font-size: 12px;'>{produto.get('status')}</span>", unsafe_allow_html=True)
                     with col3:
                         st.metric("Estoque", f"{produto.get('estoque_atual', 0)}")
@@ -137,28 +336,32 @@ def render_page(supabase_client: Client):
                         st.button("✏️ Editar", key=f"edit_{produto['id']}", on_click=set_editing_product, args=(produto['id'],), use_container_width=True)
 
     # --- LÓGICA DO POP-UP DE EDIÇÃO (FORA DO LOOP) ---
+    if st.session_state.editing_product_id and st.session_state.editing_product_id not in df_catalogo.index:
+        # Produto removido desde o último carregamento
+        st.session_state.editing_product_id = None
+
     if st.session_state.editing_product_id:
-        # Encontra os dados do produto selecionado
-        produto_para_editar = df_produtos[df_produtos['id'] == st.session_state.editing_product_id].iloc[0].to_dict()
+        # Encontra os dados do produto selecionado pelo índice de ids (também quando a busca o esconde)
+        produto_para_editar = _registros_sem_nan(df_catalogo.loc[[st.session_state.editing_product_id]])[0]
 
         with st.dialog(f"Editando: {produto_para_editar['nome']}"):
             with st.form(key=f"form_edit_{produto_para_editar['id']}"):
                 
-                novo_nome = st.text_input("Nome", value=produto_para_editar.get('nome', ''))
-                novo_tipo = st.text_input("Categoria", value=produto_para_editar.get('tipo', ''))
+                novo_nome = st.text_input("Nome", value=_texto(produto_para_editar['nome']))
+                novo_tipo = st.text_input("Categoria", value=_texto(produto_para_editar['tipo']))
                 
                 col_edit1, col_edit2 = st.columns(2)
-                novo_preco_venda = col_edit1.number_input("Preço Venda", value=float(produto_para_editar.get('preco_venda', 0)), format="%.2f")
-                novo_preco_compra = col_edit2.number_input("Preço Compra", value=float(produto_para_editar.get('preco_compra', 0)), format="%.2f")
+                novo_preco_venda = col_edit1.number_input("Preço Venda", value=float(produto_para_editar['preco_venda'] or 0), format="%.2f")
+                novo_preco_compra = col_edit2.number_input("Preço Compra", value=float(produto_para_editar['preco_compra'] or 0), format="%.2f")
                 
-                novo_status = st.selectbox("Status", options=['Ativo', 'Inativo'], index=['Ativo', 'Inativo'].index(produto_para_editar.get('status', 'Ativo')))
+                novo_status = st.selectbox("Status", options=['Ativo', 'Inativo'], index=['Ativo', 'Inativo'].index(_texto(produto_para_editar['status'], 'Ativo')))
                 nova_foto = st.file_uploader("Trocar Foto", type=['png', 'jpg', 'jpeg'])
 
                 btn_col1, btn_col2 = st.columns(2)
                 if btn_col1.form_submit_button("✅ Salvar", use_container_width=True, type="primary"):
                     with st.spinner("Salvando..."):
                         update_data = {
-                            'nome': novo_nome, 'tipo': novo_tipo,
+                            'nome': novo_nome, 'tipo': novo_tipo.strip() or None,
                             'preco_venda': novo_preco_venda, 'preco_compra': novo_preco_compra,
                             'status': novo_status
                         }
@@ -174,7 +377,8 @@ def render_page(supabase_client: Client):
                             supabase_client.table('produtos').update(update_data).eq('id', st.session_state.editing_product_id).execute()
                             st.success("Produto atualizado!")
                             st.session_state.editing_product_id = None
-                            st.cache_data.clear()
+                            limpar_caches()
+                            get_monitor_estoque_baixo(supabase_client).invalidar()
                             st.rerun()
                         except Exception as e:
                             st.error(f"Erro ao salvar: {e}")
@@ -183,6 +387,13 @@ def render_page(supabase_client: Client):
                     st.session_state.editing_product_id = None
                     st.rerun()
 
+    # --- ABA DE PREÇOS E CATEGORIAS EM LOTE ---
+    with tab_precos:
+        if df_catalogo.empty:
+            st.info("Nenhum produto cadastrado ainda.")
+        else:
+            render_alteracao_em_lote(supabase_client, df_catalogo)
+
     # --- ABA DE IMPORTAÇÃO EM MASSA ---
     with tab_bulk:
         st.subheader("Importar / Atualizar em Massa")
@@ -195,7 +406,8 @@ def render_page(supabase_client: Client):
         
         1.  **Baixe o modelo CSV** para ver o formato correto.
         2.  **Preencha o modelo** com seus dados. Para **atualizar** um produto, mantenha o `id` dele. Para **adicionar** um novo produto, deixe o campo `id` em branco.
-        3.  **Envie o arquivo** preenchido.
+        3.  **Escolha o local** que recebe o estoque: a diferença entre o `estoque_atual` do arquivo e o total atual vira uma entrada ou saída nesse local. Deixe o campo em branco para não mexer no estoque.
+        4.  **Envie o arquivo** preenchido.
         """)
 
         modelo_data = {
@@ -221,6 +433,14 @@ def render_page(supabase_client: Client):
             mime='text/csv',
         )
 
+        locais = get_locais(supabase_client)
+        opcoes_locais = {local['id']: local['nome'] for local in locais}
+        indice_local = list(opcoes_locais).index(st.session_state.local_id) if st.session_state.get('local_id') in opcoes_locais else 0
+        local_importacao = st.selectbox(
+            "Local do estoque importado", options=list(opcoes_locais), format_func=opcoes_locais.get,
+            index=indice_local, key="importacao_local_id"
+        ) if opcoes_locais else None
+
         uploaded_file = st.file_uploader("Escolha um arquivo CSV", type="csv")
         if uploaded_file is not None:
             try:
@@ -228,18 +448,14 @@ def render_page(supabase_client: Client):
                 st.write("Pré-visualização dos dados a serem importados/atualizados:")
                 st.dataframe(df_upload)
 
-                if st.button("CONFIRMAR E PROCESSAR ARQUIVO", type="primary"):
+                if st.button("CONFIRMAR E PROCESSAR ARQUIVO", type="primary", disabled=local_importacao is None):
                     with st.spinner("Processando dados... Isso pode levar alguns minutos."):
-                        registros = df_upload.to_dict(orient='records')
-                        
-                        response = supabase_client.table('produtos').upsert(registros, on_conflict='id').execute()
-
-                        if response.data:
-                            num_registros = len(response.data)
-                            st.success(f"Operação concluída com sucesso! {num_registros} registros foram processados.")
-                            st.cache_data.clear()
-                        else:
-                             st.error(f"Erro ao processar o arquivo: {response.error.message if response.error else 'Erro desconhecido'}")
+                        gravados, movimentacoes, falhas = importar_produtos_csv(supabase_client, df_upload, local_importacao)
+                        limpar_caches()
+                        get_monitor_estoque_baixo(supabase_client).invalidar()
+                    st.success(f"Operação concluída! {gravados} registros processados, {movimentacoes} ajustes de estoque em {opcoes_locais[local_importacao]}.")
+                    for falha in falhas:
+                        st.warning(falha)
             
             except Exception as e:
                 st.error(f"Erro ao ler o arquivo CSV. Verifique o formato e o separador (deve ser ponto e vírgula ';'). Detalhes: {e}")
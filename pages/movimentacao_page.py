@@ -1,65 +1,302 @@
 # pages/movimentacao_page.py
 import streamlit as st
 import pandas as pd
+import io
+import re
+from collections import Counter
 from supabase import Client
-from utils import supabase_client_hash_func
+from schema import COLUNAS_MOVIMENTACOES, COLUNAS_PRODUTOS_LISTA, tipar_dataframe
+from estoque_baixo import get_monitor_estoque_baixo
+from locais import nome_do_local
+from dados_compartilhados import GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES, cache_compartilhado, vista, congelar_registros, invalidar_grupo
+from graficos import tabela_paginada
 import pytz # Biblioteca para lidar com fusos horários
 
+# A grade guarda o id de cada produto; o editor mostra só o rótulo (nome) no lugar dele
+COLUNAS_RECEBIMENTO = ['produto_id', 'Quantidade']
+COLUNAS_EDITOR_RECEBIMENTO = ['Produto', 'Quantidade']
+
 # --- FUNÇÕES DE DADOS ---
 
-@st.cache_data(ttl=30, hash_funcs={Client: supabase_client_hash_func})
+@cache_compartilhado(ttl=30, grupos=(GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES))
 def get_movimentacao_data(supabase_client: Client):
-    """Busca a lista de produtos e o histórico de movimentações."""
+    """Busca a lista de produtos e o histórico de movimentações (compartilhados entre as sessões)."""
     if not supabase_client:
-        return [], pd.DataFrame()
+        return (), pd.DataFrame()
 
     # Busca a lista de produtos para os formulários e filtros
-    produtos_response = supabase_client.table('produtos').select('id, nome').order('nome').execute()
-    lista_produtos = produtos_response.data
+    produtos_response = supabase_client.table('produtos').select(COLUNAS_PRODUTOS_LISTA).order('nome').execute()
+    lista_produtos = congelar_registros(produtos_response.data)
     
     # Busca o histórico completo de movimentações
     movimentacoes_response = supabase_client.table('movimentacoes').select(
-        '*, produtos(nome)'
+        COLUNAS_MOVIMENTACOES
     ).order('data_movimentacao', desc=True).limit(2000).execute()
     
     df_movimentacoes = pd.DataFrame()
     if movimentacoes_response.data:
         df_movimentacoes = pd.json_normalize(movimentacoes_response.data)
-        if 'produtos.nome' in df_movimentacoes.columns:
-            df_movimentacoes = df_movimentacoes.rename(columns={'produtos.nome': 'produto_nome'})
+        df_movimentacoes = df_movimentacoes.rename(columns={'produtos.nome': 'produto_nome', 'locais.nome': 'local_nome'})
+        # Movimentações anteriores ao estoque por local não têm local associado
+        if 'local_nome' not in df_movimentacoes.columns:
+            df_movimentacoes['local_nome'] = None
+        df_movimentacoes['local_nome'] = df_movimentacoes['local_nome'].fillna("Sem local")
         # Converte a coluna de data para o tipo datetime com fuso horário
         df_movimentacoes['data_movimentacao'] = pd.to_datetime(df_movimentacoes['data_movimentacao'])
+        df_movimentacoes = tipar_dataframe(df_movimentacoes, 'movimentacao.movimentacoes')
 
     return lista_produtos, df_movimentacoes
 
-def registrar_movimentacao(supabase_client: Client, id_produto: str, tipo: str, quantidade: int):
-    """Registra a movimentação e atualiza o estoque via RPC."""
+def registrar_movimentacao(supabase_client: Client, id_produto: str, tipo: str, quantidade: int, local_id: int):
+    """Registra a movimentação no local informado e atualiza o estoque via RPC."""
     response = supabase_client.rpc('atualizar_estoque', {
         'p_produto_id': id_produto, 
         'p_quantidade_movimentada': quantidade, 
-        'p_tipo_mov': tipo
+        'p_tipo_mov': tipo,
+        'p_local_id': local_id
     }).execute()
     
     resultado = response.data
     if resultado == 'Sucesso':
+        get_monitor_estoque_baixo(supabase_client).aplicar_movimentacao(id_produto, tipo, quantidade)
         return True, "Movimentação registrada com sucesso!"
     else:
         return False, resultado
 
+def registrar_recebimento(supabase_client: Client, local_id: int, itens: list, documento: str = None):
+    """Registra toda a entrega numa única chamada transacional: ou todas as linhas entram, ou nenhuma."""
+    response = supabase_client.rpc('registrar_recebimento', {
+        'p_local_id': local_id,
+        'p_itens': itens,
+        'p_documento': documento or None
+    }).execute()
+
+    resultado = response.data
+    if resultado == 'Sucesso':
+        monitor_estoque = get_monitor_estoque_baixo(supabase_client)
+        for item in itens:
+            monitor_estoque.aplicar_movimentacao(item['produto_id'], 'ENTRADA', item['quantidade'])
+        unidades = sum(item['quantidade'] for item in itens)
+        return True, f"Recebimento registrado: {len(itens)} produtos, {unidades} unidades."
+    else:
+        return False, resultado
+
+def limpar_caches_estoque():
+    """Invalida só os caches que exibem saldo de estoque (histórico, catálogo do PDV, Gestão, Relatórios e Dashboard)."""
+    invalidar_grupo(GRUPO_ESTOQUE)
+
+# --- RECEBIMENTO EM LOTE ---
+
+def interpretar_linhas(texto: str) -> list:
+    """Lê linhas coladas ou do leitor: 'código', 'código;quantidade' ou 'código quantidade'.
+
+    A quantidade precisa ser um inteiro positivo; qualquer linha inválida rejeita o lote inteiro (ValueError).
+    """
+    linhas, invalidas = [], []
+    for numero, linha in enumerate(texto.splitlines(), start=1):
+        partes = [parte for parte in re.split(r'[;,\t ]+', linha.strip()) if parte]
+        if not partes:
+            continue
+        if len(partes) == 1:
+            linhas.append((partes[0], 1))
+        elif len(partes) == 2 and partes[1].isdigit() and int(partes[1]) > 0:
+            linhas.append((partes[0], int(partes[1])))
+        else:
+            invalidas.append(f"linha {numero} ('{linha.strip()}')")
+    if invalidas:
+        raise ValueError(f"Quantidade inválida (use um número inteiro positivo) em: {', '.join(invalidas)}")
+    return linhas
+
+def ler_nota_csv(arquivo) -> list:
+    """Lê a nota de entrega em CSV (separador ';') com as colunas codigo_barras e quantidade."""
+    df = pd.read_csv(arquivo, sep=';', dtype={'codigo_barras': str})
+    faltando = {'codigo_barras', 'quantidade'} - set(df.columns)
+    if faltando:
+        raise ValueError(f"Colunas ausentes no arquivo: {', '.join(sorted(faltando))}")
+    df = df.dropna(subset=['codigo_barras'])
+    quantidades = pd.to_numeric(df['quantidade'], errors='coerce')
+    invalidas = quantidades.isna() | (quantidades <= 0) | (quantidades % 1 != 0)
+    if invalidas.any():
+        # +2: cabeçalho e numeração a partir de 1
+        raise ValueError(f"Quantidade inválida nas linhas: {', '.join(str(i + 2) for i in df.index[invalidas])}")
+    return list(zip(df['codigo_barras'].str.strip(), quantidades.astype('int64')))
+
+def rotulos_produtos(lista_produtos) -> dict:
+    """Rótulo de cada produto na grade, por id. Nomes repetidos levam o id, para cada opção ser um único produto."""
+    repeticoes = Counter(produto['nome'] for produto in lista_produtos)
+    return {
+        produto['id']: produto['nome'] if repeticoes[produto['nome']] == 1 else f"{produto['nome']} (#{produto['id']})"
+        for produto in lista_produtos
+    }
+
+def somar_ao_recebimento(df_itens: pd.DataFrame, linhas: list, id_por_codigo: dict):
+    """Soma as linhas lidas à grade (uma linha por produto). Retorna a grade e os códigos não encontrados."""
+    novos = pd.DataFrame(linhas, columns=['codigo', 'Quantidade'])
+    novos['produto_id'] = novos['codigo'].map(id_por_codigo)
+    nao_encontrados = novos.loc[novos['produto_id'].isna(), 'codigo'].unique().tolist()
+    combinado = pd.concat([df_itens, novos[COLUNAS_RECEBIMENTO]], ignore_index=True).dropna(subset=['produto_id'])
+    combinado = combinado.astype({'produto_id': 'int64'})
+    combinado['Quantidade'] = pd.to_numeric(combinado['Quantidade'], errors='coerce').fillna(0).astype('int64')
+    agrupado = combinado.groupby('produto_id', sort=False, as_index=False)['Quantidade'].sum()
+    return agrupado[COLUNAS_RECEBIMENTO], nao_encontrados
+
+def consolidar_itens(df_itens: pd.DataFrame) -> list:
+    """Converte a grade em uma linha por produto, no formato esperado por registrar_recebimento."""
+    df = df_itens.dropna(subset=['produto_id']).copy()
+    df['quantidade'] = pd.to_numeric(df['Quantidade'], errors='coerce').fillna(0).astype('int64')
+    df = df[df['quantidade'] > 0]
+    agregado = df.groupby('produto_id', as_index=False)['quantidade'].sum()
+    return [
+        {'produto_id': int(produto_id), 'quantidade': int(quantidade)}
+        for produto_id, quantidade in zip(agregado['produto_id'], agregado['quantidade'])
+    ]
+
+def _grade_para_editor(df_itens: pd.DataFrame, rotulos: dict) -> pd.DataFrame:
+    return pd.DataFrame({'Produto': df_itens['produto_id'].map(rotulos), 'Quantidade': df_itens['Quantidade']})[COLUNAS_EDITOR_RECEBIMENTO]
+
+def _grade_do_editor(df_editado: pd.DataFrame, rotulos: dict) -> pd.DataFrame:
+    id_por_rotulo = {rotulo: produto_id for produto_id, rotulo in rotulos.items()}
+    return pd.DataFrame({'produto_id': df_editado['Produto'].map(id_por_rotulo), 'Quantidade': df_editado['Quantidade']})[COLUNAS_RECEBIMENTO]
+
+def _grade_editada(df_base: pd.DataFrame, estado_editor: dict) -> pd.DataFrame:
+    """Reaplica as edições pendentes do st.data_editor sobre a grade base (usado dentro dos callbacks)."""
+    estado_editor = estado_editor or {}
+    df = df_base.copy()
+    for posicao, mudancas in estado_editor.get('edited_rows', {}).items():
+        for coluna, valor in mudancas.items():
+            df.iloc[int(posicao), df.columns.get_loc(coluna)] = valor
+    df = df.drop(df.index[list(estado_editor.get('deleted_rows', []))])
+    adicionadas = pd.DataFrame(estado_editor.get('added_rows', []), columns=COLUNAS_EDITOR_RECEBIMENTO)
+    return pd.concat([df, adicionadas], ignore_index=True)
+
+def _somar_linhas_lidas(linhas: list, id_por_codigo: dict, rotulos: dict):
+    versao = st.session_state.recebimento_versao
+    editado = _grade_editada(_grade_para_editor(st.session_state.recebimento_itens, rotulos),
+                             st.session_state.get(f"editor_recebimento_{versao}"))
+    st.session_state.recebimento_itens, st.session_state.recebimento_nao_encontrados = somar_ao_recebimento(
+        _grade_do_editor(editado, rotulos), linhas, id_por_codigo
+    )
+    # Novas chaves: grade, campo de texto e arquivo recomeçam a partir da grade consolidada
+    st.session_state.recebimento_versao = versao + 1
+
+def _adicionar_linhas_coladas(id_por_codigo: dict, rotulos: dict):
+    texto = st.session_state.get(f"recebimento_texto_{st.session_state.recebimento_versao}") or ""
+    try:
+        linhas = interpretar_linhas(texto)
+    except ValueError as e:
+        # Nada do lote é somado: o texto continua no campo para ser corrigido
+        st.session_state.recebimento_erro = str(e)
+        return
+    st.session_state.recebimento_erro = None
+    _somar_linhas_lidas(linhas, id_por_codigo, rotulos)
+
+def _importar_nota_csv(id_por_codigo: dict, rotulos: dict):
+    arquivo = st.session_state.get(f"recebimento_arquivo_{st.session_state.recebimento_versao}")
+    if arquivo is None:
+        st.session_state.recebimento_erro = "Selecione o arquivo CSV da nota antes de importar."
+        return
+    try:
+        linhas = ler_nota_csv(arquivo)
+    except Exception as e:
+        st.session_state.recebimento_erro = f"Erro ao ler o arquivo CSV. Verifique o formato e o separador (deve ser ponto e vírgula ';'). Detalhes: {e}"
+        return
+    st.session_state.recebimento_erro = None
+    _somar_linhas_lidas(linhas, id_por_codigo, rotulos)
+
+def _grade_vazia() -> pd.DataFrame:
+    return pd.DataFrame({'produto_id': pd.Series(dtype='int64'), 'Quantidade': pd.Series(dtype='int64')})
+
+def _limpar_recebimento():
+    st.session_state.recebimento_itens = _grade_vazia()
+    st.session_state.recebimento_nao_encontrados = []
+    st.session_state.recebimento_erro = None
+    st.session_state.recebimento_versao += 1
+
+@st.fragment
+def render_recebimento(supabase_client: Client, lista_produtos: list, local_id: int):
+    """Tela de recebimento: leitura/colagem de códigos ou nota CSV, grade editável e gravação em lote.
+
+    Fica num fragmento para que montar a entrega não recarregue o histórico abaixo.
+    """
+    for key, default_value in [
+        ('recebimento_itens', _grade_vazia()), ('recebimento_versao', 0),
+        ('recebimento_nao_encontrados', []), ('recebimento_erro', None)
+    ]:
+        if key not in st.session_state:
+            st.session_state[key] = default_value
+    versao = st.session_state.recebimento_versao
+    id_por_codigo = {produto['codigo_barras']: produto['id'] for produto in lista_produtos if produto.get('codigo_barras')}
+    rotulos = rotulos_produtos(lista_produtos)
+
+    col_leitura, col_nota = st.columns(2)
+    with col_leitura:
+        st.text_area(
+            "Leia ou cole os códigos de barras (um por linha: `código` ou `código;quantidade`)",
+            key=f"recebimento_texto_{versao}", height=150
+        )
+        st.button("➕ Adicionar Linhas", on_click=_adicionar_linhas_coladas, args=(id_por_codigo, rotulos), use_container_width=True)
+    with col_nota:
+        st.file_uploader("Ou envie a nota de entrega (CSV com `codigo_barras;quantidade`)", type="csv", key=f"recebimento_arquivo_{versao}")
+        st.button("📄 Importar Nota", on_click=_importar_nota_csv, args=(id_por_codigo, rotulos), use_container_width=True)
+        csv_buffer = io.StringIO()
+        pd.DataFrame({'codigo_barras': ['111222333', '444555666'], 'quantidade': [24, 6]}).to_csv(csv_buffer, index=False, sep=';')
+        st.download_button("📥 Baixar Modelo CSV", data=csv_buffer.getvalue().encode('utf-8'), file_name='modelo_recebimento.csv', mime='text/csv')
+
+    if st.session_state.recebimento_erro:
+        st.error(st.session_state.recebimento_erro)
+    if st.session_state.recebimento_nao_encontrados:
+        st.warning(f"Códigos não encontrados: {', '.join(map(str, st.session_state.recebimento_nao_encontrados))}")
+
+    df_editado = st.data_editor(
+        _grade_para_editor(st.session_state.recebimento_itens, rotulos),
+        column_config={
+            "Produto": st.column_config.SelectboxColumn("Produto", options=list(rotulos.values()), required=True),
+            "Quantidade": st.column_config.NumberColumn("Quantidade", min_value=1, step=1, required=True),
+        },
+        num_rows="dynamic", hide_index=True, use_container_width=True, key=f"editor_recebimento_{versao}"
+    )
+    itens = consolidar_itens(_grade_do_editor(df_editado, rotulos))
+
+    col_m1, col_m2, col_doc = st.columns([1, 1, 2])
+    col_m1.metric("Produtos", len(itens))
+    col_m2.metric("Unidades", sum(item['quantidade'] for item in itens))
+    with col_doc:
+        documento = st.text_input("Nº da Nota Fiscal (opcional)", key=f"recebimento_documento_{versao}")
+
+    col_confirmar, col_limpar = st.columns(2)
+    with col_limpar:
+        st.button("🗑️ Limpar", on_click=_limpar_recebimento, use_container_width=True)
+    with col_confirmar:
+        if st.button("✅ Confirmar Recebimento", type="primary", disabled=not itens, use_container_width=True):
+            with st.spinner("Registrando recebimento..."):
+                sucesso, mensagem = registrar_recebimento(supabase_client, local_id, itens, documento.strip())
+            if sucesso:
+                _limpar_recebimento()
+                limpar_caches_estoque()
+                st.success(mensagem)
+                st.rerun()
+            else:
+                st.error(mensagem)
+
 # --- PÁGINA PRINCIPAL ---
 
 def render_page(supabase_client: Client):
     st.title("🚚 Controle e Rastreabilidade de Estoque")
     st.write("Registre entradas e saídas manuais e audite todo o histórico de movimentações do seu inventário.")
 
+    local_id = st.session_state.get('local_id')
     lista_produtos, df_movimentacoes = get_movimentacao_data(supabase_client)
+    df_movimentacoes = vista(df_movimentacoes)
     produtos_dict = {produto['nome']: produto['id'] for produto in lista_produtos}
 
     # --- Formulário para registrar nova movimentação ---
     with st.expander("➕ Registrar Nova Movimentação (Entrada/Saída)"):
         if not produtos_dict:
             st.warning("Nenhum produto cadastrado. Adicione produtos na aba 'Produtos' primeiro.")
+        elif local_id is None:
+            st.warning("Selecione um local de trabalho na barra lateral.")
         else:
+            st.caption(f"📍 A movimentação será registrada em: **{nome_do_local(supabase_client, local_id)}**")
             produto_selecionado_nome = st.selectbox(
                 "Selecione o Produto", 
                 options=produtos_dict.keys(),
@@ -76,14 +313,24 @@ def render_page(supabase_client: Client):
                 id_produto_selecionado = produtos_dict[produto_selecionado_nome]
                 with st.spinner("Processando..."):
                     sucesso, mensagem = registrar_movimentacao(
-                        supabase_client, id_produto_selecionado, tipo_movimentacao, quantidade
+                        supabase_client, id_produto_selecionado, tipo_movimentacao, quantidade, local_id
                     )
                     if sucesso:
                         st.success(mensagem)
-                        st.cache_data.clear() # Limpa o cache para atualizar o histórico
+                        limpar_caches_estoque() # Atualiza o histórico e o catálogo do PDV
                         st.rerun()
                     else:
                         st.error(mensagem)
+
+    # --- Recebimento de mercadorias em lote ---
+    with st.expander("📦 Recebimento de Mercadorias (entrega completa)"):
+        if not produtos_dict:
+            st.warning("Nenhum produto cadastrado. Adicione produtos na aba 'Produtos' primeiro.")
+        elif local_id is None:
+            st.warning("Selecione um local de trabalho na barra lateral.")
+        else:
+            st.caption(f"📍 A entrega será recebida em: **{nome_do_local(supabase_client, local_id)}** · todas as linhas são gravadas juntas, numa única transação.")
+            render_recebimento(supabase_client, lista_produtos, local_id)
     
     st.divider()
 
@@ -100,13 +347,16 @@ def render_page(supabase_client: Client):
     df_movimentacoes['data_local'] = df_movimentacoes['data_movimentacao'].dt.tz_convert(brasilia_tz)
     df_movimentacoes['data_filtro'] = df_movimentacoes['data_local'].dt.date
 
-    col_f1, col_f2, col_f3 = st.columns(3)
+    col_f1, col_f2, col_f3, col_f4 = st.columns(4)
     with col_f1:
         produtos_no_historico = sorted(df_movimentacoes['produto_nome'].unique())
         produto_filtrado = st.multiselect("Filtrar por Produto", options=produtos_no_historico)
     with col_f2:
         tipo_filtrado = st.selectbox("Filtrar por Tipo", options=["Todos", "ENTRADA", "SAÍDA"])
     with col_f3:
+        locais_no_historico = sorted(df_movimentacoes['local_nome'].unique())
+        local_filtrado = st.multiselect("Filtrar por Local", options=locais_no_historico)
+    with col_f4:
         min_date = df_movimentacoes['data_filtro'].min()
         max_date = df_movimentacoes['data_filtro'].max()
         periodo_filtrado = st.date_input(
@@ -122,6 +372,8 @@ def render_page(supabase_client: Client):
         df_filtrado = df_filtrado[df_filtrado['produto_nome'].isin(produto_filtrado)]
     if tipo_filtrado != "Todos":
         df_filtrado = df_filtrado[df_filtrado['tipo_movimentacao'] == tipo_filtrado]
+    if local_filtrado:
+        df_filtrado = df_filtrado[df_filtrado['local_nome'].isin(local_filtrado)]
     if len(periodo_filtrado) == 2:
         start_date, end_date = periodo_filtrado
         df_filtrado = df_filtrado[
@@ -133,13 +385,15 @@ def render_page(supabase_client: Client):
     df_display = df_filtrado.copy()
     df_display['data_formatada'] = df_display['data_local'].dt.strftime('%d/%m/%Y %H:%M:%S')
 
-    st.dataframe(
+    tabela_paginada(
         df_display.rename(columns={
             'data_formatada': 'Data e Hora (Brasília)',
             'produto_nome': 'Produto',
+            'local_nome': 'Local',
             'tipo_movimentacao': 'Tipo',
             'quantidade': 'Qtd.'
-        })[['Data e Hora (Brasília)', 'Produto', 'Tipo', 'Qtd.']],
+        })[['Data e Hora (Brasília)', 'Produto', 'Local', 'Tipo', 'Qtd.']],
+        key="movimentacao_pagina_historico",
         use_container_width=True,
         hide_index=True
     )
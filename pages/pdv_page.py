@@ -2,66 +2,92 @@
 import streamlit as st
 from supabase import Client
 import traceback
+import math
+import threading
+import time
+from collections import Counter, deque
 import av
 from PIL import Image
 from pyzbar.pyzbar import decode
 from streamlit_webrtc import webrtc_streamer, WebRtcMode
+from locais import get_catalogo_local, nome_do_local
+from estoque_baixo import get_monitor_estoque_baixo
+from dados_compartilhados import GRUPO_MOVIMENTACOES, invalidar_grupo, invalidar_particao
 
-# Classe para armazenar o resultado do código de barras de forma segura entre execuções
-class BarcodeResult:
-    def __init__(self):
-        self.value = None
-    def set(self, value):
-        self.value = value
-    def get(self):
-        return self.value
+# Leitura contínua: intervalo em que a fila de códigos é aplicada ao carrinho e tempo que um
+# código precisa ficar fora da câmera para ser aceito de novo (a câmera o vê em vários quadros seguidos)
+INTERVALO_LEITURA_CONTINUA = 1.0
+DEBOUNCE_CODIGO_SEGUNDOS = 1.5
+# Produtos desenhados por página do catálogo: o custo de cada reexecução não cresce com o catálogo
+PRODUTOS_POR_PAGINA_CATALOGO = 48
+
+# Fila dos códigos decodificados pela câmera, compartilhada de forma segura entre execuções.
+# O callback de vídeo roda numa thread do streamlit-webrtc, fora da sessão: ele só empilha aqui.
+class FilaLeituras:
+    def __init__(self, debounce: float = DEBOUNCE_CODIGO_SEGUNDOS):
+        self.debounce = debounce
+        self._codigos = deque()
+        self._vistos = {}
+        self._lock = threading.Lock()
+    def registrar(self, codigo: str, agora: float = None) -> bool:
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            # Só importa o que foi visto dentro da janela de debounce: o resto é descartado
+            self._vistos = {c: t for c, t in self._vistos.items() if agora - t < self.debounce}
+            ultimo = self._vistos.get(codigo)
+            self._vistos[codigo] = agora
+            if ultimo is not None and agora - ultimo < self.debounce:
+                return False
+            self._codigos.append(codigo)
+            return True
+    def consumir(self) -> list:
+        with self._lock:
+            codigos = list(self._codigos)
+            self._codigos.clear()
+            return codigos
+    def limpar(self):
+        with self._lock:
+            self._codigos.clear()
+            self._vistos.clear()
 
 class PontoDeVendaApp:
     """
     PDV reformulado com layout adaptativo, leitor de código de barras
     e carregamento completo de produtos.
+
+    Carrinho (com o leitor) e catálogo ficam num fragmento (st.fragment), e o
+    carrinho é um fragmento aninhado nele: cliques no carrinho reexecutam só o
+    carrinho; adicionar pelo catálogo, trocar categoria, página ou modo de
+    exibição reexecutam carrinho e catálogo, sem refazer o resto do app. O
+    catálogo é paginado, então essas reexecuções não crescem com o catálogo.
+    A página inteira só é refeita quando uma venda é concluída.
+
+    Na leitura contínua a câmera fica aberta e os códigos vão para uma fila; o
+    fragmento do carrinho se reexecuta a cada INTERVALO_LEITURA_CONTINUA e aplica
+    a fila inteira de uma vez.
     """
     def __init__(self, supabase_client: Client):
         if not isinstance(supabase_client, Client):
             raise TypeError("O cliente Supabase fornecido é inválido.")
         self.supabase = supabase_client
+        self.local_id = st.session_state.get('local_id')
         
         for key, default_value in [
             ('pdv_carrinho', {}), ('pdv_categoria_selecionada', "Todos"),
             ('payment_step', False), ('pdv_view_mode', "Grelha"),
-            ('barcode_result', None), ('show_scanner', False)
+            ('barcode_result', None), ('show_scanner', False),
+            ('pdv_leitura_continua', False), ('pdv_polling_ativo', False)
         ]:
             if key not in st.session_state:
                 st.session_state[key] = default_value
+        if 'pdv_fila_leituras' not in st.session_state:
+            st.session_state.pdv_fila_leituras = FilaLeituras()
+
+    def _find_product_by_barcode(self, barcode_data: str, indice_codigos: dict):
+        return indice_codigos.get(barcode_data)
 
-    @st.cache_data(ttl=300, hash_funcs={Client: lambda c: id(c)})
-    def get_products_and_categories(_self, supabase_client: Client):
-        all_produtos = []
-        current_page = 0
-        page_size = 1000
-        while True:
-            try:
-                start_index = current_page * page_size
-                # ALTERAÇÃO: .gte para buscar produtos com estoque >= 0
-                response = supabase_client.table('produtos').select(
-                    'id, nome, preco_venda, estoque_atual, tipo, foto_url, codigo_barras'
-                ).gte('estoque_atual', 0).eq('status', 'Ativo').range(start_index, start_index + page_size - 1).execute()
-                
-                batch = response.data
-                if not batch: break
-                all_produtos.extend(batch)
-                current_page += 1
-            except Exception as e:
-                st.error(f"Não foi possível carregar os produtos: {e}")
-                return [], ["Todos"]
-        categorias = ["Todos"] + sorted(list(set([p['tipo'] for p in all_produtos if p['tipo']])))
-        return all_produtos, categorias
-
-    def _find_product_by_barcode(self, barcode_data: str, produtos: list):
-        for produto in produtos:
-            if produto.get('codigo_barras') == barcode_data:
-                return produto
-        return None
+    def _leitura_continua_ativa(self) -> bool:
+        return st.session_state.show_scanner and st.session_state.pdv_leitura_continua
 
     def _incrementar_quantidade(self, id_produto: int):
         if id_produto in st.session_state.pdv_carrinho:
@@ -83,68 +109,134 @@ class PontoDeVendaApp:
             }
 
     def _remover_do_carrinho(self, id_produto: int):
+        # Usado como callback de botão dentro do fragmento do carrinho: o próprio clique já
+        # reexecuta apenas o fragmento, sem precisar de st.rerun()
         if id_produto in st.session_state.pdv_carrinho:
             del st.session_state.pdv_carrinho[id_produto]
             if not st.session_state.pdv_carrinho:
                 st.session_state.payment_step = False
-            st.rerun()
+
+    def _adicionar_pelo_catalogo(self, produto: dict):
+        # Callback: o clique reexecuta o fragmento do catálogo, que também desenha o carrinho.
+        # Adicionar um item durante o pagamento volta para a edição do carrinho.
+        self._adicionar_ao_carrinho(produto)
+        st.session_state.payment_step = False
 
     def _finalizar_venda(self, forma_pagamento: str):
         carrinho, erros = st.session_state.pdv_carrinho, []
+        monitor_estoque = get_monitor_estoque_baixo(self.supabase)
         with st.spinner("Registrando Venda..."):
             for item_id, item_data in carrinho.items():
                 try:
-                    response = self.supabase.rpc('atualizar_estoque', {'p_produto_id': item_id, 'p_quantidade_movimentada': item_data['quantidade'], 'p_tipo_mov': 'SAÍDA', 'p_forma_pagamento': forma_pagamento}).execute()
+                    response = self.supabase.rpc('atualizar_estoque', {'p_produto_id': item_id, 'p_quantidade_movimentada': item_data['quantidade'], 'p_tipo_mov': 'SAÍDA', 'p_forma_pagamento': forma_pagamento, 'p_local_id': self.local_id}).execute()
                     if hasattr(response, 'data') and response.data != 'Sucesso': erros.append(f"Produto {item_data['nome']}: {response.data}")
+                    else: monitor_estoque.aplicar_movimentacao(item_id, 'SAÍDA', item_data['quantidade'])
                 except Exception as e: erros.append(f"Produto {item_data['nome']}: Erro de comunicação - {e}")
         if erros: st.error("A venda não pôde ser completada:\n- " + "\n- ".join(erros))
-        else: st.success("Venda registrada com sucesso!"); st.session_state.pdv_carrinho = {}; st.session_state.payment_step = False; st.cache_data.clear(); st.rerun()
+        else: st.success("Venda registrada com sucesso!"); st.session_state.pdv_carrinho = {}; st.session_state.payment_step = False; self._invalidar_apos_venda(); st.rerun()
+
+    def _invalidar_apos_venda(self):
+        # O catálogo do local da venda e o que mostra movimentações ou o estoque da rede (Gestão,
+        # Dashboard, Relatórios): os catálogos dos demais locais continuam em cache
+        invalidar_particao(get_catalogo_local, self.supabase, self.local_id)
+        invalidar_grupo(GRUPO_MOVIMENTACOES)
 
     def _renderizar_categorias(self, categorias):
-        st.sidebar.title("Categorias")
-        categoria_selecionada = st.sidebar.radio("Filtre por categoria:", options=categorias, key="pdv_categoria_radio", index=categorias.index(st.session_state.pdv_categoria_selecionada))
-        if st.session_state.pdv_categoria_selecionada != categoria_selecionada:
-            st.session_state.pdv_categoria_selecionada = categoria_selecionada; st.rerun()
+        # Fica dentro do fragmento de vendas (fragmentos não podem escrever na barra lateral):
+        # trocar a categoria não reexecuta o resto do app
+        if st.session_state.pdv_categoria_selecionada not in categorias:
+            st.session_state.pdv_categoria_selecionada = "Todos"
+        st.session_state.pdv_categoria_selecionada = st.radio(
+            "Filtre por categoria:", options=categorias, key="pdv_categoria_radio", horizontal=True,
+            index=categorias.index(st.session_state.pdv_categoria_selecionada)
+        )
 
-    def _renderizar_leitor_codigo_barras(self, produtos, container):
-        barcode_result_container = BarcodeResult()
+    def _renderizar_leitor_codigo_barras(self):
+        fila = st.session_state.pdv_fila_leituras
         def video_frame_callback(frame: av.VideoFrame) -> av.VideoFrame:
             img = frame.to_image()
-            barcodes = decode(img)
-            if barcodes:
-                barcode_data = barcodes[0].data.decode('utf-8')
-                barcode_result_container.set(barcode_data)
+            for barcode in decode(img):
+                fila.registrar(barcode.data.decode('utf-8'))
             return frame
         
-        webrtc_ctx = container.webrtc_streamer(
+        webrtc_streamer(
             key="barcode-scanner", mode=WebRtcMode.SENDRECV,
             video_frame_callback=video_frame_callback,
             media_stream_constraints={"video": True, "audio": False},
             async_processing=True,
         )
 
-        if webrtc_ctx.state.playing and barcode_result_container.get():
-            st.session_state.barcode_result = barcode_result_container.get()
+        if st.session_state.pdv_leitura_continua:
+            return
+        # Leitura avulsa: o primeiro código lido fecha o leitor
+        codigos = fila.consumir()
+        if codigos:
+            st.session_state.barcode_result = codigos[0]
             st.session_state.show_scanner = False
-            st.rerun()
 
-    def _renderizar_catalogo(self, produtos, categoria_selecionada):
-        col_header1, col_header2 = st.columns([1, 1])
-        with col_header1: st.header("Catálogo")
-        with col_header2: st.button("📷 Ler Código", on_click=lambda: st.session_state.update(show_scanner=True), use_container_width=True)
+    def _processar_codigo_lido(self, indice_codigos):
+        codigo = st.session_state.barcode_result
+        st.session_state.barcode_result = None
+        produto_encontrado = self._find_product_by_barcode(codigo, indice_codigos)
+        if produto_encontrado:
+            self._adicionar_ao_carrinho(produto_encontrado)
+            st.toast(f"✅ {produto_encontrado['nome']} adicionado ao carrinho!")
+        else:
+            st.toast(f"❌ Código '{codigo}' não encontrado!")
+
+    def _aplicar_fila_de_leituras(self, indice_codigos):
+        """Aplica ao carrinho, de uma vez, todos os códigos lidos desde a última reexecução."""
+        codigos = st.session_state.pdv_fila_leituras.consumir()
+        if not codigos:
+            return
+        adicionados, nao_encontrados = 0, []
+        for codigo, quantidade in Counter(codigos).items():
+            produto = self._find_product_by_barcode(codigo, indice_codigos)
+            if produto is None:
+                nao_encontrados.append(codigo)
+                continue
+            self._adicionar_ao_carrinho(produto)
+            if quantidade > 1:
+                st.session_state.pdv_carrinho[produto['id']]['quantidade'] += quantidade - 1
+            adicionados += quantidade
+        if adicionados:
+            st.toast(f"✅ {adicionados} {'item adicionado' if adicionados == 1 else 'itens adicionados'} ao carrinho!")
+        for codigo in nao_encontrados:
+            st.toast(f"❌ Código '{codigo}' não encontrado!")
+
+    @st.fragment
+    def _secao_vendas(self, produtos, categorias, indice_codigos):
+        self._secao_carrinho(indice_codigos)
+        self._renderizar_catalogo(produtos, categorias)
+
+    def _pagina_do_catalogo(self, produtos_filtrados):
+        paginas = max(1, math.ceil(len(produtos_filtrados) / PRODUTOS_POR_PAGINA_CATALOGO))
+        if paginas == 1:
+            return produtos_filtrados
+        # Outra categoria pode ter menos páginas: mantém a página escolhida dentro do limite
+        if st.session_state.get('pdv_pagina_catalogo', 1) > paginas:
+            st.session_state.pdv_pagina_catalogo = 1
+        pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key="pdv_pagina_catalogo")
+        inicio = (pagina - 1) * PRODUTOS_POR_PAGINA_CATALOGO
+        return produtos_filtrados[inicio:inicio + PRODUTOS_POR_PAGINA_CATALOGO]
+
+    def _renderizar_catalogo(self, produtos, categorias):
+        st.header("Catálogo")
+        self._renderizar_categorias(categorias)
+        categoria_selecionada = st.session_state.pdv_categoria_selecionada
 
         is_grelha = st.session_state.pdv_view_mode == "Grelha"
         col_btn1, col_btn2 = st.columns(2)
+        # Callbacks rodam antes da reexecução do fragmento, então não é preciso st.rerun()
         with col_btn1:
-            if st.button("🖼️ Grelha", use_container_width=True, type="primary" if is_grelha else "secondary"):
-                st.session_state.pdv_view_mode = "Grelha"; st.rerun()
+            st.button("🖼️ Grelha", use_container_width=True, type="primary" if is_grelha else "secondary", on_click=st.session_state.update, kwargs={'pdv_view_mode': "Grelha"})
         with col_btn2:
-            if st.button("📜 Lista", use_container_width=True, type="primary" if not is_grelha else "secondary"):
-                st.session_state.pdv_view_mode = "Lista"; st.rerun()
+            st.button("📜 Lista", use_container_width=True, type="primary" if not is_grelha else "secondary", on_click=st.session_state.update, kwargs={'pdv_view_mode': "Lista"})
         st.divider()
 
         produtos_filtrados = [p for p in produtos if p['tipo'] == categoria_selecionada] if categoria_selecionada != "Todos" else produtos
         if not produtos_filtrados: st.info("Nenhum produto encontrado nesta categoria."); return
+        produtos_filtrados = self._pagina_do_catalogo(produtos_filtrados)
 
         if st.session_state.pdv_view_mode == "Grelha": self._renderizar_catalogo_grelha(produtos_filtrados)
         else: self._renderizar_catalogo_lista(produtos_filtrados)
@@ -165,7 +257,7 @@ class PontoDeVendaApp:
                     
                     # ALTERAÇÃO: Condição para mostrar o botão correto baseado no estoque
                     if produto.get('estoque_atual', 0) > 0:
-                        st.button("Adicionar ＋", key=f"add_grid_{produto['id']}", on_click=self._adicionar_ao_carrinho, args=(produto,), use_container_width=True, type="primary")
+                        st.button("Adicionar ＋", key=f"add_grid_{produto['id']}", on_click=self._adicionar_pelo_catalogo, args=(produto,), use_container_width=True, type="primary")
                     else:
                         st.button("Fora de Estoque", key=f"add_grid_{produto['id']}", use_container_width=True, disabled=True)
 
@@ -185,11 +277,39 @@ class PontoDeVendaApp:
                 with cols[2]:
                     # ALTERAÇÃO: Condição para mostrar o botão correto baseado no estoque
                     if produto.get('estoque_atual', 0) > 0:
-                        st.button("Adicionar ＋", key=f"add_list_{produto['id']}", on_click=self._adicionar_ao_carrinho, args=(produto,), use_container_width=True, type="primary")
+                        st.button("Adicionar ＋", key=f"add_list_{produto['id']}", on_click=self._adicionar_pelo_catalogo, args=(produto,), use_container_width=True, type="primary")
                     else:
                         st.button("Fora de Estoque", key=f"add_list_{produto['id']}", use_container_width=True, disabled=True)
                 st.divider()
 
+    def _secao_carrinho(self, indice_codigos):
+        # Na leitura contínua o fragmento se reexecuta sozinho (run_every) para esvaziar a fila de códigos.
+        # O intervalo só é (re)configurado numa execução completa da página.
+        intervalo = INTERVALO_LEITURA_CONTINUA if self._leitura_continua_ativa() else None
+        st.session_state.pdv_polling_ativo = intervalo is not None
+        st.fragment(self._fragmento_carrinho, run_every=intervalo)(indice_codigos)
+
+    def _fragmento_carrinho(self, indice_codigos):
+        col_leitor, col_modo = st.columns([2, 1])
+        col_leitor.button("📷 Ler Código", on_click=lambda: st.session_state.update(show_scanner=not st.session_state.show_scanner), use_container_width=True)
+        # Leituras pendentes de um modo não podem ser aplicadas pelo outro
+        col_modo.toggle("🔁 Contínua", key="pdv_leitura_continua", help="Mantém a câmera aberta e adiciona cada produto lido.",
+                        on_change=st.session_state.pdv_fila_leituras.limpar)
+        if self._leitura_continua_ativa() != st.session_state.pdv_polling_ativo:
+            # Abrir/fechar o leitor contínuo liga/desliga a reexecução periódica: pede uma execução completa
+            st.rerun()
+        if st.session_state.show_scanner:
+            with st.container(border=True):
+                st.write("Aponte a câmera para o código de barras do produto.")
+                self._renderizar_leitor_codigo_barras()
+        # O carrinho é desenhado depois do leitor, então o item lido já aparece nesta mesma execução
+        if st.session_state.barcode_result:
+            self._processar_codigo_lido(indice_codigos)
+        if self._leitura_continua_ativa():
+            self._aplicar_fila_de_leituras(indice_codigos)
+
+        self._renderizar_carrinho()
+
     def _renderizar_carrinho(self):
         carrinho = st.session_state.pdv_carrinho
         total_venda = sum(item['quantidade'] * item['preco_unitario'] for item in carrinho.values())
@@ -210,39 +330,23 @@ class PontoDeVendaApp:
                 with col_remove: st.button("🗑️", key=f"del_{item_id}", help="Remover item", on_click=self._remover_do_carrinho, args=(item_id,), use_container_width=True)
             st.divider()
             if not st.session_state.payment_step:
-                if st.button("Prosseguir para Pagamento", use_container_width=True, type="primary"): st.session_state.payment_step = True; st.rerun()
+                st.button("Prosseguir para Pagamento", use_container_width=True, type="primary", on_click=st.session_state.update, kwargs={'payment_step': True})
             else:
                 st.markdown("##### Selecione a Forma de Pagamento"); forma_pagamento = st.selectbox("Forma de Pagamento", ["Dinheiro", "Cartão de Débito", "Cartão de Crédito", "PIX"], label_visibility="collapsed")
                 btn_cols = st.columns(2)
                 with btn_cols[0]:
                     if st.button(f"Confirmar Venda", use_container_width=True, type="primary"): self._finalizar_venda(forma_pagamento)
                 with btn_cols[1]:
-                    if st.button("Cancelar", use_container_width=True): st.session_state.payment_step = False; st.rerun()
+                    st.button("Cancelar", use_container_width=True, on_click=st.session_state.update, kwargs={'payment_step': False})
 
     def render(self):
         st.set_page_config(layout="wide"); st.title("Ponto de Venda (PDV)")
-        produtos, categorias = self.get_products_and_categories(self.supabase)
-        self._renderizar_categorias(categorias)
+        if self.local_id is None: st.warning("Selecione um local de trabalho na barra lateral."); return
+        st.caption(f"📍 Vendendo do estoque de: **{nome_do_local(self.supabase, self.local_id)}**")
+        try: produtos, categorias, indice_codigos = get_catalogo_local(self.supabase, self.local_id)
+        except Exception as e: st.error(f"Não foi possível carregar os produtos: {e}"); return
 
-        if st.session_state.barcode_result:
-            codigo = st.session_state.barcode_result
-            st.session_state.barcode_result = None
-            produto_encontrado = self._find_product_by_barcode(codigo, produtos)
-            if produto_encontrado:
-                self._adicionar_ao_carrinho(produto_encontrado)
-                st.toast(f"✅ {produto_encontrado['nome']} adicionado ao carrinho!")
-            else:
-                st.toast(f"❌ Código '{codigo}' não encontrado!")
-            st.rerun()
-
-        if st.session_state.show_scanner:
-            dialog = st.dialog("Leitor de Código de Barras")
-            dialog.write("Aponte a câmera para o código de barras do produto.")
-            self._renderizar_leitor_codigo_barras(produtos, container=dialog)
-
-        if st.session_state.payment_step: st.info("Finalize ou cancele a venda atual para iniciar uma nova.")
-        self._renderizar_carrinho()
-        if not st.session_state.payment_step: self._renderizar_catalogo(produtos, st.session_state.pdv_categoria_selecionada)
+        self._secao_vendas(produtos, categorias, indice_codigos)
 
 def render_page(supabase_client: Client):
     try:
@@ -2,32 +2,52 @@
 import streamlit as st
 import pandas as pd
 from supabase import Client
-from utils import supabase_client_hash_func
+from schema import COLUNAS_MOVIMENTACOES, COLUNAS_PRODUTOS_RELATORIOS, COLUNAS_ESTOQUE_LOCAL_RELATORIOS, tipar_dataframe, total_em_reais
+from estoque_baixo import get_monitor_estoque_baixo
+from previsao_demanda import get_agendador_previsao
+from locais import get_locais, achatar_estoque_local
+from dados_compartilhados import GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES, cache_compartilhado, vista, limpar_caches
+from graficos import TOP_N_PADRAO, top_n_com_outros, agregar_por_categoria, reduzir_serie_temporal, tabela_paginada
 import pytz # Biblioteca para lidar com fusos horários de forma robusta
 
-@st.cache_data(ttl=30, hash_funcs={Client: supabase_client_hash_func})
-def get_relatorios_data(supabase_client: Client):
-    """Busca todos os dados necessários para os relatórios de uma só vez."""
+@cache_compartilhado(ttl=30, grupos=(GRUPO_ESTOQUE, GRUPO_MOVIMENTACOES))
+def get_relatorios_data(supabase_client: Client, local_id: int = None):
+    """Busca todos os dados necessários para os relatórios de uma só vez (da rede toda ou de um local).
+
+    Os DataFrames são compartilhados entre as sessões: leia-os com vista().
+    """
     if not supabase_client:
         return pd.DataFrame(), pd.DataFrame()
 
-    produtos_response = supabase_client.table('produtos').select(
-        'nome, tipo, estoque_atual, qtd_minima_estoque, preco_venda, preco_compra'
-    ).order('nome').execute()
-    
-    movimentacoes_response = supabase_client.table('movimentacoes').select(
-        '*, produtos(nome)'
-    ).order('data_movimentacao', desc=True).limit(2000).execute()
+    movimentacoes_query = supabase_client.table('movimentacoes').select(COLUNAS_MOVIMENTACOES)
+    if local_id is None:
+        produtos_response = supabase_client.table('produtos').select(
+            COLUNAS_PRODUTOS_RELATORIOS
+        ).order('nome').execute()
+        df_estoque = pd.DataFrame(produtos_response.data)
+    else:
+        estoque_response = supabase_client.table('estoque_locais').select(
+            COLUNAS_ESTOQUE_LOCAL_RELATORIOS
+        ).eq('local_id', local_id).execute()
+        df_estoque = pd.DataFrame(achatar_estoque_local(estoque_response.data))
+        if not df_estoque.empty:
+            df_estoque = df_estoque.sort_values('nome')[COLUNAS_PRODUTOS_RELATORIOS.split(', ')]
+        movimentacoes_query = movimentacoes_query.eq('local_id', local_id)
 
-    df_estoque = pd.DataFrame(produtos_response.data)
+    movimentacoes_response = movimentacoes_query.order('data_movimentacao', desc=True).limit(2000).execute()
+
+    df_estoque = tipar_dataframe(df_estoque, 'relatorios.estoque')
     
     df_movimentacoes = pd.DataFrame()
     if movimentacoes_response.data:
         df_movimentacoes = pd.json_normalize(movimentacoes_response.data)
-        if 'produtos.nome' in df_movimentacoes.columns:
-            df_movimentacoes = df_movimentacoes.rename(columns={'produtos.nome': 'produto_nome'})
+        df_movimentacoes = df_movimentacoes.rename(columns={'produtos.nome': 'produto_nome', 'locais.nome': 'local_nome'})
+        if 'local_nome' not in df_movimentacoes.columns:
+            df_movimentacoes['local_nome'] = None
+        df_movimentacoes['local_nome'] = df_movimentacoes['local_nome'].fillna("Sem local")
         # Converte a coluna de data para o tipo datetime com fuso horário (timezone-aware)
         df_movimentacoes['data_movimentacao'] = pd.to_datetime(df_movimentacoes['data_movimentacao'])
+        df_movimentacoes = tipar_dataframe(df_movimentacoes, 'relatorios.movimentacoes')
 
     return df_estoque, df_movimentacoes
 
@@ -36,23 +56,34 @@ def render_page(supabase_client: Client):
     st.write("Analise o desempenho e a saúde do seu negócio em tempo real.")
 
     if st.button("Recarregar Dados"):
-        st.cache_data.clear()
+        limpar_caches()
+        get_monitor_estoque_baixo(supabase_client).invalidar()
         st.rerun()
 
-    df_estoque, df_movimentacoes = get_relatorios_data(supabase_client)
+    opcoes_locais = {None: "Todos os locais"} | {local['id']: local['nome'] for local in get_locais(supabase_client)}
+    local_relatorio = st.selectbox("📍 Local", options=list(opcoes_locais), format_func=opcoes_locais.get, key="relatorio_local")
+
+    df_estoque, df_movimentacoes = map(vista, get_relatorios_data(supabase_client, local_relatorio))
 
     if df_estoque.empty:
         st.warning("Não há dados de produtos para exibir. Cadastre produtos primeiro.")
         return
 
-    tab1, tab2, tab3 = st.tabs(["📈 Resumo do Estoque", "📜 Histórico de Movimentações", "💰 Análise de Lucro"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📈 Resumo do Estoque", "📜 Histórico de Movimentações", "💰 Análise de Lucro", "🔮 Reposição"])
 
     with tab1:
         st.subheader("Visão Geral do Estoque")
         
         total_itens = df_estoque['estoque_atual'].sum()
-        valor_estoque_venda = (df_estoque['estoque_atual'] * df_estoque['preco_venda']).sum()
-        produtos_baixo_estoque = df_estoque[df_estoque['estoque_atual'] <= df_estoque['qtd_minima_estoque']].shape[0]
+        valor_estoque_venda = total_em_reais(df_estoque['estoque_atual'] * df_estoque['preco_venda'])
+        if local_relatorio is None:
+            # Contagem da rede mantida por delta a cada movimentação/venda, sem varrer a tabela de produtos
+            monitor_estoque = get_monitor_estoque_baixo(supabase_client)
+            produtos_baixo_estoque = monitor_estoque.total()
+        else:
+            # Um único local: a partição já carregada é pequena
+            df_baixo_local = df_estoque[df_estoque['estoque_atual'] <= df_estoque['qtd_minima_estoque']]
+            produtos_baixo_estoque = df_baixo_local.shape[0]
 
         col1, col2, col3 = st.columns(3)
         col1.metric("Itens Totais em Estoque", f"{total_itens:,.0f}")
@@ -61,6 +92,35 @@ def render_page(supabase_client: Client):
         
         st.divider()
 
+        st.subheader("🔔 Produtos com Estoque Baixo")
+        if produtos_baixo_estoque == 0:
+            st.success("Nenhum produto abaixo do estoque mínimo.")
+        else:
+            col_filtro1, col_filtro2 = st.columns(2)
+            with col_filtro1:
+                categorias_alerta = ["Todas"] + sorted(df_estoque['tipo'].dropna().unique().tolist())
+                categoria_alerta = st.selectbox("Filtrar por Categoria", options=categorias_alerta, key="alerta_categoria")
+            with col_filtro2:
+                busca_alerta = st.text_input("Buscar produto", key="alerta_busca", placeholder="Digite para filtrar...")
+            if local_relatorio is None:
+                df_alerta = monitor_estoque.listar(categoria_alerta)
+            else:
+                df_alerta = df_baixo_local.assign(deficit=df_baixo_local['qtd_minima_estoque'] - df_baixo_local['estoque_atual'])
+                if categoria_alerta != "Todas":
+                    df_alerta = df_alerta[df_alerta['tipo'] == categoria_alerta]
+                df_alerta = df_alerta.sort_values(['deficit', 'nome'], ascending=[False, True])
+            if busca_alerta:
+                df_alerta = df_alerta[df_alerta['nome'].str.contains(busca_alerta, case=False, na=False)]
+            st.dataframe(
+                df_alerta[['nome', 'tipo', 'estoque_atual', 'qtd_minima_estoque', 'deficit']].rename(columns={
+                    'nome': 'Produto', 'tipo': 'Categoria', 'estoque_atual': 'Estoque',
+                    'qtd_minima_estoque': 'Estoque Mínimo', 'deficit': 'Faltam'
+                }),
+                use_container_width=True, hide_index=True
+            )
+
+        st.divider()
+
         st.subheader("Detalhes dos Produtos")
         st.info("Esta é a sua 'tabela de estoque'. A coluna `estoque_atual` é atualizada automaticamente a cada entrada ou saída.", icon="ℹ️")
         
@@ -69,7 +129,7 @@ def render_page(supabase_client: Client):
             'qtd_minima_estoque': 'Estoque Mínimo', 'preco_venda': 'Preço Venda (R$)',
             'preco_compra': 'Preço Compra (R$)'
         })
-        st.dataframe(df_display_estoque, use_container_width=True, hide_index=True)
+        tabela_paginada(df_display_estoque, key="relatorio_pagina_estoque", use_container_width=True, hide_index=True)
 
     with tab2:
         st.subheader("Filtrar Histórico de Movimentações")
@@ -119,13 +179,15 @@ def render_page(supabase_client: Client):
             df_display = df_filtrado.copy()
             df_display['data_formatada'] = df_display['data_local'].dt.strftime('%d/%m/%Y %H:%M:%S')
 
-            st.dataframe(
+            tabela_paginada(
                 df_display.rename(columns={
                     'data_formatada': 'Data e Hora (Brasília)',
                     'produto_nome': 'Produto',
+                    'local_nome': 'Local',
                     'tipo_movimentacao': 'Tipo',
                     'quantidade': 'Qtd.'
-                })[['Data e Hora (Brasília)', 'Produto', 'Tipo', 'Qtd.']],
+                })[['Data e Hora (Brasília)', 'Produto', 'Local', 'Tipo', 'Qtd.']],
+                key="relatorio_pagina_historico",
                 use_container_width=True,
                 hide_index=True
             )
@@ -137,15 +199,82 @@ def render_page(supabase_client: Client):
         df_lucro['lucro_unidade'] = df_lucro['preco_venda'] - df_lucro['preco_compra']
         df_lucro['lucro_potencial_total'] = df_lucro['lucro_unidade'] * df_lucro['estoque_atual']
         
-        lucro_total_potencial = df_lucro['lucro_potencial_total'].sum()
+        lucro_total_potencial = total_em_reais(df_lucro['lucro_potencial_total'])
         st.metric("Lucro Potencial Total em Estoque", f"R$ {lucro_total_potencial:,.2f}")
-        
-        st.dataframe(
-            df_lucro[['nome', 'estoque_atual', 'lucro_unidade', 'lucro_potencial_total']].rename(columns={
+
+        # O gráfico recebe no máximo top_n + 1 barras, seja qual for o tamanho do catálogo
+        col_agrupar, col_top = st.columns(2)
+        with col_agrupar:
+            agrupar_por = st.radio("Agrupar por", ["Produto", "Categoria"], horizontal=True, key="lucro_agrupar")
+        with col_top:
+            top_n = st.slider("Maiores a exibir", min_value=5, max_value=50, value=TOP_N_PADRAO, step=5, key="lucro_top_n")
+        if agrupar_por == "Produto":
+            serie_grafico = top_n_com_outros(df_lucro, 'nome', 'lucro_potencial_total', top_n)
+        else:
+            df_categorias = agregar_por_categoria(df_lucro, 'tipo', ['lucro_potencial_total'])
+            serie_grafico = top_n_com_outros(df_categorias.reset_index(), 'tipo', 'lucro_potencial_total', top_n)
+        st.bar_chart(serie_grafico.rename("Lucro Potencial (R$)"))
+
+        tabela_paginada(
+            df_lucro.sort_values('lucro_potencial_total', ascending=False)[['nome', 'estoque_atual', 'lucro_unidade', 'lucro_potencial_total']].rename(columns={
                 'nome': 'Produto', 'estoque_atual': 'Estoque', 'lucro_unidade': 'Lucro/Unidade (R$)',
                 'lucro_potencial_total': 'Lucro Potencial Total (R$)'
             }),
-            use_container_width=True, hide_index=True
+            key="relatorio_pagina_lucro", use_container_width=True, hide_index=True
         )
 
-        st.bar_chart(df_lucro.set_index('nome')['lucro_potencial_total'])
+        st.divider()
+        st.subheader("Tendência de Vendas")
+        if df_movimentacoes.empty:
+            st.info("Nenhuma movimentação registrada ainda.")
+        else:
+            # Ajustes da reconciliação de estoque não são vendas
+            df_vendas = df_movimentacoes[(df_movimentacoes['tipo_movimentacao'] == 'SAÍDA') & df_movimentacoes['origem'].isna()]
+            if df_vendas.empty:
+                st.info("Nenhuma venda no período carregado.")
+            else:
+                datas_locais = df_vendas['data_movimentacao'].dt.tz_convert(pytz.timezone("America/Sao_Paulo")).dt.tz_localize(None)
+                serie_vendas, intervalo = reduzir_serie_temporal(datas_locais, df_vendas['quantidade'])
+                st.line_chart(serie_vendas.rename("Unidades vendidas"))
+                st.caption(f"Unidades vendidas por {intervalo} ({len(df_vendas)} saídas, {len(serie_vendas)} pontos).")
+
+    with tab4:
+        st.subheader("Sugestões de Reposição")
+        agendador = get_agendador_previsao(supabase_client)
+        df_previsao, calculado_em, duracao, erro = agendador.obter()
+
+        col_info, col_btn = st.columns([3, 1])
+        with col_info:
+            if calculado_em:
+                st.caption(
+                    f"Calculado em {calculado_em.strftime('%d/%m/%Y %H:%M')} ({duracao:.1f}s) · "
+                    f"média móvel de {agendador.config['janela_media_dias']} dias · "
+                    f"prazo do fornecedor de {agendador.config['lead_time_dias']} dias · "
+                    f"recalculado a cada {agendador.config['intervalo_horas']}h"
+                )
+        with col_btn:
+            if st.button("Recalcular Agora", use_container_width=True):
+                agendador.solicitar_recalculo()
+                st.toast("O recálculo foi iniciado em segundo plano.")
+        if erro:
+            st.error(f"A última execução da previsão falhou: {erro}")
+
+        if df_previsao.empty:
+            st.info("A previsão ainda está sendo calculada. Volte em alguns instantes.")
+        else:
+            df_repor = df_previsao[df_previsao['qtd_sugerida'] > 0]
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Produtos a Repor", df_repor.shape[0])
+            col2.metric("Unidades Sugeridas", f"{df_repor['qtd_sugerida'].sum():,.0f}")
+            col3.metric("Sem Vendas no Período", int((df_previsao['demanda_diaria'] == 0).sum()))
+
+            apenas_repor = st.toggle("Mostrar apenas produtos a repor", value=True)
+            df_display_previsao = df_repor if apenas_repor else df_previsao
+            tabela_paginada(
+                df_display_previsao[['nome', 'tipo', 'estoque_atual', 'demanda_diaria', 'dias_cobertura', 'ponto_pedido', 'qtd_sugerida']].rename(columns={
+                    'nome': 'Produto', 'tipo': 'Categoria', 'estoque_atual': 'Estoque',
+                    'demanda_diaria': 'Demanda/Dia', 'dias_cobertura': 'Dias de Cobertura',
+                    'ponto_pedido': 'Ponto de Pedido', 'qtd_sugerida': 'Qtd. Sugerida'
+                }),
+                key="relatorio_pagina_previsao", use_container_width=True, hide_index=True
+            )
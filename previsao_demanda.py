@@ -0,0 +1,208 @@
+# previsao_demanda.py
+"""
+Previsão de demanda e sugestões de reposição para todos os produtos de uma vez.
+
+As saídas ('SAÍDA') dos últimos dias viram uma matriz produtos x dias; a média móvel, os dias de
+cobertura e a quantidade sugerida são calculados com operações vetorizadas do NumPy/pandas,
+sem laços por produto. O cálculo roda em segundo plano, em intervalos fixos, e o resultado fica
+em memória para todas as sessões.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+from supabase import Client
+
+from utils import supabase_client_hash_func
+
+logger = logging.getLogger(__name__)
+
+BRASILIA_TZ = pytz.timezone("America/Sao_Paulo")
+
+# Podem ser sobrescritos na seção [PREVISAO] do secrets.toml
+PREVISAO_CONFIG_PADRAO = {
+    "janela_historico_dias": 28,   # dias de histórico de vendas considerados
+    "janela_media_dias": 7,        # janela da média móvel de demanda diária
+    "lead_time_dias": 3,           # prazo de entrega do fornecedor
+    "cobertura_alvo_dias": 14,     # quantos dias de venda cada pedido deve cobrir
+    "estoque_seguranca_dias": 2,
+    "intervalo_horas": 6,          # frequência do job em segundo plano
+}
+
+
+def get_previsao_config() -> dict:
+    config = dict(PREVISAO_CONFIG_PADRAO)
+    try:
+        config.update(dict(st.secrets.get("PREVISAO", {})))
+    except Exception:
+        pass
+    return config
+
+
+# --- CARGA DOS DADOS ---
+
+def carregar_saidas(supabase_client: Client, desde: datetime, page_size: int = 1000) -> pd.DataFrame:
+    """Busca, paginando, as saídas registradas a partir de 'desde' (sem os ajustes da reconciliação)."""
+    linhas = []
+    current_page = 0
+    while True:
+        start_index = current_page * page_size
+        batch = supabase_client.table('movimentacoes').select(
+            'produto_id, quantidade, data_movimentacao'
+        ).eq('tipo_movimentacao', 'SAÍDA').is_('origem', 'null').gte('data_movimentacao', desde.isoformat()).order(
+            'data_movimentacao'
+        ).range(start_index, start_index + page_size - 1).execute().data
+        if not batch: break
+        linhas.extend(batch)
+        current_page += 1
+    return pd.DataFrame(linhas, columns=['produto_id', 'quantidade', 'data_movimentacao'])
+
+
+def carregar_produtos(supabase_client: Client, page_size: int = 1000) -> pd.DataFrame:
+    linhas = []
+    current_page = 0
+    while True:
+        start_index = current_page * page_size
+        batch = supabase_client.table('produtos').select(
+            'id, nome, tipo, estoque_atual'
+        ).eq('status', 'Ativo').order('id').range(start_index, start_index + page_size - 1).execute().data
+        if not batch: break
+        linhas.extend(batch)
+        current_page += 1
+    return pd.DataFrame(linhas, columns=['id', 'nome', 'tipo', 'estoque_atual'])
+
+
+# --- CÁLCULO VETORIZADO ---
+
+def matriz_demanda_diaria(df_saidas: pd.DataFrame, ids_produtos, dias: pd.DatetimeIndex) -> np.ndarray:
+    """Matriz (produtos x dias) com a quantidade vendida por dia; dias sem venda valem zero."""
+    if df_saidas.empty:
+        return np.zeros((len(ids_produtos), len(dias)))
+    datas_locais = pd.to_datetime(df_saidas['data_movimentacao'], utc=True).dt.tz_convert(BRASILIA_TZ)
+    df = pd.DataFrame({
+        'produto_id': df_saidas['produto_id'].to_numpy(),
+        'dia': datas_locais.dt.tz_localize(None).dt.normalize(),
+        'quantidade': pd.to_numeric(df_saidas['quantidade'], errors='coerce').fillna(0).to_numpy(),
+    })
+    tabela = df.groupby(['produto_id', 'dia'])['quantidade'].sum().unstack(fill_value=0)
+    tabela = tabela.reindex(index=ids_produtos, columns=dias, fill_value=0)
+    return tabela.to_numpy(dtype='float64')
+
+
+def media_movel(matriz: np.ndarray, janela: int) -> np.ndarray:
+    """Média móvel por linha (produto) via soma acumulada: uma coluna por janela inteira dentro da matriz,
+    a última terminando no último dia da matriz."""
+    janela = max(1, min(janela, matriz.shape[1]))
+    soma = np.cumsum(matriz, axis=1)
+    soma = np.concatenate([np.zeros((matriz.shape[0], 1)), soma], axis=1)
+    return (soma[:, janela:] - soma[:, :-janela]) / janela
+
+
+def calcular_sugestoes(df_produtos: pd.DataFrame, df_saidas: pd.DataFrame, config: dict, hoje=None) -> pd.DataFrame:
+    """Demanda diária, dias de cobertura e quantidade sugerida de reposição para todos os produtos.
+
+    O histórico termina ontem: o dia em andamento ainda não tem todas as vendas e puxaria a média para baixo.
+    """
+    hoje = hoje or datetime.now(BRASILIA_TZ).date()
+    dias = pd.date_range(end=pd.Timestamp(hoje) - pd.Timedelta(days=1), periods=int(config["janela_historico_dias"]), freq='D')
+    ids = df_produtos['id'].to_numpy()
+
+    matriz = matriz_demanda_diaria(df_saidas, ids, dias)
+    medias = media_movel(matriz, int(config["janela_media_dias"]))
+    demanda_diaria = medias[:, -1] if medias.shape[1] else np.zeros(len(ids))
+    demanda_historico = matriz.mean(axis=1) if matriz.shape[1] else np.zeros(len(ids))
+
+    estoque = pd.to_numeric(df_produtos['estoque_atual'], errors='coerce').fillna(0).to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_cobertura = np.where(demanda_diaria > 0, estoque / demanda_diaria, np.inf)
+
+    lead_time = float(config["lead_time_dias"])
+    seguranca = float(config["estoque_seguranca_dias"])
+    ponto_pedido = demanda_diaria * (lead_time + seguranca)
+    estoque_alvo = demanda_diaria * (lead_time + seguranca + float(config["cobertura_alvo_dias"]))
+    precisa_repor = (estoque <= ponto_pedido) & (demanda_diaria > 0)
+    qtd_sugerida = np.where(precisa_repor, np.ceil(np.maximum(estoque_alvo - estoque, 0)), 0).astype('int64')
+
+    resultado = pd.DataFrame({
+        'id': ids,
+        'nome': df_produtos['nome'].to_numpy(),
+        'tipo': df_produtos['tipo'].astype('category').to_numpy(),
+        'estoque_atual': estoque.astype('int64'),
+        'demanda_diaria': demanda_diaria.round(2),
+        'demanda_media_historico': demanda_historico.round(2),
+        'dias_cobertura': dias_cobertura.round(1),
+        'ponto_pedido': np.ceil(ponto_pedido).astype('int64'),
+        'qtd_sugerida': qtd_sugerida,
+    })
+    return resultado.sort_values(['qtd_sugerida', 'dias_cobertura'], ascending=[False, True]).reset_index(drop=True)
+
+
+def executar_previsao(supabase_client: Client, config: dict) -> pd.DataFrame:
+    hoje = datetime.now(BRASILIA_TZ).date()
+    # Desde a meia-noite do primeiro dia da janela, para ele também entrar completo
+    desde = BRASILIA_TZ.localize(datetime.combine(hoje - timedelta(days=int(config["janela_historico_dias"])), datetime.min.time()))
+    df_produtos = carregar_produtos(supabase_client)
+    df_saidas = carregar_saidas(supabase_client, desde)
+    return calcular_sugestoes(df_produtos, df_saidas, config, hoje)
+
+
+# --- JOB AGENDADO ---
+
+class AgendadorPrevisao:
+    """Recalcula as sugestões em uma thread de fundo e guarda o último resultado."""
+    def __init__(self, supabase_client: Client, config: dict):
+        self.supabase = supabase_client
+        self.config = config
+        self.resultado = pd.DataFrame()
+        self.calculado_em = None
+        self.duracao_segundos = None
+        self.ultimo_erro = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="previsao-demanda", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def solicitar_recalculo(self):
+        """Antecipa a próxima execução do job."""
+        self._acordar.set()
+
+    def executar_agora(self):
+        inicio = time.perf_counter()
+        try:
+            resultado = executar_previsao(self.supabase, self.config)
+        except Exception as e:
+            logger.exception("Falha no cálculo da previsão de demanda.")
+            with self._lock:
+                self.ultimo_erro = str(e)
+            return
+        with self._lock:
+            self.resultado = resultado
+            self.calculado_em = datetime.now(BRASILIA_TZ)
+            self.duracao_segundos = time.perf_counter() - inicio
+            self.ultimo_erro = None
+
+    def _loop(self):
+        intervalo = float(self.config["intervalo_horas"]) * 3600
+        while True:
+            self.executar_agora()
+            self._acordar.wait(timeout=intervalo)
+            self._acordar.clear()
+
+    def obter(self):
+        with self._lock:
+            return self.resultado, self.calculado_em, self.duracao_segundos, self.ultimo_erro
+
+
+@st.cache_resource(hash_funcs={Client: supabase_client_hash_func})
+def get_agendador_previsao(supabase_client: Client) -> AgendadorPrevisao:
+    """Agendador único por processo; a primeira chamada dispara o cálculo inicial."""
+    agendador = AgendadorPrevisao(supabase_client, get_previsao_config())
+    agendador.iniciar()
+    return agendador
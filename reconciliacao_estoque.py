@@ -0,0 +1,168 @@
+# reconciliacao_estoque.py
+"""
+Reconciliação entre o histórico de movimentações e produtos.estoque_atual.
+
+O estoque só bate com o histórico quando toda alteração passa por atualizar_estoque; importações
+antigas de CSV gravavam estoque_atual direto e não deixavam movimentação. Este job percorre
+'movimentacoes' em páginas (paginação por id, sem OFFSET), soma o saldo líquido por produto
+(ENTRADA +, SAÍDA −) com group-bys vetorizados e compara com estoque_atual. A memória fica limitada
+a uma página mais um total por produto, mesmo com milhões de movimentações.
+
+Opcionalmente grava movimentações corretivas (origem = 'RECONCILIACAO') em lotes, para que o
+histórico volte a explicar o estoque atual. Os ajustes não alteram estoque_atual nem estoque_locais.
+"""
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+ORIGEM_RECONCILIACAO = 'RECONCILIACAO'
+TAMANHO_PAGINA = 1000   # limite padrão de linhas por requisição do PostgREST no Supabase
+TAMANHO_LOTE_CORRECOES = 500
+TAMANHO_LOTE_IDS = 200  # produtos por filtro 'in' na confirmação (mantém a URL curta)
+
+COLUNAS_DIVERGENCIAS = ['produto_id', 'nome', 'estoque_atual', 'saldo_movimentacoes', 'divergencia']
+
+
+# --- LEITURA EM PÁGINAS ---
+
+def ultimo_id_movimentacao(supabase_client: Client) -> int:
+    dados = supabase_client.table('movimentacoes').select('id').order('id', desc=True).limit(1).execute().data
+    return dados[0]['id'] if dados else 0
+
+
+def iterar_movimentacoes(supabase_client: Client, ate_id: int, produto_ids: list = None, page_size: int = TAMANHO_PAGINA):
+    """Gera páginas (DataFrames) de movimentações com id <= ate_id, em ordem de id."""
+    ultimo_id = 0
+    while True:
+        consulta = supabase_client.table('movimentacoes').select(
+            'id, produto_id, tipo_movimentacao, quantidade'
+        ).gt('id', ultimo_id).lte('id', ate_id)
+        if produto_ids is not None:
+            consulta = consulta.in_('produto_id', produto_ids)
+        batch = consulta.order('id').limit(page_size).execute().data
+        if not batch: break
+        ultimo_id = batch[-1]['id']
+        yield pd.DataFrame(batch)
+        if len(batch) < page_size: break
+
+
+def saldo_por_produto(paginas) -> pd.Series:
+    """Soma o saldo líquido (ENTRADA +, SAÍDA −) por produto, página a página."""
+    total = pd.Series(dtype='int64')
+    for df in paginas:
+        sinal = np.where(df['tipo_movimentacao'].to_numpy() == 'ENTRADA', 1, -1)
+        quantidades = pd.to_numeric(df['quantidade'], errors='coerce').fillna(0).to_numpy(dtype='int64')
+        parcial = pd.Series(quantidades * sinal).groupby(df['produto_id'].to_numpy()).sum()
+        total = total.add(parcial, fill_value=0)
+    return total.astype('int64')
+
+
+def carregar_estoque_atual(supabase_client: Client, produto_ids: list = None, page_size: int = TAMANHO_PAGINA) -> pd.DataFrame:
+    """Busca id, nome e estoque_atual de todos os produtos (ou só dos informados), paginando por id."""
+    partes = []
+    ultimo_id = 0
+    while True:
+        consulta = supabase_client.table('produtos').select('id, nome, estoque_atual').gt('id', ultimo_id)
+        if produto_ids is not None:
+            consulta = consulta.in_('id', produto_ids)
+        batch = consulta.order('id').limit(page_size).execute().data
+        if not batch: break
+        ultimo_id = batch[-1]['id']
+        partes.append(pd.DataFrame(batch))
+        if len(batch) < page_size: break
+    if not partes:
+        return pd.DataFrame(columns=['id', 'nome', 'estoque_atual'])
+    df = pd.concat(partes, ignore_index=True)
+    df['estoque_atual'] = pd.to_numeric(df['estoque_atual'], errors='coerce').fillna(0).astype('int64')
+    return df
+
+
+# --- COMPARAÇÃO ---
+
+def calcular_divergencias(df_produtos: pd.DataFrame, saldo: pd.Series) -> pd.DataFrame:
+    """Produtos cujo estoque_atual difere do saldo das movimentações (divergencia = estoque − saldo)."""
+    df = df_produtos.rename(columns={'id': 'produto_id'})
+    df['saldo_movimentacoes'] = df['produto_id'].map(saldo).fillna(0).astype('int64')
+    df['divergencia'] = df['estoque_atual'] - df['saldo_movimentacoes']
+    df = df[df['divergencia'] != 0]
+    return df.reindex(df['divergencia'].abs().sort_values(ascending=False).index)[COLUNAS_DIVERGENCIAS].reset_index(drop=True)
+
+
+def reconciliar(supabase_client: Client, page_size: int = TAMANHO_PAGINA, produto_ids: list = None):
+    """Executa a comparação completa. Retorna (divergências, estatísticas da execução)."""
+    inicio = time.perf_counter()
+    # Corte fixo: movimentações gravadas durante o job ficam de fora (e são revistas na confirmação)
+    ate_id = ultimo_id_movimentacao(supabase_client)
+    df_produtos = carregar_estoque_atual(supabase_client, produto_ids, page_size)
+    estatisticas = {'movimentacoes': 0, 'paginas': 0}
+
+    def contar(paginas):
+        for df in paginas:
+            estatisticas['movimentacoes'] += len(df)
+            estatisticas['paginas'] += 1
+            yield df
+
+    saldo = saldo_por_produto(contar(iterar_movimentacoes(supabase_client, ate_id, produto_ids, page_size)))
+    divergencias = calcular_divergencias(df_produtos, saldo)
+    estatisticas.update({
+        'ate_id': ate_id, 'produtos': len(df_produtos), 'divergentes': len(divergencias),
+        'divergencia_absoluta': int(divergencias['divergencia'].abs().sum()),
+        'duracao_s': round(time.perf_counter() - inicio, 2),
+    })
+    return divergencias, estatisticas
+
+
+def confirmar_divergencias(supabase_client: Client, divergencias: pd.DataFrame, page_size: int = TAMANHO_PAGINA) -> pd.DataFrame:
+    """Recalcula só os produtos divergentes e mantém os que deram a mesma divergência nas duas passagens.
+
+    Vendas feitas durante a primeira passagem podem criar divergências transitórias; corrigir essas
+    criaria um erro real.
+    """
+    confirmadas = []
+    ids = divergencias['produto_id'].tolist()
+    for i in range(0, len(ids), TAMANHO_LOTE_IDS):
+        lote, _ = reconciliar(supabase_client, page_size, ids[i:i + TAMANHO_LOTE_IDS])
+        confirmadas.append(lote)
+    if not confirmadas:
+        return divergencias.iloc[0:0]
+    df_novo = pd.concat(confirmadas, ignore_index=True)
+    df = divergencias.merge(df_novo[['produto_id', 'divergencia']], on='produto_id', suffixes=('', '_confirmacao'))
+    return df[df['divergencia'] == df['divergencia_confirmacao']][COLUNAS_DIVERGENCIAS].reset_index(drop=True)
+
+
+# --- CORREÇÃO ---
+
+def local_padrao(supabase_client: Client):
+    dados = supabase_client.table('locais').select('id').order('id').limit(1).execute().data
+    return dados[0]['id'] if dados else None
+
+
+def aplicar_correcoes(supabase_client: Client, divergencias: pd.DataFrame, local_id: int = None,
+                      tamanho_lote: int = TAMANHO_LOTE_CORRECOES) -> int:
+    """Grava uma movimentação corretiva por produto divergente, em lotes. Retorna quantas foram gravadas."""
+    if divergencias.empty:
+        return 0
+    if local_id is None:
+        local_id = local_padrao(supabase_client)
+    registros = [
+        {
+            'produto_id': int(produto_id),
+            'tipo_movimentacao': 'ENTRADA' if divergencia > 0 else 'SAÍDA',
+            'quantidade': abs(int(divergencia)),
+            'local_id': local_id,
+            'origem': ORIGEM_RECONCILIACAO,
+        }
+        for produto_id, divergencia in zip(divergencias['produto_id'], divergencias['divergencia'])
+    ]
+    gravadas = 0
+    for i in range(0, len(registros), tamanho_lote):
+        lote = registros[i:i + tamanho_lote]
+        supabase_client.table('movimentacoes').insert(lote).execute()
+        gravadas += len(lote)
+        logger.info("Reconciliação: %d/%d correções gravadas", gravadas, len(registros))
+    return gravadas
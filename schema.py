@@ -0,0 +1,93 @@
+# schema.py
+"""
+Projeções de colunas por tela e conversão dos resultados do Supabase para tipos compactos.
+
+Os DataFrames ficam em cache em todas as sessões, então cada coluna repetida conta:
+'tipo' e 'status' viram categorias, estoques viram int32 e valores em dinheiro
+são arredondados para centavos com Decimal (ROUND_HALF_UP), sem erros de ponto flutuante.
+"""
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+
+# --- PROJEÇÕES DE COLUNAS POR TELA ---
+COLUNAS_PRODUTOS_DASHBOARD = 'id, nome, tipo, status, estoque_atual, qtd_minima_estoque, preco_venda, preco_compra'
+COLUNAS_PRODUTOS_GESTAO = 'id, nome, tipo, status, codigo_barras, foto_url, estoque_atual, qtd_minima_estoque, preco_venda, preco_compra'
+COLUNAS_PRODUTOS_RELATORIOS = 'nome, tipo, estoque_atual, qtd_minima_estoque, preco_venda, preco_compra'
+COLUNAS_PRODUTOS_LISTA = 'id, nome, codigo_barras'
+COLUNAS_MOVIMENTACOES = 'data_movimentacao, tipo_movimentacao, quantidade, local_id, origem, produtos(nome), locais(nome)'
+
+# Partição de estoque de um local: saldo do local + dados do produto embutidos
+COLUNAS_ESTOQUE_LOCAL_PDV = 'quantidade, produtos!inner(id, nome, preco_venda, tipo, foto_url, codigo_barras)'
+COLUNAS_ESTOQUE_LOCAL_RELATORIOS = 'quantidade, produtos!inner(nome, tipo, qtd_minima_estoque, preco_venda, preco_compra)'
+
+# --- TIPOS COMPACTOS ---
+COLUNAS_CATEGORICAS = ['tipo', 'status', 'tipo_movimentacao', 'produto_nome', 'local_nome']
+COLUNAS_INTEIRAS = ['estoque_atual', 'qtd_minima_estoque', 'quantidade']
+COLUNAS_DINHEIRO = ['preco_venda', 'preco_compra']
+
+CENTAVO = Decimal('0.01')
+
+# Memória de cada dataset em cache, antes e depois da conversão
+_memoria_datasets = {}
+_memoria_lock = threading.Lock()
+
+
+def memoria_bytes(df: pd.DataFrame) -> int:
+    """Memória real ocupada pelo DataFrame, incluindo o conteúdo das strings."""
+    return int(df.memory_usage(deep=True).sum()) if not df.empty else 0
+
+
+def _para_centavos(valor) -> float:
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return 0.0
+    return float(Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP))
+
+
+def normalizar_dinheiro(serie: pd.Series) -> pd.Series:
+    """Arredonda para centavos via Decimal. Converte apenas os valores distintos (poucos preços, muitas linhas)."""
+    distintos = {valor: _para_centavos(valor) for valor in serie.dropna().unique()}
+    return serie.map(distintos).fillna(0.0).astype('float64')
+
+
+def total_em_reais(serie: pd.Series) -> float:
+    """Soma valores monetários em centavos inteiros, evitando acúmulo de erro de ponto flutuante."""
+    centavos = (serie.fillna(0) * 100).round().astype('int64')
+    return int(centavos.sum()) / 100
+
+
+def tipar_dataframe(df: pd.DataFrame, nome_dataset: str = None) -> pd.DataFrame:
+    """Converte as colunas conhecidas para tipos compactos e registra a memória economizada."""
+    if df.empty:
+        return df
+    antes = memoria_bytes(df)
+    df = df.copy()
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+    for coluna in COLUNAS_INTEIRAS:
+        if coluna in df.columns:
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').fillna(0).astype('int32')
+    for coluna in COLUNAS_DINHEIRO:
+        if coluna in df.columns:
+            df[coluna] = normalizar_dinheiro(df[coluna])
+    if nome_dataset:
+        registrar_memoria(nome_dataset, antes, memoria_bytes(df), len(df))
+    return df
+
+
+def registrar_memoria(nome_dataset: str, antes: int, depois: int, linhas: int):
+    with _memoria_lock:
+        _memoria_datasets[nome_dataset] = {'linhas': linhas, 'antes_bytes': antes, 'depois_bytes': depois}
+
+
+def relatorio_memoria() -> pd.DataFrame:
+    """Tabela com a memória de cada dataset em cache antes e depois da tipagem compacta."""
+    with _memoria_lock:
+        dados = [{'dataset': nome, **valores} for nome, valores in _memoria_datasets.items()]
+    if not dados:
+        return pd.DataFrame(columns=['dataset', 'linhas', 'antes_bytes', 'depois_bytes', 'reducao'])
+    df = pd.DataFrame(dados)
+    df['reducao'] = 1 - df['depois_bytes'] / df['antes_bytes'].where(df['antes_bytes'] > 0)
+    return df.sort_values('dataset')
@@ -0,0 +1,48 @@
+# scripts/app_carga.py
+"""
+Ponto de entrada do app para testes de carga: executa o dashboard.py contra o backend falso.
+
+Não é usado em produção. O scripts/teste_carga.py inicia este arquivo com `streamlit run`
+e conduz as sessões pelo WebSocket. Dois controles vêm da query string de cada execução:
+  - pagina=PDV     substitui o option_menu (componente de frontend que um cliente headless não clica)
+  - codigo=789...  entrega um código ao PDV como se o leitor de câmera o tivesse decodificado
+
+Argumentos (depois de `--`): --produtos N --locais N --latencia-ms X
+"""
+import argparse
+import os
+import runpy
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import streamlit as st
+import streamlit_option_menu
+
+import utils
+from backend_falso import BancoFalso, ClienteFalso
+
+
+@st.cache_resource
+def _cliente_falso():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--produtos", type=int, default=1000)
+    parser.add_argument("--locais", type=int, default=2)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    args, _ = parser.parse_known_args()
+    banco = BancoFalso(num_produtos=args.produtos, num_locais=args.locais, latencia_ms=args.latencia_ms)
+    return ClienteFalso(banco, criar_usuarios=True)
+
+
+utils.init_connection = _cliente_falso
+streamlit_option_menu.option_menu = lambda *args, **kwargs: st.query_params.get('pagina', kwargs['options'][0])
+
+codigo_lido = st.query_params.get('codigo')
+if codigo_lido:
+    st.session_state.barcode_result = codigo_lido
+    # Remove da URL para um st.rerun() posterior não reaplicar a mesma leitura
+    del st.query_params['codigo']
+
+runpy.run_path(os.path.join(RAIZ, 'dashboard.py'), run_name='__main__')
@@ -0,0 +1,424 @@
+# scripts/backend_falso.py
+"""
+Backend Supabase em memória para testes de carga e execuções locais, sem rede.
+
+Implementa o subconjunto da API usado pelo app: table().select()/insert()/update()/upsert()
+com filtros eq/gte/lte/in_, order, range, limit e single; recursos embutidos no select
+(ex.: 'produtos(nome)' ou 'produtos!inner(id, nome)'); rpc() para as funções de estoque;
+auth.sign_in_with_password; e storage com URLs públicas fictícias.
+"""
+import itertools
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from supabase import Client
+
+# Chave estrangeira usada por cada recurso embutido
+CHAVES_EMBUTIDAS = {'produtos': 'produto_id', 'locais': 'local_id'}
+
+
+class Resposta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _separar_colunas(select: str) -> list:
+    """Divide 'a, b, rel(x, y)' respeitando parênteses."""
+    partes, nivel, atual = [], 0, ''
+    for c in select:
+        if c == ',' and nivel == 0:
+            partes.append(atual.strip()); atual = ''
+            continue
+        nivel += (c == '(') - (c == ')')
+        atual += c
+    if atual.strip():
+        partes.append(atual.strip())
+    return partes
+
+
+class ConsultaFalsa:
+    def __init__(self, banco: 'BancoFalso', tabela: str):
+        self.banco = banco
+        self.tabela = tabela
+        self.operacao = 'select'
+        self.colunas = '*'
+        self.filtros = []
+        self.ordem = []
+        self.intervalo = None
+        self.limite = None
+        self.unico = False
+        self.payload = None
+        self.on_conflict = 'id'
+
+    # --- CONSTRUÇÃO ---
+    def select(self, colunas='*', count=None):
+        self.colunas = colunas
+        return self
+
+    def insert(self, payload):
+        self.operacao, self.payload = 'insert', payload
+        return self
+
+    def update(self, payload):
+        self.operacao, self.payload = 'update', payload
+        return self
+
+    def upsert(self, payload, on_conflict='id'):
+        self.operacao, self.payload, self.on_conflict = 'upsert', payload, on_conflict
+        return self
+
+    def eq(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v == x)); return self
+
+    def neq(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v != x)); return self
+
+    def gte(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v is not None and v >= x)); return self
+
+    def gt(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v is not None and v > x)); return self
+
+    def lte(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v is not None and v <= x)); return self
+
+    def lt(self, coluna, valor):
+        self.filtros.append((coluna, lambda v, x=valor: v is not None and v < x)); return self
+
+    def is_(self, coluna, valor):
+        esperado = None if valor in (None, 'null') else valor
+        self.filtros.append((coluna, lambda v, x=esperado: v is x)); return self
+
+    def in_(self, coluna, valores):
+        conjunto = set(valores)
+        self.filtros.append((coluna, lambda v: v in conjunto)); return self
+
+    def order(self, coluna, desc=False):
+        self.ordem.append((coluna, desc)); return self
+
+    def range(self, inicio, fim):
+        self.intervalo = (inicio, fim); return self
+
+    def limit(self, n):
+        self.limite = n; return self
+
+    def single(self):
+        self.unico = True; return self
+
+    # --- EXECUÇÃO ---
+    def _embutir(self, linha: dict) -> dict:
+        resultado = {}
+        for parte in _separar_colunas(self.colunas):
+            m = re.match(r'^(\w+)(!inner)?\((.*)\)$', parte)
+            if m:
+                recurso, _, subcolunas = m.groups()
+                alvo = self.banco.por_id(recurso, linha.get(CHAVES_EMBUTIDAS.get(recurso)))
+                if alvo is None:
+                    resultado[recurso] = None
+                else:
+                    cols = [c.strip() for c in subcolunas.split(',')]
+                    resultado[recurso] = dict(alvo) if cols == ['*'] else {c: alvo.get(c) for c in cols}
+            elif parte == '*':
+                resultado.update(linha)
+            else:
+                resultado[parte] = linha.get(parte)
+        return resultado
+
+    def _passa_filtros(self, linha: dict) -> bool:
+        for coluna, teste in self.filtros:
+            if '.' in coluna:
+                recurso, campo = coluna.split('.', 1)
+                alvo = self.banco.por_id(recurso, linha.get(CHAVES_EMBUTIDAS.get(recurso)))
+                if alvo is None or not teste(alvo.get(campo)):
+                    return False
+            elif not teste(linha.get(coluna)):
+                return False
+        return True
+
+    def execute(self):
+        self.banco.latencia()
+        with self.banco.lock:
+            linhas = self.banco.tabelas.setdefault(self.tabela, [])
+            if self.operacao == 'insert':
+                return Resposta(self.banco.inserir(self.tabela, self.payload))
+            if self.operacao == 'upsert':
+                return Resposta(self.banco.upsert(self.tabela, self.payload, self.on_conflict))
+            selecionadas = [l for l in linhas if self._passa_filtros(l)]
+            if self.operacao == 'update':
+                for linha in selecionadas:
+                    linha.update(self.payload)
+                return Resposta([dict(l) for l in selecionadas])
+            for coluna, desc in reversed(self.ordem):
+                selecionadas.sort(key=lambda l: (l.get(coluna) is None, l.get(coluna)), reverse=desc)
+            if self.intervalo:
+                selecionadas = selecionadas[self.intervalo[0]:self.intervalo[1] + 1]
+            if self.limite is not None:
+                selecionadas = selecionadas[:self.limite]
+            dados = [self._embutir(l) for l in selecionadas]
+        if self.unico:
+            return Resposta(dados[0] if dados else None)
+        return Resposta(dados)
+
+
+class RpcFalsa:
+    def __init__(self, banco: 'BancoFalso', nome: str, params: dict):
+        self.banco, self.nome, self.params = banco, nome, params or {}
+
+    def execute(self):
+        self.banco.latencia()
+        funcao = getattr(self.banco, f"rpc_{self.nome}", None)
+        if funcao is None:
+            raise RuntimeError(f"RPC '{self.nome}' não existe no backend falso.")
+        with self.banco.lock:
+            return Resposta(funcao(**self.params))
+
+
+class BancoFalso:
+    """Tabelas em memória com dados sintéticos de produtos, locais, estoque e movimentações."""
+    def __init__(self, num_produtos: int = 500, num_locais: int = 2, num_movimentacoes: int = 2000,
+                 latencia_ms: float = 0.0, semente: int = 42):
+        self.lock = threading.RLock()
+        self.latencia_ms = latencia_ms
+        self.tabelas = {}
+        self._ids = {}
+        rnd = random.Random(semente)
+        categorias = ['Bebidas', 'Lanches', 'Doces', 'Mercearia', 'Limpeza', 'Higiene']
+        self.tabelas['locais'] = [
+            {'id': i + 1, 'nome': 'Depósito' if i == num_locais - 1 and num_locais > 1 else f"Loja {i + 1}",
+             'tipo': 'Depósito' if i == num_locais - 1 and num_locais > 1 else 'Loja', 'ativo': True}
+            for i in range(num_locais)
+        ]
+        produtos = []
+        for i in range(1, num_produtos + 1):
+            compra = round(rnd.uniform(1, 50), 2)
+            produtos.append({
+                'id': i, 'nome': f"Produto {i:05d}", 'tipo': rnd.choice(categorias), 'status': 'Ativo',
+                'codigo_barras': f"789{i:010d}", 'foto_url': None,
+                'preco_compra': compra, 'preco_venda': round(compra * rnd.uniform(1.2, 2.0), 2),
+                'qtd_minima_estoque': rnd.randint(0, 10), 'estoque_atual': 0,
+            })
+        self.tabelas['produtos'] = produtos
+        self.tabelas['estoque_locais'] = []
+        for p in produtos:
+            for local in self.tabelas['locais']:
+                qtd = rnd.randint(0, 200)
+                self.tabelas['estoque_locais'].append({'produto_id': p['id'], 'local_id': local['id'], 'quantidade': qtd})
+                p['estoque_atual'] += qtd
+        agora = datetime.now(timezone.utc)
+        self.tabelas['movimentacoes'] = [
+            {'id': i + 1, 'produto_id': rnd.randint(1, num_produtos), 'local_id': rnd.randint(1, num_locais),
+             'tipo_movimentacao': rnd.choice(['ENTRADA', 'SAÍDA', 'SAÍDA']), 'quantidade': rnd.randint(1, 5),
+             'forma_pagamento': None, 'data_movimentacao': (agora - timedelta(minutes=15 * i)).isoformat()}
+            for i in range(num_movimentacoes)
+        ]
+        self.tabelas['perfis'] = []
+        self.usuarios = {}
+        self._indices = {}
+        self._reindexar()
+
+    def latencia(self):
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+
+    def _reindexar(self):
+        self._indices = {
+            nome: {linha['id']: linha for linha in linhas if 'id' in linha}
+            for nome, linhas in self.tabelas.items()
+        }
+        for nome, linhas in self.tabelas.items():
+            self._ids[nome] = itertools.count(max((l.get('id', 0) for l in linhas), default=0) + 1)
+
+    def por_id(self, tabela: str, id_):
+        return self._indices.get(tabela, {}).get(id_)
+
+    def inserir(self, tabela: str, payload):
+        registros = payload if isinstance(payload, list) else [payload]
+        inseridos = []
+        for registro in registros:
+            linha = dict(registro)
+            if tabela != 'estoque_locais' and linha.get('id') is None:
+                linha['id'] = next(self._ids.setdefault(tabela, itertools.count(1)))
+            if tabela == 'movimentacoes':
+                linha.setdefault('data_movimentacao', datetime.now(timezone.utc).isoformat())
+            self.tabelas.setdefault(tabela, []).append(linha)
+            if 'id' in linha:
+                self._indices.setdefault(tabela, {})[linha['id']] = linha
+            inseridos.append(dict(linha))
+        return inseridos
+
+    def upsert(self, tabela: str, payload, on_conflict: str = 'id'):
+        registros = payload if isinstance(payload, list) else [payload]
+        chaves = [c.strip() for c in on_conflict.split(',')]
+        resultado = []
+        for registro in registros:
+            existente = next((l for l in self.tabelas.get(tabela, [])
+                              if all(l.get(c) == registro.get(c) for c in chaves) and registro.get(chaves[0]) is not None), None)
+            if existente:
+                existente.update(registro)
+                resultado.append(dict(existente))
+            else:
+                resultado.extend(self.inserir(tabela, registro))
+        return resultado
+
+    def usuario(self, email: str, cargo: str = 'Operador'):
+        """Cria (ou retorna) um usuário ativo para login."""
+        if email not in self.usuarios:
+            user_id = f"user-{len(self.usuarios) + 1}"
+            self.usuarios[email] = SimpleNamespace(id=user_id, email=email, user_metadata={'nome_completo': email.split('@')[0]})
+            self.tabelas['perfis'].append({'id': user_id, 'email': email, 'cargo': cargo, 'status': 'Ativo', 'nome_completo': email.split('@')[0]})
+            self._indices.setdefault('perfis', {})[user_id] = self.tabelas['perfis'][-1]
+        return self.usuarios[email]
+
+    # --- RPCs ---
+    def _saldo_local(self, produto_id, local_id) -> dict:
+        for linha in self.tabelas['estoque_locais']:
+            if linha['produto_id'] == produto_id and linha['local_id'] == local_id:
+                return linha
+        linha = {'produto_id': produto_id, 'local_id': local_id, 'quantidade': 0}
+        self.tabelas['estoque_locais'].append(linha)
+        return linha
+
+    def rpc_atualizar_estoque(self, p_produto_id, p_quantidade_movimentada, p_tipo_mov,
+                              p_forma_pagamento=None, p_local_id=None):
+        local_id = p_local_id or min(l['id'] for l in self.tabelas['locais'])
+        if p_tipo_mov not in ('ENTRADA', 'SAÍDA'):
+            return f"Tipo de movimentação inválido: {p_tipo_mov}."
+        delta = p_quantidade_movimentada if p_tipo_mov == 'ENTRADA' else -p_quantidade_movimentada
+        saldo = self._saldo_local(p_produto_id, local_id)
+        if saldo['quantidade'] + delta < 0:
+            return f"Estoque insuficiente neste local (disponível: {saldo['quantidade']})."
+        saldo['quantidade'] += delta
+        self.por_id('produtos', p_produto_id)['estoque_atual'] += delta
+        self.inserir('movimentacoes', {
+            'produto_id': p_produto_id, 'local_id': local_id, 'tipo_movimentacao': p_tipo_mov,
+            'quantidade': p_quantidade_movimentada, 'forma_pagamento': p_forma_pagamento,
+        })
+        return 'Sucesso'
+
+    def rpc_ajustar_estoque_total(self, p_produto_id, p_estoque_alvo, p_local_id):
+        if p_estoque_alvo is None or p_estoque_alvo < 0:
+            return 'O estoque informado deve ser zero ou maior.'
+        produto = self.por_id('produtos', p_produto_id)
+        if produto is None:
+            return 'Produto não encontrado.'
+        delta = p_estoque_alvo - produto['estoque_atual']
+        if delta == 0:
+            return 'Sem alteração'
+        return self.rpc_atualizar_estoque(p_produto_id, abs(delta), 'ENTRADA' if delta > 0 else 'SAÍDA', None, p_local_id)
+
+    def rpc_registrar_recebimento(self, p_local_id, p_itens, p_documento=None):
+        if not p_itens:
+            return 'Nenhum item para receber.'
+        quantidades = {}
+        for item in p_itens:
+            quantidades[item['produto_id']] = quantidades.get(item['produto_id'], 0) + item['quantidade']
+        if any(q <= 0 for q in quantidades.values()):
+            return 'Todas as linhas precisam de produto e quantidade maior que zero.'
+        invalidos = [str(pid) for pid in quantidades if self.por_id('produtos', pid) is None]
+        if invalidos:
+            return f"Produtos não encontrados: {', '.join(invalidos)}."
+        recebimento = self.inserir('recebimentos', {
+            'local_id': p_local_id, 'documento': p_documento,
+            'total_itens': len(quantidades), 'total_unidades': sum(quantidades.values()),
+        })[0]
+        for produto_id, quantidade in sorted(quantidades.items()):
+            self._saldo_local(produto_id, p_local_id)['quantidade'] += quantidade
+            self.por_id('produtos', produto_id)['estoque_atual'] += quantidade
+            self.inserir('movimentacoes', {
+                'produto_id': produto_id, 'local_id': p_local_id, 'tipo_movimentacao': 'ENTRADA',
+                'quantidade': quantidade, 'forma_pagamento': None, 'recebimento_id': recebimento['id'],
+            })
+        return 'Sucesso'
+
+    def rpc_atualizar_produtos_em_lote(self, p_itens):
+        if not p_itens:
+            return 'Nenhum produto para atualizar.'
+        invalidos = [str(item['id']) for item in p_itens if self.por_id('produtos', item['id']) is None]
+        if invalidos:
+            return f"Produtos não encontrados: {', '.join(invalidos)}."
+        for item in p_itens:
+            produto = self.por_id('produtos', item['id'])
+            if item.get('preco_venda') is not None:
+                produto['preco_venda'] = round(item['preco_venda'], 2)
+            if item.get('tipo'):
+                produto['tipo'] = item['tipo']
+        return 'Sucesso'
+
+    def rpc_get_all_user_profiles(self):
+        return [dict(p) for p in self.tabelas['perfis']]
+
+
+class AuthFalsa:
+    def __init__(self, banco: BancoFalso, criar_usuarios: bool = False):
+        self.banco = banco
+        # Em testes de carga qualquer e-mail entra como operador ativo
+        self.criar_usuarios = criar_usuarios
+
+    def sign_in_with_password(self, credenciais: dict):
+        self.banco.latencia()
+        with self.banco.lock:
+            if self.criar_usuarios:
+                self.banco.usuario(credenciais.get('email'))
+            usuario = self.banco.usuarios.get(credenciais.get('email'))
+        if usuario is None:
+            raise RuntimeError("Invalid login credentials")
+        return self._resposta(usuario)
+
+    def refresh_session(self, refresh_token: str):
+        self.banco.latencia()
+        usuario = next((u for u in self.banco.usuarios.values() if refresh_token == f"refresh-{u.id}"), None)
+        if usuario is None:
+            raise RuntimeError("Invalid Refresh Token")
+        return self._resposta(usuario)
+
+    @staticmethod
+    def _resposta(usuario):
+        return SimpleNamespace(user=usuario, session=SimpleNamespace(
+            access_token=f"token-{usuario.id}", refresh_token=f"refresh-{usuario.id}",
+            expires_at=int(time.time()) + 3600,
+        ))
+
+    def reset_password_for_email(self, email):
+        return None
+
+    def sign_up(self, dados):
+        return None
+
+
+class StorageFalso:
+    def from_(self, bucket):
+        return SimpleNamespace(
+            upload=lambda caminho, conteudo, file_options=None: None,
+            get_public_url=lambda caminho: f"https://storage.local/{bucket}/{caminho}",
+        )
+
+
+class ClienteFalso(Client):
+    """Cliente compatível com supabase.Client (passa nas verificações isinstance do app)."""
+    def __init__(self, banco: BancoFalso = None, criar_usuarios: bool = False):
+        # Não chama Client.__init__: nenhuma conexão é aberta
+        self.banco = banco or BancoFalso()
+        self.auth = AuthFalsa(self.banco, criar_usuarios)
+        self._storage_falso = StorageFalso()
+
+    @property
+    def storage(self):
+        return self._storage_falso
+
+    def table(self, nome: str):
+        return ConsultaFalsa(self.banco, nome)
+
+    from_ = table
+
+    def rpc(self, nome: str, params: dict = None, **kwargs):
+        return RpcFalsa(self.banco, nome, params)
+
+    def __reduce__(self):
+        # Os hash_funcs do app valem só para o tipo exato supabase.Client; para subclasses o
+        # st.cache_* recorre ao pickle. Identifica o cliente pelo id, como supabase_client_hash_func.
+        return (str, (f"ClienteFalso-{id(self)}",))
@@ -0,0 +1,65 @@
+# scripts/reconciliar_estoque.py
+"""
+Reconcilia produtos.estoque_atual com o histórico de movimentações (ver reconciliacao_estoque.py).
+
+Lê SUPABASE_URL e SUPABASE_KEY do ambiente ou de um arquivo .env. Sem --aplicar, só relata.
+
+Uso:
+    python scripts/reconciliar_estoque.py
+    python scripts/reconciliar_estoque.py --saida divergencias.csv
+    python scripts/reconciliar_estoque.py --aplicar --lote 500
+"""
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reconciliacao_estoque import (  # noqa: E402
+    TAMANHO_LOTE_CORRECOES, TAMANHO_PAGINA, aplicar_correcoes, confirmar_divergencias, reconciliar,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconciliação de estoque com o histórico de movimentações.")
+    parser.add_argument("--aplicar", action="store_true", help="grava movimentações corretivas para as divergências confirmadas")
+    parser.add_argument("--pagina", type=int, default=TAMANHO_PAGINA, help="linhas por página de leitura")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_CORRECOES, help="correções por lote de escrita")
+    parser.add_argument("--local-id", type=int, help="local das correções (padrão: o primeiro local)")
+    parser.add_argument("--saida", help="grava as divergências em CSV (separador ';')")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    load_dotenv()
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        sys.exit("Defina SUPABASE_URL e SUPABASE_KEY no ambiente ou no arquivo .env.")
+    supabase = create_client(url, key)
+
+    divergencias, estatisticas = reconciliar(supabase, args.pagina)
+    print(f"{estatisticas['movimentacoes']} movimentações em {estatisticas['paginas']} páginas (até o id {estatisticas['ate_id']}), "
+          f"{estatisticas['produtos']} produtos, {estatisticas['duracao_s']}s.")
+    if divergencias.empty:
+        print("✅ Estoque consistente com o histórico.")
+        return
+    print(f"⚠️ {estatisticas['divergentes']} produtos divergentes (diferença absoluta total: {estatisticas['divergencia_absoluta']}):")
+    print(divergencias.head(20).to_string(index=False))
+    if args.saida:
+        divergencias.to_csv(args.saida, sep=';', index=False)
+        print(f"Divergências gravadas em {args.saida}")
+
+    if args.aplicar:
+        confirmadas = confirmar_divergencias(supabase, divergencias, args.pagina)
+        descartadas = len(divergencias) - len(confirmadas)
+        if descartadas:
+            print(f"{descartadas} divergências mudaram entre as passagens (movimentações em andamento) e foram ignoradas.")
+        gravadas = aplicar_correcoes(supabase, confirmadas, args.local_id, args.lote)
+        print(f"✅ {gravadas} movimentações corretivas gravadas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# scripts/teste_carga.py
+"""
+Teste de carga com vários caixas simultâneos contra um servidor Streamlit real.
+
+Sobe `streamlit run scripts/app_carga.py` (o dashboard.py ligado ao backend falso em memória)
+e abre N sessões headless pelo WebSocket do Streamlit, falando o mesmo protocolo do navegador.
+Cada sessão faz login, abre o PDV, troca de categoria, alterna grelha/lista, lê códigos de
+barras, adiciona do catálogo, altera o carrinho e finaliza a venda. Para cada N são medidos
+vazão, percentis de latência por etapa e a memória (RSS) e CPU do processo do servidor.
+
+Requer os pacotes 'websockets' e 'psutil' (pip install websockets psutil).
+
+Uso:
+    python scripts/teste_carga.py --sessoes 1 5 10 20 --produtos 2000 --latencia-ms 5
+    python scripts/teste_carga.py --sessoes 10 --saida resultado.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+import psutil
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Radio_pb2 import Radio as RadioProto
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_CARGA = os.path.join(RAIZ, 'scripts', 'app_carga.py')
+
+ETAPAS = ['abrir', 'login', 'abrir_pdv', 'categoria', 'alternar_exibicao', 'codigo_barras',
+          'adicionar_catalogo', 'alterar_carrinho', 'pagamento', 'finalizar_venda']
+WIDGETS_RASTREADOS = {'button', 'text_input', 'radio', 'selectbox'}
+STATUS_FINAIS = {
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+    ForwardMsg.FINISHED_WITH_COMPILE_ERROR,
+}
+# A partir do campo 'raw_value' o rádio passou a ser serializado pelo rótulo, e não pelo índice
+RADIO_POR_ROTULO = 'raw_value' in RadioProto.DESCRIPTOR.fields_by_name
+
+
+# --- SERVIDOR ---
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ServidorStreamlit:
+    """Processo `streamlit run` do app de carga, com secrets falsos num diretório temporário."""
+    def __init__(self, args):
+        self.args = args
+        self.porta = porta_livre()
+        self.processo = None
+        self._dir = tempfile.TemporaryDirectory(prefix="sistoque_carga_")
+
+    def __enter__(self):
+        os.makedirs(os.path.join(self._dir.name, '.streamlit'))
+        with open(os.path.join(self._dir.name, '.streamlit', 'secrets.toml'), 'w') as f:
+            f.write('SUPABASE_URL = "http://backend-falso"\nSUPABASE_KEY = "chave-falsa"\n')
+        comando = [
+            sys.executable, '-m', 'streamlit', 'run', APP_CARGA,
+            '--server.headless', 'true', '--server.port', str(self.porta),
+            '--server.enableXsrfProtection', 'false', '--server.enableCORS', 'false',
+            '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false',
+            '--', '--produtos', str(self.args.produtos), '--locais', str(self.args.locais),
+            '--latencia-ms', str(self.args.latencia_ms),
+        ]
+        self.processo = subprocess.Popen(comando, cwd=self._dir.name, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        limite = time.time() + 60
+        while time.time() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"O servidor terminou na partida:\n{self.processo.stderr.read().decode()}")
+            try:
+                with socket.create_connection(('127.0.0.1', self.porta), timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        raise TimeoutError("O servidor Streamlit não respondeu em 60s.")
+
+    def __exit__(self, *exc):
+        self.processo.terminate()
+        try:
+            self.processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+        self._dir.cleanup()
+
+
+class AmostradorProcesso:
+    """Amostra RSS e CPU do processo do servidor em segundo plano."""
+    def __init__(self, pid: int, intervalo: float = 0.2):
+        self.processo = psutil.Process(pid)
+        self.intervalo = intervalo
+        self.rss_pico = 0
+        self.cpu_amostras = []
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        self.processo.cpu_percent(None)
+        while not self._parar.wait(self.intervalo):
+            self.rss_pico = max(self.rss_pico, self.processo.memory_info().rss)
+            self.cpu_amostras.append(self.processo.cpu_percent(None))
+
+    def __enter__(self):
+        self.rss_inicio = self.processo.memory_info().rss
+        self._cpu_inicio = self.processo.cpu_times()
+        self._inicio = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        duracao = time.perf_counter() - self._inicio
+        cpu_fim = self.processo.cpu_times()
+        cpu_segundos = (cpu_fim.user - self._cpu_inicio.user) + (cpu_fim.system - self._cpu_inicio.system)
+        self.rss_final = self.processo.memory_info().rss
+        self.rss_pico = max(self.rss_pico, self.rss_final)
+        self.cpu_medio = 100 * cpu_segundos / duracao if duracao else 0.0
+        self.cpu_pico = max(self.cpu_amostras, default=0.0)
+
+
+# --- CLIENTE HEADLESS ---
+
+class SessaoHeadless:
+    """Uma aba do navegador: mantém os widgets da tela e envia reexecuções como o frontend."""
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.widgets = {}
+        self.valores = {}
+        self.query = {}
+        self.erros_app = []
+
+    async def conectar(self):
+        self.ws = await websockets.connect(self.url, subprotocols=['streamlit'], max_size=None)
+
+    async def fechar(self):
+        if self.ws:
+            await self.ws.close()
+
+    def widget(self, rotulo: str = None, sufixo_chave: str = None, tipo: str = 'button') -> dict:
+        for w in self.widgets.values():
+            if w['tipo'] != tipo:
+                continue
+            if rotulo is not None and w['label'] == rotulo:
+                return w
+            if sufixo_chave is not None and w['id'].endswith(sufixo_chave):
+                return w
+        raise LookupError(f"{tipo} não encontrado: {rotulo or sufixo_chave}")
+
+    def widgets_com_chave(self, prefixo_chave: str) -> list:
+        return [w for w in self.widgets.values() if prefixo_chave in w['id'] and not w['disabled']]
+
+    async def executar(self, clique: dict = None, valores: dict = None, fragment_id: str = ''):
+        """Envia uma reexecução (completa ou de fragmento) e aguarda o fim do script."""
+        for widget_id, (campo, valor) in (valores or {}).items():
+            self.valores[widget_id] = (campo, valor)
+        msg = BackMsg()
+        estado = msg.rerun_script
+        estado.query_string = urlencode(self.query)
+        estado.fragment_id = fragment_id
+        for widget_id, (campo, valor) in self.valores.items():
+            ws_estado = estado.widget_states.widgets.add()
+            ws_estado.id = widget_id
+            setattr(ws_estado, campo, valor)
+        if clique:
+            ws_estado = estado.widget_states.widgets.add()
+            ws_estado.id = clique['id']
+            ws_estado.trigger_value = True
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._aguardar_fim(), timeout=self.timeout)
+
+    async def _aguardar_fim(self):
+        while True:
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(await self.ws.recv())
+            tipo = fmsg.WhichOneof('type')
+            if tipo == 'new_session':
+                # Nova execução completa: a tela será redesenhada do zero
+                self.widgets = {}
+            elif tipo == 'delta' and fmsg.delta.WhichOneof('type') == 'new_element':
+                elemento = fmsg.delta.new_element
+                tipo_elemento = elemento.WhichOneof('type')
+                if tipo_elemento in WIDGETS_RASTREADOS:
+                    proto = getattr(elemento, tipo_elemento)
+                    self.widgets[proto.id] = {
+                        'id': proto.id, 'tipo': tipo_elemento, 'label': proto.label,
+                        'fragment_id': fmsg.delta.fragment_id,
+                        'options': list(getattr(proto, 'options', [])),
+                        'disabled': getattr(proto, 'disabled', False),
+                    }
+                elif tipo_elemento == 'exception':
+                    self.erros_app.append(elemento.exception.message)
+            elif tipo == 'script_finished' and fmsg.script_finished in STATUS_FINAIS:
+                return
+
+
+async def executar_sessao(indice: int, url: str, args, latencias: dict, erros: list):
+    rnd = random.Random(indice)
+    sessao = SessaoHeadless(url, args.timeout)
+
+    async def medir(etapa: str, **kwargs):
+        inicio = time.perf_counter()
+        await sessao.executar(**kwargs)
+        latencias[etapa].append(time.perf_counter() - inicio)
+        if sessao.erros_app:
+            raise RuntimeError(f"{etapa}: {sessao.erros_app[-1]}")
+
+    def clique(widget: dict) -> dict:
+        return {'clique': widget, 'fragment_id': widget['fragment_id']}
+
+    try:
+        await sessao.conectar()
+        await medir('abrir')
+
+        email = sessao.widget('Email', tipo='text_input')
+        senha = sessao.widget('Senha', tipo='text_input')
+        await medir('login', clique=sessao.widget('Entrar'), valores={
+            email['id']: ('string_value', f"caixa{indice}@teste.local"), senha['id']: ('string_value', 'senha'),
+        })
+
+        sessao.query = {'pagina': 'PDV'}
+        await medir('abrir_pdv')
+
+        for _ in range(args.navegacoes):
+            radio = sessao.widget(sufixo_chave='pdv_categoria_radio', tipo='radio')
+            escolha = rnd.randrange(len(radio['options']))
+            valor = ('string_value', radio['options'][escolha]) if RADIO_POR_ROTULO else ('int_value', escolha)
+            await medir('categoria', valores={radio['id']: valor}, fragment_id=radio['fragment_id'])
+            await medir('alternar_exibicao', **clique(sessao.widget(rnd.choice(['🖼️ Grelha', '📜 Lista']))))
+
+        for _ in range(args.leituras):
+            # Simula o código entregue pelo leitor (a decodificação da câmera fica fora do teste)
+            sessao.query = {'pagina': 'PDV', 'codigo': f"789{rnd.randint(1, args.produtos):010d}"}
+            await medir('codigo_barras')
+        sessao.query = {'pagina': 'PDV'}
+
+        botoes_adicionar = sessao.widgets_com_chave('add_')
+        if botoes_adicionar:
+            await medir('adicionar_catalogo', **clique(rnd.choice(botoes_adicionar)))
+
+        for _ in range(args.alteracoes_carrinho):
+            botoes_carrinho = sessao.widgets_com_chave('inc_')
+            if botoes_carrinho:
+                await medir('alterar_carrinho', **clique(rnd.choice(botoes_carrinho)))
+
+        await medir('pagamento', **clique(sessao.widget('Prosseguir para Pagamento')))
+        await medir('finalizar_venda', **clique(sessao.widget('Confirmar Venda')))
+    except Exception as e:
+        erros.append(f"sessão {indice}: {type(e).__name__}: {e}")
+    finally:
+        await sessao.fechar()
+
+
+# --- RODADAS ---
+
+def percentis(valores: list) -> dict:
+    if not valores:
+        return {'n': 0, 'p50_ms': None, 'p90_ms': None, 'p99_ms': None}
+    arr = np.array(valores) * 1000
+    return {'n': len(valores), 'p50_ms': round(float(np.percentile(arr, 50)), 1),
+            'p90_ms': round(float(np.percentile(arr, 90)), 1), 'p99_ms': round(float(np.percentile(arr, 99)), 1)}
+
+
+async def _executar_sessoes(num_sessoes: int, url: str, args, latencias: dict, erros: list):
+    await asyncio.gather(*(executar_sessao(i, url, args, latencias, erros) for i in range(num_sessoes)))
+
+
+def executar_rodada(num_sessoes: int, args) -> dict:
+    latencias = {etapa: [] for etapa in ETAPAS}
+    erros = []
+    with ServidorStreamlit(args) as servidor:
+        url = f"ws://127.0.0.1:{servidor.porta}/_stcore/stream"
+        with AmostradorProcesso(servidor.processo.pid) as amostrador:
+            inicio = time.perf_counter()
+            asyncio.run(_executar_sessoes(num_sessoes, url, args, latencias, erros))
+            duracao = time.perf_counter() - inicio
+
+    todas = [x for v in latencias.values() for x in v]
+    return {
+        'sessoes': num_sessoes,
+        'duracao_s': round(duracao, 2),
+        'interacoes': len(todas),
+        'vazao_interacoes_s': round(len(todas) / duracao, 2) if duracao else 0.0,
+        'vendas_concluidas': len(latencias['finalizar_venda']),
+        'latencia_geral': percentis(todas),
+        'latencia_por_etapa': {etapa: percentis(v) for etapa, v in latencias.items()},
+        'rss_inicio_mb': round(amostrador.rss_inicio / 2**20, 1),
+        'rss_pico_mb': round(amostrador.rss_pico / 2**20, 1),
+        'cpu_medio_percentual': round(amostrador.cpu_medio, 1),
+        'cpu_pico_percentual': round(amostrador.cpu_pico, 1),
+        'erros': erros,
+    }
+
+
+def imprimir_resumo(resultados: list):
+    print(f"\n{'Sessões':>8} {'Vazão/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'CPU %':>7} {'Vendas':>7} {'Erros':>6}")
+    for r in resultados:
+        lat = r['latencia_geral']
+        print(f"{r['sessoes']:>8} {r['vazao_interacoes_s']:>9} {lat['p50_ms']!s:>8} {lat['p90_ms']!s:>8} {lat['p99_ms']!s:>8} "
+              f"{r['rss_pico_mb']:>8} {r['cpu_medio_percentual']:>7} {r['vendas_concluidas']:>7} {len(r['erros']):>6}")
+    ultimo = resultados[-1]
+    print(f"\nLatência por etapa com {ultimo['sessoes']} sessões (p50 / p99 ms):")
+    for etapa, lat in ultimo['latencia_por_etapa'].items():
+        print(f"  {etapa:<20} {lat['p50_ms']!s:>8} / {lat['p99_ms']!s:<8} (n={lat['n']})")
+    for r in resultados:
+        for erro in r['erros'][:5]:
+            print(f"  ⚠️ [{r['sessoes']} sessões] {erro}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do PDV com caixas simultâneos.")
+    parser.add_argument("--sessoes", type=int, nargs='+', default=[1, 5, 10], help="números de sessões simultâneas a testar")
+    parser.add_argument("--produtos", type=int, default=1000, help="tamanho do catálogo falso")
+    parser.add_argument("--locais", type=int, default=2)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="latência simulada por chamada ao backend")
+    parser.add_argument("--navegacoes", type=int, default=2, help="trocas de categoria/exibição por sessão")
+    parser.add_argument("--leituras", type=int, default=5, help="códigos de barras lidos por sessão")
+    parser.add_argument("--alteracoes-carrinho", type=int, default=3, help="cliques de quantidade no carrinho por sessão")
+    parser.add_argument("--timeout", type=float, default=120.0, help="tempo máximo de espera por execução do script")
+    parser.add_argument("--saida", help="grava os resultados completos em JSON")
+    args = parser.parse_args()
+
+    resultados = []
+    for num_sessoes in args.sessoes:
+        print(f"Executando {num_sessoes} sessões simultâneas...", flush=True)
+        resultados.append(executar_rodada(num_sessoes, args))
+    imprimir_resumo(resultados)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
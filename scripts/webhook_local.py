@@ -0,0 +1,40 @@
+# scripts/webhook_local.py
+"""
+Receptor local de webhooks para testar os alertas de estoque baixo sem serviços externos.
+
+Uso:
+    python scripts/webhook_local.py --porta 8765
+
+E no secrets.toml:
+    ALERTAS_WEBHOOK_URL = "http://localhost:8765/alertas"
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ReceptorAlertas(BaseHTTPRequestHandler):
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length', 0))
+        corpo = self.rfile.read(tamanho)
+        try:
+            alerta = json.loads(corpo)
+            icone = "⚠️" if alerta.get('evento') == 'estoque_baixo' else "✅"
+            print(f"{icone} [{alerta.get('data')}] {alerta.get('evento')}: {alerta.get('nome')} "
+                  f"(estoque {alerta.get('estoque_atual')} / mínimo {alerta.get('qtd_minima_estoque')})", flush=True)
+        except json.JSONDecodeError:
+            print(f"Corpo inválido recebido em {self.path}: {corpo!r}", flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Silencia o log padrão de acesso; os alertas já são impressos acima
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receptor local de alertas de estoque baixo.")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+    print(f"Aguardando alertas em http://localhost:{args.porta}/alertas ...", flush=True)
+    ThreadingHTTPServer(("0.0.0.0", args.porta), ReceptorAlertas).serve_forever()
@@ -0,0 +1,303 @@
+# sessoes.py
+"""
+Sessões persistentes: recarregar a página ou reconectar o WebSocket restaura o usuário
+sem novo login e sem nova busca do perfil.
+
+O navegador guarda só um identificador aleatório e opaco no cookie 'sistoque_sessao'
+(SameSite=Strict, Secure em HTTPS), lido no servidor por st.context.cookies. Ele nunca vai
+para a URL, então não aparece no histórico, em logs nem em links compartilhados. O Streamlit
+não responde requisições HTTP próprias, então o cookie é gravado por um componente (JavaScript)
+e não pode ser HttpOnly. Por isso a sessão também fica presa ao navegador que fez o login (hash
+do User-Agent): o identificador copiado para outro navegador não restaura nada.
+
+O servidor guarda apenas o hash do identificador, junto com o usuário, o cargo e os tokens do
+Supabase. Com a camada distribuída ([CACHE_DISTRIBUIDO]), sessões e revogações ficam também no
+backend compartilhado: o login feito numa réplica restaura em outra, e um usuário desativado
+perde as sessões em todas. Os tokens só são renovados quando estão perto de expirar, num cliente descartável
+(nunca no cliente compartilhado pelo processo); fora isso, restaurar a sessão não chama o backend.
+"""
+import hashlib
+import json
+import logging
+import secrets
+import threading
+import time
+from types import SimpleNamespace
+
+import streamlit as st
+import streamlit.components.v1 as components
+from supabase import create_client, ClientOptions
+from supabase_auth.types import User
+
+from dados_compartilhados import get_camada_distribuida
+
+logger = logging.getLogger(__name__)
+
+COOKIE_SESSAO = "sistoque_sessao"
+# Versões anteriores gravavam o identificador neste parâmetro de URL: ele é removido e ignorado
+PARAMETRO_SESSAO_ANTIGO = "sessao"
+
+# Podem ser sobrescritos na seção [SESSOES] do secrets.toml
+SESSOES_CONFIG_PADRAO = {
+    "ociosidade_minutos": 480,          # sessão sem uso expira (um turno de caixa)
+    "duracao_maxima_horas": 24,         # expira mesmo em uso
+    "margem_renovacao_segundos": 300,   # renova o token de acesso quando faltar menos que isso
+}
+
+
+def get_sessoes_config() -> dict:
+    config = dict(SESSOES_CONFIG_PADRAO)
+    try:
+        config.update(dict(st.secrets.get("SESSOES", {})))
+    except Exception:
+        pass
+    return config
+
+
+def _hash_identificador(identificador: str) -> str:
+    return hashlib.sha256(identificador.encode('utf-8')).hexdigest()
+
+
+def _navegador() -> str:
+    """Hash do User-Agent da conexão atual, ao qual a sessão fica presa."""
+    return _hash_identificador(st.context.headers.get("User-Agent") or "")
+
+
+def _usuario_para_json(user) -> dict:
+    return user.model_dump(mode='json') if hasattr(user, 'model_dump') else dict(vars(user))
+
+
+def _usuario_do_json(dados: dict):
+    try:
+        return User.model_validate(dados)
+    except Exception:
+        # Usuários fora do modelo do Supabase (ex.: o backend falso dos testes) voltam com os mesmos atributos
+        return SimpleNamespace(**dados)
+
+
+class ArmazemSessoes:
+    """Sessões autenticadas do servidor, indexadas pelo hash do identificador entregue ao navegador.
+
+    Com a camada distribuída, cada sessão e cada revogação também vão para o backend compartilhado,
+    que passa a valer para todas as réplicas; sem ele (desligado ou fora do ar), vale a cópia desta réplica.
+    """
+    def __init__(self, config: dict, camada=None):
+        self.ociosidade = float(config["ociosidade_minutos"]) * 60
+        self.duracao_maxima = float(config["duracao_maxima_horas"]) * 3600
+        self.margem_renovacao = float(config["margem_renovacao_segundos"])
+        self._camada = camada
+        self._sessoes = {}
+        self._lock = threading.Lock()
+
+    def criar(self, user, cargo: str, sessao_auth, navegador: str) -> str:
+        """Registra uma sessão recém-autenticada e retorna o identificador para o navegador."""
+        identificador = secrets.token_urlsafe(32)
+        agora = time.time()
+        registro = {
+            'user': user, 'user_id': str(user.id), 'cargo': cargo, 'navegador': navegador,
+            'criada_em': agora, 'ultimo_uso': agora, **self._tokens(sessao_auth),
+        }
+        chave = _hash_identificador(identificador)
+        with self._lock:
+            self._remover_expiradas(agora)
+            self._sessoes[chave] = registro
+        self._publicar(chave, registro)
+        return identificador
+
+    def obter(self, identificador: str, navegador: str):
+        """Retorna uma cópia da sessão (e marca o uso), ou None se não existir, tiver expirado,
+        tiver sido revogada ou vier de outro navegador."""
+        chave = _hash_identificador(identificador)
+        agora = time.time()
+        registro = self._ler(chave)
+        if registro is None or not secrets.compare_digest(registro['navegador'], navegador):
+            return None
+        if self._expirada(registro, agora):
+            self._apagar(chave)
+            return None
+        registro['ultimo_uso'] = agora
+        with self._lock:
+            self._sessoes[chave] = registro
+        self._publicar(chave, registro)
+        return dict(registro)
+
+    def precisa_renovar(self, registro: dict) -> bool:
+        return bool(registro.get('expires_at')) and registro['expires_at'] - time.time() < self.margem_renovacao
+
+    def atualizar_tokens(self, identificador: str, sessao_auth):
+        chave = _hash_identificador(identificador)
+        with self._lock:
+            registro = self._sessoes.get(chave)
+            if registro is not None:
+                registro.update(self._tokens(sessao_auth))
+        if registro is not None:
+            self._publicar(chave, registro)
+
+    def remover(self, identificador: str):
+        self._apagar(_hash_identificador(identificador))
+
+    def revogar_usuario(self, user_id) -> int:
+        """Encerra todas as sessões de um usuário (ex.: cargo ou status alterado), em todas as réplicas.
+
+        Retorna quantas estavam nesta réplica; nas outras, a revogação vale na próxima restauração.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            chaves = [chave for chave, registro in self._sessoes.items() if registro['user_id'] == user_id]
+            for chave in chaves:
+                del self._sessoes[chave]
+        # Todas as sessões do usuário criadas até agora deixam de valer; depois da duração máxima
+        # elas já teriam expirado, então o registro pode expirar junto
+        self._no_backend("revogar", lambda: self._camada.gravar_registro(
+            f"sessao-revogada:{user_id}", {'revogada_em': time.time()}, self.duracao_maxima))
+        return len(chaves)
+
+    def total(self) -> int:
+        """Sessões conhecidas por esta réplica."""
+        with self._lock:
+            self._remover_expiradas(time.time())
+            return len(self._sessoes)
+
+    # --- BACKEND COMPARTILHADO ---
+
+    def _no_backend(self, operacao: str, acao):
+        """Executa a ação no backend compartilhado; retorna (sucesso, resultado)."""
+        if self._camada is None:
+            return False, None
+        try:
+            return True, acao()
+        except Exception as e:
+            logger.warning(f"Backend compartilhado indisponível ao {operacao} sessão: {e}")
+            return False, None
+
+    def _publicar(self, chave: str, registro: dict):
+        restante = registro['criada_em'] + self.duracao_maxima - time.time()
+        dados = {**registro, 'user': _usuario_para_json(registro['user'])}
+        self._no_backend("gravar", lambda: self._camada.gravar_registro(f"sessao:{chave}", dados, restante))
+
+    def _ler(self, chave: str):
+        """Sessão vinda do backend compartilhado (já checada contra revogações) ou, sem ele, desta réplica."""
+        def ler_compartilhada():
+            dados = self._camada.ler_registro(f"sessao:{chave}")
+            if dados is None:
+                return None
+            revogacao = self._camada.ler_registro(f"sessao-revogada:{dados['user_id']}")
+            if revogacao and revogacao['revogada_em'] >= dados['criada_em']:
+                return None
+            return {**dados, 'user': _usuario_do_json(dados['user'])}
+
+        lida, registro = self._no_backend("ler", ler_compartilhada)
+        if lida:
+            if registro is None:
+                with self._lock:
+                    self._sessoes.pop(chave, None)
+            return registro
+        with self._lock:
+            registro = self._sessoes.get(chave)
+            return dict(registro) if registro else None
+
+    def _apagar(self, chave: str):
+        with self._lock:
+            self._sessoes.pop(chave, None)
+        self._no_backend("remover", lambda: self._camada.remover_registro(f"sessao:{chave}"))
+
+    @staticmethod
+    def _tokens(sessao_auth) -> dict:
+        return {
+            'access_token': getattr(sessao_auth, 'access_token', None),
+            'refresh_token': getattr(sessao_auth, 'refresh_token', None),
+            'expires_at': getattr(sessao_auth, 'expires_at', None),
+        }
+
+    def _expirada(self, registro: dict, agora: float) -> bool:
+        return agora - registro['ultimo_uso'] > self.ociosidade or agora - registro['criada_em'] > self.duracao_maxima
+
+    def _remover_expiradas(self, agora: float):
+        for chave in [c for c, registro in self._sessoes.items() if self._expirada(registro, agora)]:
+            del self._sessoes[chave]
+
+
+@st.cache_resource
+def get_armazem_sessoes() -> ArmazemSessoes:
+    """Armazém único do servidor, compartilhado por todas as sessões do Streamlit (e, com a camada
+    distribuída, por todas as réplicas)."""
+    return ArmazemSessoes(get_sessoes_config(), get_camada_distribuida())
+
+
+def _renovar_tokens(refresh_token: str):
+    # Cliente descartável: refresh_session no cliente do processo trocaria a autenticação de todas as sessões
+    cliente = create_client(
+        st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"],
+        options=ClientOptions(auto_refresh_token=False, persist_session=False),
+    )
+    return cliente.auth.refresh_session(refresh_token).session
+
+
+def _identificador_do_cookie():
+    # O cookie da conexão é lido no handshake do WebSocket: depois de gravá-lo ou apagá-lo nesta
+    # conexão, vale o que foi anotado em st.session_state
+    if 'sessao_identificador' in st.session_state:
+        return st.session_state.sessao_identificador
+    return st.context.cookies.get(COOKIE_SESSAO)
+
+
+def iniciar_sessao(resposta_login, cargo: str):
+    """Guarda a sessão do login no servidor, agenda a gravação do cookie e preenche o st.session_state."""
+    identificador = get_armazem_sessoes().criar(resposta_login.user, cargo, resposta_login.session, _navegador())
+    st.session_state.sessao_identificador = identificador
+    st.session_state.sessao_cookie_pendente = True
+    st.session_state.user = resposta_login.user
+    st.session_state.user_role = cargo
+
+
+def restaurar_sessao() -> bool:
+    """Restaura o usuário a partir do cookie de sessão. Retorna False se não houver sessão válida."""
+    st.query_params.pop(PARAMETRO_SESSAO_ANTIGO, None)
+    identificador = _identificador_do_cookie()
+    if not identificador:
+        return False
+    armazem = get_armazem_sessoes()
+    registro = armazem.obter(identificador, _navegador())
+    if registro is None:
+        return False
+    if armazem.precisa_renovar(registro):
+        try:
+            armazem.atualizar_tokens(identificador, _renovar_tokens(registro['refresh_token']))
+        except Exception:
+            # Token revogado ou expirado no Supabase: exige novo login
+            armazem.remover(identificador)
+            return False
+    st.session_state.user = registro['user']
+    st.session_state.user_role = registro['cargo']
+    return True
+
+
+def encerrar_sessao():
+    """Remove a sessão do servidor e agenda a remoção do cookie."""
+    identificador = _identificador_do_cookie()
+    if identificador:
+        get_armazem_sessoes().remover(identificador)
+    st.session_state.sessao_identificador = None
+    st.session_state.sessao_cookie_pendente = True
+
+
+def gravar_cookie_sessao():
+    """Grava (ou apaga, depois do logout) o cookie de sessão no navegador. Chamar a cada execução."""
+    if not st.session_state.pop('sessao_cookie_pendente', False):
+        return
+    identificador = st.session_state.get('sessao_identificador')
+    if identificador:
+        atributos = f"Max-Age={int(get_armazem_sessoes().duracao_maxima)}"
+    else:
+        identificador, atributos = "", "Max-Age=0"
+    cookie = f"{COOKIE_SESSAO}={identificador}; Path=/; SameSite=Strict; {atributos}"
+    # O script roda num iframe da mesma origem do app; Secure só vale em HTTPS
+    script = f"""<script>
+        const seguro = window.parent.location.protocol === "https:" ? "; Secure" : "";
+        window.parent.document.cookie = {json.dumps(cookie)} + seguro;
+    </script>"""
+    # st.iframe substitui components.html (removido nas versões novas do Streamlit)
+    if hasattr(st, "iframe"):
+        st.iframe(script, height="content")
+    else:
+        components.html(script, height=0)
@@ -0,0 +1,190 @@
+-- sql/001_estoque_por_local.sql
+-- Estoque por local (lojas e depósito).
+--
+-- produtos.estoque_atual passa a ser o TOTAL da rede e continua sendo mantido por atualizar_estoque,
+-- para que telas e relatórios globais não mudem. O saldo de cada local fica em estoque_locais.
+
+create table if not exists locais (
+    id bigint generated by default as identity primary key,
+    nome text not null unique,
+    tipo text not null default 'Loja' check (tipo in ('Loja', 'Depósito')),
+    ativo boolean not null default true
+);
+
+create table if not exists estoque_locais (
+    produto_id bigint not null references produtos(id) on delete cascade,
+    local_id bigint not null references locais(id) on delete cascade,
+    quantidade integer not null default 0,
+    primary key (local_id, produto_id)
+);
+create index if not exists estoque_locais_produto_idx on estoque_locais (produto_id);
+
+alter table movimentacoes add column if not exists local_id bigint references locais(id);
+alter table movimentacoes add column if not exists forma_pagamento text;
+create index if not exists movimentacoes_local_data_idx on movimentacoes (local_id, data_movimentacao desc);
+
+-- Local inicial com todo o estoque existente
+insert into locais (nome, tipo)
+select 'Principal', 'Loja'
+where not exists (select 1 from locais);
+
+insert into estoque_locais (produto_id, local_id, quantidade)
+select p.id, l.id, coalesce(p.estoque_atual, 0)
+from produtos p cross join (select min(id) as id from locais) l
+on conflict do nothing;
+
+-- Todo produto novo ganha uma linha zerada em cada local, e todo local novo em cada produto
+create or replace function criar_estoque_locais_produto() returns trigger language plpgsql as $$
+begin
+    insert into estoque_locais (produto_id, local_id, quantidade)
+    select new.id, l.id, 0 from locais l
+    on conflict do nothing;
+    return new;
+end;
+$$;
+
+drop trigger if exists trg_produtos_estoque_locais on produtos;
+create trigger trg_produtos_estoque_locais after insert on produtos
+for each row execute function criar_estoque_locais_produto();
+
+create or replace function criar_estoque_locais_local() returns trigger language plpgsql as $$
+begin
+    insert into estoque_locais (produto_id, local_id, quantidade)
+    select p.id, new.id, 0 from produtos p
+    on conflict do nothing;
+    return new;
+end;
+$$;
+
+drop trigger if exists trg_locais_estoque_locais on locais;
+create trigger trg_locais_estoque_locais after insert on locais
+for each row execute function criar_estoque_locais_local();
+
+-- Guarda as configurações de segurança da versão original (SECURITY DEFINER, search_path e
+-- permissões de EXECUTE) para reaplicá-las à nova assinatura
+drop table if exists _atualizar_estoque_anterior;
+create temp table _atualizar_estoque_anterior as
+select prosecdef as security_definer, proconfig as configuracoes, proacl as permissoes
+from pg_proc
+where proname = 'atualizar_estoque' and pronamespace = 'public'::regnamespace
+order by oid
+limit 1;
+
+-- Remove as versões anteriores de atualizar_estoque para o PostgREST não ficar com sobrecargas ambíguas
+do $$
+declare f record;
+begin
+    for f in select oid::regprocedure as assinatura from pg_proc
+             where proname = 'atualizar_estoque' and pronamespace = 'public'::regnamespace loop
+        execute 'drop function ' || f.assinatura;
+    end loop;
+end;
+$$;
+
+create or replace function atualizar_estoque(
+    p_produto_id bigint,
+    p_quantidade_movimentada integer,
+    p_tipo_mov text,
+    p_forma_pagamento text default null,
+    p_local_id bigint default null
+) returns text language plpgsql as $$
+declare
+    v_local_id bigint := coalesce(p_local_id, (select min(id) from locais));
+    v_delta integer;
+    v_saldo integer;
+begin
+    if p_quantidade_movimentada <= 0 then
+        return 'A quantidade deve ser maior que zero.';
+    end if;
+    v_delta := case p_tipo_mov
+        when 'ENTRADA' then p_quantidade_movimentada
+        when 'SAÍDA' then -p_quantidade_movimentada
+    end;
+    if v_delta is null then
+        return 'Tipo de movimentação inválido: ' || coalesce(p_tipo_mov, 'nulo') || '.';
+    end if;
+
+    insert into estoque_locais (produto_id, local_id, quantidade)
+    values (p_produto_id, v_local_id, 0)
+    on conflict do nothing;
+
+    -- Trava a linha do local para vendas simultâneas no mesmo produto
+    select quantidade into v_saldo from estoque_locais
+    where produto_id = p_produto_id and local_id = v_local_id
+    for update;
+
+    if v_saldo + v_delta < 0 then
+        return 'Estoque insuficiente neste local (disponível: ' || v_saldo || ').';
+    end if;
+
+    update estoque_locais set quantidade = quantidade + v_delta
+    where produto_id = p_produto_id and local_id = v_local_id;
+
+    update produtos set estoque_atual = coalesce(estoque_atual, 0) + v_delta
+    where id = p_produto_id;
+
+    insert into movimentacoes (produto_id, tipo_movimentacao, quantidade, forma_pagamento, local_id)
+    values (p_produto_id, p_tipo_mov, p_quantidade_movimentada, p_forma_pagamento, v_local_id);
+
+    return 'Sucesso';
+end;
+$$;
+
+do $$
+declare
+    v_anterior record;
+    v_config text;
+    v_permissao record;
+    v_assinatura constant text := 'atualizar_estoque(bigint, integer, text, text, bigint)';
+begin
+    select * into v_anterior from _atualizar_estoque_anterior;
+    if not found then
+        return;
+    end if;
+    if v_anterior.security_definer then
+        execute 'alter function ' || v_assinatura || ' security definer';
+    end if;
+    foreach v_config in array coalesce(v_anterior.configuracoes, '{}') loop
+        execute format('alter function %s set %s = %s', v_assinatura,
+                       split_part(v_config, '=', 1), substr(v_config, strpos(v_config, '=') + 1));
+    end loop;
+    -- proacl nulo significa as permissões padrão, que a nova função já tem
+    if v_anterior.permissoes is not null then
+        execute 'revoke all on function ' || v_assinatura || ' from public';
+        for v_permissao in select grantee from aclexplode(v_anterior.permissoes) where privilege_type = 'EXECUTE' loop
+            execute format('grant execute on function %s to %s', v_assinatura,
+                           case when v_permissao.grantee = 0 then 'public' else v_permissao.grantee::regrole::text end);
+        end loop;
+    end if;
+end;
+$$;
+
+drop table _atualizar_estoque_anterior;
+
+-- Aplica a outra função as mesmas configurações de segurança de uma função modelo (SECURITY DEFINER,
+-- search_path e permissões de EXECUTE). As RPCs de escrita das migrações seguintes usam
+-- atualizar_estoque como modelo, para funcionarem com as mesmas políticas de RLS.
+create or replace function copiar_seguranca_funcao(p_modelo regprocedure, p_destino regprocedure)
+returns void language plpgsql as $$
+declare
+    v_modelo record;
+    v_config text;
+    v_permissao record;
+begin
+    select prosecdef as security_definer, proconfig as configuracoes, proacl as permissoes
+    into v_modelo from pg_proc where oid = p_modelo;
+    execute format('alter function %s %s', p_destino,
+                   case when v_modelo.security_definer then 'security definer' else 'security invoker' end);
+    foreach v_config in array coalesce(v_modelo.configuracoes, '{}') loop
+        execute format('alter function %s set %s = %s', p_destino,
+                       split_part(v_config, '=', 1), substr(v_config, strpos(v_config, '=') + 1));
+    end loop;
+    if v_modelo.permissoes is not null then
+        execute format('revoke all on function %s from public', p_destino);
+        for v_permissao in select grantee from aclexplode(v_modelo.permissoes) where privilege_type = 'EXECUTE' loop
+            execute format('grant execute on function %s to %s', p_destino,
+                           case when v_permissao.grantee = 0 then 'public' else v_permissao.grantee::regrole::text end);
+        end loop;
+    end if;
+end;
+$$;
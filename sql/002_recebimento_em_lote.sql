@@ -0,0 +1,75 @@
+-- sql/002_recebimento_em_lote.sql
+-- Recebimento de mercadorias em lote.
+--
+-- Uma entrega do fornecedor (muitas linhas) é registrada numa única chamada e numa única transação:
+-- ou todas as linhas entram no estoque do local, ou nenhuma entra.
+
+create table if not exists recebimentos (
+    id bigint generated by default as identity primary key,
+    local_id bigint not null references locais(id),
+    documento text,
+    total_itens integer not null,
+    total_unidades integer not null,
+    data_recebimento timestamptz not null default now()
+);
+
+alter table movimentacoes add column if not exists recebimento_id bigint references recebimentos(id);
+create index if not exists movimentacoes_recebimento_idx on movimentacoes (recebimento_id) where recebimento_id is not null;
+
+-- p_itens: [{"produto_id": 1, "quantidade": 10}, ...]. Linhas repetidas do mesmo produto são somadas.
+create or replace function registrar_recebimento(
+    p_local_id bigint,
+    p_itens jsonb,
+    p_documento text default null
+) returns text language plpgsql as $$
+declare
+    v_recebimento_id bigint;
+    v_invalidos text;
+begin
+    if p_itens is null or jsonb_typeof(p_itens) <> 'array' or jsonb_array_length(p_itens) = 0 then
+        return 'Nenhum item para receber.';
+    end if;
+    if not exists (select 1 from locais where id = p_local_id and ativo) then
+        return 'Local de estoque inválido.';
+    end if;
+
+    drop table if exists _itens_recebimento;
+    create temp table _itens_recebimento on commit drop as
+    select (item->>'produto_id')::bigint as produto_id, sum((item->>'quantidade')::integer) as quantidade
+    from jsonb_array_elements(p_itens) as item
+    group by 1;
+
+    if exists (select 1 from _itens_recebimento where produto_id is null or quantidade is null or quantidade <= 0) then
+        return 'Todas as linhas precisam de produto e quantidade maior que zero.';
+    end if;
+
+    select string_agg(i.produto_id::text, ', ') into v_invalidos
+    from _itens_recebimento i
+    where not exists (select 1 from produtos p where p.id = i.produto_id);
+    if v_invalidos is not null then
+        return 'Produtos não encontrados: ' || v_invalidos || '.';
+    end if;
+
+    insert into recebimentos (local_id, documento, total_itens, total_unidades)
+    select p_local_id, nullif(trim(p_documento), ''), count(*), sum(quantidade) from _itens_recebimento
+    returning id into v_recebimento_id;
+
+    -- Ordem fixa por produto: as travas de linha são tomadas na mesma ordem que em vendas simultâneas
+    insert into estoque_locais (produto_id, local_id, quantidade)
+    select produto_id, p_local_id, quantidade from _itens_recebimento order by produto_id
+    on conflict (local_id, produto_id) do update set quantidade = estoque_locais.quantidade + excluded.quantidade;
+
+    update produtos p set estoque_atual = coalesce(p.estoque_atual, 0) + i.quantidade
+    from _itens_recebimento i
+    where p.id = i.produto_id;
+
+    insert into movimentacoes (produto_id, tipo_movimentacao, quantidade, local_id, recebimento_id)
+    select produto_id, 'ENTRADA', quantidade, p_local_id, v_recebimento_id from _itens_recebimento order by produto_id;
+
+    return 'Sucesso';
+end;
+$$;
+
+-- Mesma segurança de atualizar_estoque (SECURITY DEFINER, search_path e permissões), para valer a mesma RLS
+select copiar_seguranca_funcao('atualizar_estoque(bigint, integer, text, text, bigint)',
+                               'registrar_recebimento(bigint, jsonb, text)');
@@ -0,0 +1,8 @@
+-- sql/003_reconciliacao_estoque.sql
+-- Marca as movimentações criadas pela reconciliação de estoque (reconciliacao_estoque.py).
+--
+-- origem nula = movimentação normal (venda, entrada, recebimento). Os ajustes da reconciliação
+-- levam origem = 'RECONCILIACAO' e ficam fora da previsão de demanda.
+
+alter table movimentacoes add column if not exists origem text;
+create index if not exists movimentacoes_origem_idx on movimentacoes (origem) where origem is not null;
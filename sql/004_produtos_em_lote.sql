@@ -0,0 +1,48 @@
+-- sql/004_produtos_em_lote.sql
+-- Alteração em lote de preços de venda e categorias (Gestão de Produtos).
+--
+-- Todas as linhas são gravadas numa única chamada, com um único UPDATE ... FROM: ou todas entram,
+-- ou nenhuma entra.
+
+-- p_itens: [{"id": 1, "preco_venda": 12.90}, {"id": 2, "tipo": "Bebidas"}, ...].
+-- Campos ausentes (ou nulos) mantêm o valor atual do produto.
+create or replace function atualizar_produtos_em_lote(p_itens jsonb) returns text language plpgsql as $$
+declare
+    v_invalidos text;
+begin
+    if p_itens is null or jsonb_typeof(p_itens) <> 'array' or jsonb_array_length(p_itens) = 0 then
+        return 'Nenhum produto para atualizar.';
+    end if;
+
+    drop table if exists _itens_produtos;
+    create temp table _itens_produtos on commit drop as
+    select id, preco_venda, nullif(trim(tipo), '') as tipo
+    from jsonb_to_recordset(p_itens) as item(id bigint, preco_venda numeric, tipo text);
+
+    if exists (select 1 from _itens_produtos where id is null or preco_venda < 0) then
+        return 'Todas as linhas precisam de produto e preço de venda não negativo.';
+    end if;
+    if exists (select 1 from _itens_produtos group by id having count(*) > 1) then
+        return 'Há produtos repetidos no lote.';
+    end if;
+
+    select string_agg(i.id::text, ', ') into v_invalidos
+    from _itens_produtos i
+    where not exists (select 1 from produtos p where p.id = i.id);
+    if v_invalidos is not null then
+        return 'Produtos não encontrados: ' || v_invalidos || '.';
+    end if;
+
+    update produtos p
+    set preco_venda = coalesce(round(i.preco_venda, 2), p.preco_venda),
+        tipo = coalesce(i.tipo, p.tipo)
+    from _itens_produtos i
+    where p.id = i.id;
+
+    return 'Sucesso';
+end;
+$$;
+
+-- Mesma segurança de atualizar_estoque (SECURITY DEFINER, search_path e permissões), para valer a mesma RLS
+select copiar_seguranca_funcao('atualizar_estoque(bigint, integer, text, text, bigint)',
+                               'atualizar_produtos_em_lote(jsonb)');
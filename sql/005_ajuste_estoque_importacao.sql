@@ -0,0 +1,44 @@
+-- sql/005_ajuste_estoque_importacao.sql
+-- Ajuste de estoque da importação de produtos por CSV (Gestão de Produtos).
+--
+-- O CSV informa o estoque TOTAL desejado. A diferença para o total atual é calculada aqui, com as
+-- linhas travadas, e não a partir do catálogo em cache: vendas feitas desde a leitura entram na conta.
+-- A diferença vira uma ENTRADA ou SAÍDA no local escolhido, via atualizar_estoque.
+
+create or replace function ajustar_estoque_total(
+    p_produto_id bigint,
+    p_estoque_alvo integer,
+    p_local_id bigint
+) returns text language plpgsql as $$
+declare
+    v_total integer;
+    v_delta integer;
+begin
+    if p_estoque_alvo is null or p_estoque_alvo < 0 then
+        return 'O estoque informado deve ser zero ou maior.';
+    end if;
+    if not exists (select 1 from produtos where id = p_produto_id) then
+        return 'Produto não encontrado.';
+    end if;
+    if not exists (select 1 from locais where id = p_local_id) then
+        return 'Local de estoque inválido.';
+    end if;
+
+    -- Mesma ordem de travas de atualizar_estoque (linha do local, depois o produto): sem deadlock com vendas
+    insert into estoque_locais (produto_id, local_id, quantidade)
+    values (p_produto_id, p_local_id, 0)
+    on conflict do nothing;
+    perform 1 from estoque_locais where produto_id = p_produto_id and local_id = p_local_id for update;
+    select coalesce(estoque_atual, 0) into v_total from produtos where id = p_produto_id for update;
+
+    v_delta := p_estoque_alvo - v_total;
+    if v_delta = 0 then
+        return 'Sem alteração';
+    end if;
+    return atualizar_estoque(p_produto_id, abs(v_delta), case when v_delta > 0 then 'ENTRADA' else 'SAÍDA' end,
+                             null, p_local_id);
+end;
+$$;
+
+select copiar_seguranca_funcao('atualizar_estoque(bigint, integer, text, text, bigint)',
+                               'ajustar_estoque_total(bigint, integer, bigint)');
@@ -1,5 +1,188 @@
+import logging
+import random
+import threading
+import time
+
+import httpx
 import streamlit as st
-from supabase import create_client, Client # Importar o tipo Client
+from supabase import create_client, Client, ClientOptions # Importar o tipo Client
+
+logger = logging.getLogger(__name__)
+
+# Valores padrão do transporte HTTP. Podem ser sobrescritos na seção [SUPABASE_HTTP] do secrets.toml:
+#
+# [SUPABASE_HTTP]
+# max_conexoes = 20        # tamanho máximo do pool de conexões
+# max_keepalive = 10       # conexões ociosas mantidas abertas (keep-alive)
+# keepalive_expiry = 30    # segundos até fechar uma conexão ociosa
+# timeout_conexao = 5
+# timeout_leitura = 30
+# timeout_escrita = 30
+# timeout_pool = 10        # espera máxima por uma conexão livre no pool
+# tentativas = 3           # retentativas em falhas de conexão
+# backoff_base = 0.25      # segundos; cresce exponencialmente, com jitter
+# backoff_max = 4
+# http2 = true
+HTTP_CONFIG_PADRAO = {
+    "max_conexoes": 20,
+    "max_keepalive": 10,
+    "keepalive_expiry": 30.0,
+    "timeout_conexao": 5.0,
+    "timeout_leitura": 30.0,
+    "timeout_escrita": 30.0,
+    "timeout_pool": 10.0,
+    "tentativas": 3,
+    "backoff_base": 0.25,
+    "backoff_max": 4.0,
+    "http2": True,
+}
+
+# Métodos que podem ser repetidos mesmo depois de a requisição ter chegado ao servidor.
+# RPCs (POST) só são repetidas quando a conexão falhou antes do envio.
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS"}
+STATUS_RETENTAVEIS = {429, 502, 503, 504}
+
+
+class MetricasHTTP:
+    """Contadores de requisições, conexões abertas e retentativas do transporte HTTP."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.conexoes_abertas = 0
+        self.retentativas = 0
+        self.falhas = 0
+        self.tempo_total = 0.0
+        self.por_versao = {}
+
+    def registrar_evento(self, nome_evento: str, info: dict):
+        # Chamado pelo httpcore (extensão "trace") a cada etapa da requisição
+        if nome_evento == "connection.connect_tcp.complete":
+            with self._lock:
+                self.conexoes_abertas += 1
+
+    def registrar_requisicao(self, response: httpx.Response, duracao: float):
+        versao = response.extensions.get("http_version", b"").decode() or "?"
+        with self._lock:
+            self.requisicoes += 1
+            self.tempo_total += duracao
+            self.por_versao[versao] = self.por_versao.get(versao, 0) + 1
+
+    def registrar_retentativa(self):
+        with self._lock:
+            self.retentativas += 1
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+
+    def resumo(self) -> dict:
+        with self._lock:
+            reutilizadas = max(self.requisicoes - self.conexoes_abertas, 0)
+            return {
+                "requisicoes": self.requisicoes,
+                "conexoes_abertas": self.conexoes_abertas,
+                "requisicoes_reutilizando_conexao": reutilizadas,
+                "taxa_reuso": reutilizadas / self.requisicoes if self.requisicoes else 0.0,
+                "retentativas": self.retentativas,
+                "falhas": self.falhas,
+                "latencia_media_ms": 1000 * self.tempo_total / self.requisicoes if self.requisicoes else 0.0,
+                "por_versao_http": dict(self.por_versao),
+            }
+
+
+class TransporteComRetentativas(httpx.BaseTransport):
+    """
+    Envolve o transporte do httpx adicionando retentativas com backoff exponencial e jitter,
+    além de registrar as métricas de uso do pool de conexões.
+    """
+    def __init__(self, transporte: httpx.BaseTransport, metricas: MetricasHTTP,
+                 tentativas: int, backoff_base: float, backoff_max: float):
+        self._transporte = transporte
+        self._metricas = metricas
+        self._tentativas = tentativas
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+    def _aguardar(self, tentativa: int):
+        # "Full jitter": espera aleatória entre 0 e o teto exponencial, evitando rajadas sincronizadas
+        teto = min(self._backoff_max, self._backoff_base * (2 ** tentativa))
+        time.sleep(random.uniform(0, teto))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self._metricas.registrar_evento
+        idempotente = request.method in METODOS_IDEMPOTENTES
+        tentativa = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                response = self._transporte.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # A requisição não chegou ao servidor: é seguro repetir qualquer método
+                if tentativa >= self._tentativas:
+                    self._metricas.registrar_falha()
+                    raise
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError):
+                if not idempotente or tentativa >= self._tentativas:
+                    self._metricas.registrar_falha()
+                    raise
+            else:
+                self._metricas.registrar_requisicao(response, time.perf_counter() - inicio)
+                if not (idempotente and response.status_code in STATUS_RETENTAVEIS and tentativa < self._tentativas):
+                    return response
+                response.close()
+
+            self._metricas.registrar_retentativa()
+            self._aguardar(tentativa)
+            tentativa += 1
+
+    def close(self):
+        self._transporte.close()
+
+
+# Instância única por processo, compartilhada por todas as sessões (o cliente também é)
+metricas_http = MetricasHTTP()
+
+
+def get_http_config() -> dict:
+    """Combina os valores padrão do transporte com a seção [SUPABASE_HTTP] dos Secrets."""
+    config = dict(HTTP_CONFIG_PADRAO)
+    try:
+        config.update(dict(st.secrets.get("SUPABASE_HTTP", {})))
+    except Exception:
+        # Sem secrets.toml: segue com os valores padrão
+        pass
+    return config
+
+
+def criar_cliente_http(config: dict) -> httpx.Client:
+    """Cria o cliente httpx com pool, keep-alive, timeouts, HTTP/2 e retentativas configurados."""
+    limites = httpx.Limits(
+        max_connections=int(config["max_conexoes"]),
+        max_keepalive_connections=int(config["max_keepalive"]),
+        keepalive_expiry=float(config["keepalive_expiry"]),
+    )
+    timeout = httpx.Timeout(
+        connect=float(config["timeout_conexao"]),
+        read=float(config["timeout_leitura"]),
+        write=float(config["timeout_escrita"]),
+        pool=float(config["timeout_pool"]),
+    )
+    http2 = bool(config["http2"])
+    try:
+        transporte_base = httpx.HTTPTransport(limits=limites, http2=http2)
+    except ImportError:
+        # O pacote 'h2' não está instalado: cai para HTTP/1.1 com keep-alive
+        logger.warning("HTTP/2 indisponível (instale 'httpx[http2]'); usando HTTP/1.1.")
+        transporte_base = httpx.HTTPTransport(limits=limites)
+
+    transporte = TransporteComRetentativas(
+        transporte_base, metricas_http,
+        tentativas=int(config["tentativas"]),
+        backoff_base=float(config["backoff_base"]),
+        backoff_max=float(config["backoff_max"]),
+    )
+    return httpx.Client(transport=transporte, timeout=timeout, follow_redirects=True)
+
 
 @st.cache_resource
 def init_connection():
@@ -7,7 +190,14 @@ def init_connection():
     try:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_KEY"]
-        return create_client(url, key)
+        config = get_http_config()
+        # O mesmo cliente HTTP (e portanto o mesmo pool) atende PostgREST, RPC e Storage
+        opcoes = ClientOptions(
+            httpx_client=criar_cliente_http(config),
+            postgrest_client_timeout=float(config["timeout_leitura"]),
+            storage_client_timeout=int(config["timeout_leitura"]),
+        )
+        return create_client(url, key, options=opcoes)
     except KeyError:
         st.error("ERRO: As credenciais 'SUPABASE_URL' e 'SUPABASE_KEY' não foram encontradas nos Secrets do Streamlit.")
         st.info("Por favor, adicione as credenciais ao arquivo secrets.toml e reinicie o app.")
@@ -16,6 +206,10 @@ def init_connection():
         st.error(f"Erro ao conectar com o Supabase. Verifique suas credenciais. Detalhes: {e}")
         return None
 
+def get_metricas_conexao() -> dict:
+    """Retorna um resumo das métricas do pool HTTP compartilhado."""
+    return metricas_http.resumo()
+
 # Função hash para o cliente Supabase, para que o @st.cache_data funcione
 # Isso diz ao Streamlit para identificar o cliente por seu ID de objeto na memória, em vez de seu conteúdo.
 def supabase_client_hash_func(client: Client) -> int: